@@ -1,56 +1,580 @@
 import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+from collections import deque
 import google.generativeai as genai
 from dotenv import load_dotenv
+from cache import TTLCache, SQLiteCache
+from quiz import parse_quiz, quiz_to_json, quiz_from_json
+from gemini_client import (
+    ResilientModel, CircuitBreaker,
+    GenerationError, MalformedResponseError, CHARS_PER_TOKEN, estimate_tokens
+)
+import telemetry
+from telemetry import span
+from quota import QuotaBucket, charge_user, get_store
+from story import Segment, split_story, render_story, plan_edit
 
 load_dotenv(override=True)
 
-# Initialize Gemini
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+MODEL_NAME = "gemini-1.5-flash-8b"
+# Bump whenever a prompt template changes so stale cached responses are not reused
+PROMPT_VERSION = 4
+
+# Gemini model, created on first use and shared by the whole process
+_model = None
+_model_lock = threading.Lock()
+
+def get_model():
+    """
+    Get the process-wide Gemini model, configuring it on first use.
+
+    All calls share one request/token budget, kept in the quota store so that
+    every replica sharing NEURONEST_QUOTA_URL draws on the same one, and one
+    circuit breaker per process.
+    """
+    global _model
+    if _model is None:
+        with _model_lock:
+            if _model is None:
+                genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+                _model = ResilientModel(
+                    genai.GenerativeModel(MODEL_NAME),
+                    request_bucket=QuotaBucket("gemini:requests", float(os.getenv("NEURONEST_GEMINI_RPM", "15"))),
+                    token_bucket=QuotaBucket("gemini:tokens", float(os.getenv("NEURONEST_GEMINI_TPM", "1000000"))),
+                    breaker=CircuitBreaker(
+                        failure_threshold=int(os.getenv("NEURONEST_GEMINI_BREAKER_THRESHOLD", "5")),
+                        reset_timeout=float(os.getenv("NEURONEST_GEMINI_BREAKER_RESET", "30")),
+                    ),
+                    max_retries=int(os.getenv("NEURONEST_GEMINI_MAX_RETRIES", "3")),
+                )
+    return _model
+
+def set_model(model):
+    """Use the given model (e.g. a local fake) instead of Gemini"""
+    global _model
+    with _model_lock:
+        _model = model
+
+def init_ai() -> bool:
+    """
+    Readiness check for the AI backend.
+
+    Confirms an API key is set and the model and quota store can be
+    created, without spending quota on a request.
+    """
+    if not os.getenv("GOOGLE_API_KEY") and _model is None:
+        print("❌ GOOGLE_API_KEY is not set")
+        return False
+    try:
+        get_model()
+    except Exception as e:
+        print(f"❌ Failed to initialize Gemini: {e}")
+        return False
+    try:
+        # Fail here on a bad NEURONEST_QUOTA_URL rather than on the first generation
+        get_store()
+    except Exception as e:
+        print(f"❌ Failed to open the quota store: {e}")
+        return False
+    return True
+
+# Token budgets, counted with estimate_tokens. Prompts over the input budget are
+# shortened; the output caps are enforced by Gemini and bound each call's latency.
+STORY_MAX_INPUT_TOKENS = int(os.getenv("NEURONEST_STORY_MAX_INPUT_TOKENS", "600"))
+STORY_MAX_OUTPUT_TOKENS = int(os.getenv("NEURONEST_STORY_MAX_OUTPUT_TOKENS", "800"))
+QUIZ_MAX_INPUT_TOKENS = int(os.getenv("NEURONEST_QUIZ_MAX_INPUT_TOKENS", "1500"))
+QUIZ_MAX_OUTPUT_TOKENS = int(os.getenv("NEURONEST_QUIZ_MAX_OUTPUT_TOKENS", "1000"))
+# Editing a palace writes single sections and the summary, each from its neighbours only
+SECTION_MAX_INPUT_TOKENS = int(os.getenv("NEURONEST_SECTION_MAX_INPUT_TOKENS", "400"))
+SECTION_MAX_OUTPUT_TOKENS = int(os.getenv("NEURONEST_SECTION_MAX_OUTPUT_TOKENS", "200"))
+
+STORY_GENERATION_CONFIG = genai.GenerationConfig(max_output_tokens=STORY_MAX_OUTPUT_TOKENS)
+SECTION_GENERATION_CONFIG = genai.GenerationConfig(max_output_tokens=SECTION_MAX_OUTPUT_TOKENS)
+OUTPUT_CAPS = {'memory_palace': STORY_MAX_OUTPUT_TOKENS, 'quiz': QUIZ_MAX_OUTPUT_TOKENS}
+# Ask for raw JSON so quiz output can be parsed and validated
+QUIZ_GENERATION_CONFIG = genai.GenerationConfig(
+    response_mime_type="application/json", max_output_tokens=QUIZ_MAX_OUTPUT_TOKENS
+)
+
+# Response cache: a bounded in-process LRU in front of a persistent SQLite store
+LLM_CACHE_ENABLED = os.getenv("NEURONEST_LLM_CACHE", "1") != "0"
+LLM_CACHE_TTL = float(os.getenv("NEURONEST_LLM_CACHE_TTL", str(30 * 24 * 3600)))
+_memory_cache = TTLCache(
+    maxsize=int(os.getenv("NEURONEST_LLM_CACHE_SIZE", "256")),
+    ttl=LLM_CACHE_TTL,
+)
+_disk_cache = None
+_disk_cache_lock = threading.Lock()
+
+# Latency of recent generation calls, oldest first
+generation_metrics = deque(maxlen=int(os.getenv("NEURONEST_METRICS_HISTORY", "200")))
+
+def _record_generation(kind, started, first_token_at, chars, streamed, cached=False, usage=None):
+    """
+    Record time-to-first-token, total time and token usage for one generation
+    call, so budgets can be tuned against latency and cost
+    """
+    finished = time.perf_counter()
+    generation_metrics.append({
+        'kind': kind,
+        'streamed': streamed,
+        'cached': cached,
+        'ttft': (first_token_at or finished) - started,
+        'total': finished - started,
+        'chars': chars,
+        **(usage or {}),
+    })
+
+def get_generation_metrics() -> list:
+    """Get latency records for recent generation calls"""
+    return list(generation_metrics)
 
-model = genai.GenerativeModel("gemini-1.5-flash-8b")
+def _get_disk_cache():
+    """Open the persistent response cache on first use"""
+    global _disk_cache
+    with _disk_cache_lock:
+        if _disk_cache is None:
+            _disk_cache = SQLiteCache(
+                os.getenv("NEURONEST_LLM_CACHE_PATH", ".neuronest_llm_cache.sqlite3"),
+                max_entries=int(os.getenv("NEURONEST_LLM_CACHE_ENTRIES", "5000")),
+                ttl=LLM_CACHE_TTL,
+            )
+        return _disk_cache
 
-def generate_memory_palace(concepts, session_id):
-    """Generate a memory palace story using Google's Gemini AI"""
-    prompt = (
+# Stories have one section per concept in the order given, so reordered or
+# repeated concepts are a different request
+ORDERED_KINDS = {'memory_palace'}
+
+def _normalize_concepts(concepts):
+    """Case-fold, collapse whitespace, dedupe and sort concepts"""
+    return sorted({' '.join(c.split()).casefold() for c in concepts if c.strip()})
+
+def _ordered_concepts(concepts):
+    """Collapse whitespace, keeping the concepts' order, case and repeats"""
+    return [' '.join(c.split()) for c in concepts if c.strip()]
+
+def _cache_key(kind, concepts, story=None):
+    """Hash the normalized request together with the model and prompt version"""
+    payload = json.dumps({
+        'kind': kind,
+        'model': MODEL_NAME,
+        'prompt_version': PROMPT_VERSION,
+        'max_output_tokens': OUTPUT_CAPS[kind],
+        'concepts': _ordered_concepts(concepts) if kind in ORDERED_KINDS else _normalize_concepts(concepts),
+        'story': story,
+    }, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _cache_get(key):
+    value = _memory_cache.get(key)
+    if value is not None:
+        return value
+    try:
+        value = _get_disk_cache().get(key)
+    except sqlite3.Error as e:
+        print(f"Error reading response cache: {e}")
+        return None
+    if value is not None:
+        _memory_cache.set(key, value)
+    return value
+
+def _cache_set(key, value):
+    _memory_cache.set(key, value)
+    try:
+        _get_disk_cache().set(key, value)
+    except sqlite3.Error as e:
+        print(f"Error writing response cache: {e}")
+
+def llm_cache_stats() -> dict:
+    """Return hit/miss counters for the in-memory and on-disk response caches"""
+    return {'memory': _memory_cache.stats(), 'disk': _get_disk_cache().stats()}
+
+def fit_concepts(concepts, max_tokens) -> list:
+    """
+    Shorten the longest concepts until the comma-joined list fits max_tokens.
+
+    Concepts shorter than their share are kept whole; the long ones split
+    whatever room is left equally and are cut with an ellipsis.
+    """
+    concepts = list(concepts)
+    room = max_tokens * CHARS_PER_TOKEN - 2 * max(0, len(concepts) - 1)
+    if sum(map(len, concepts)) <= room:
+        return concepts
+    left = len(concepts)
+    for length in sorted(map(len, concepts)):
+        if length > room // left:
+            break
+        room -= length
+        left -= 1
+    cap = max(2, room // left)
+    return [c if len(c) <= cap else c[:cap - 1].rstrip() + "…" for c in concepts]
+
+def trim_story(story, concepts, max_tokens) -> str:
+    """
+    Cut a story down to max_tokens for the quiz prompt, keeping whole lines.
+
+    The closing summary line is kept first, then the lines mentioning the
+    most concepts; kept lines stay in story order with gaps marked "…".
+    """
+    if estimate_tokens(story) <= max_tokens:
+        return story
+    room = max_tokens * CHARS_PER_TOKEN
+    lines = [line for line in story.splitlines() if line.strip()]
+    names = [c.casefold() for c in concepts]
+    
+    def priority(index):
+        mentions = sum(name in lines[index].casefold() for name in names)
+        return (index == len(lines) - 1, mentions, -index)
+    
+    kept = set()
+    for index in sorted(range(len(lines)), key=priority, reverse=True):
+        if len(lines[index]) + 1 <= room:
+            kept.add(index)
+            room -= len(lines[index]) + 1
+    if not kept:
+        # One enormous line: keep its start, cut at a word boundary
+        return story[:max_tokens * CHARS_PER_TOKEN - 2].rsplit(" ", 1)[0] + " …"
+    
+    trimmed, previous = [], -1
+    for index in sorted(kept):
+        if index != previous + 1:
+            trimmed.append("…")
+        trimmed.append(lines[index])
+        previous = index
+    if previous != len(lines) - 1:
+        trimmed.append("…")
+    return "\n".join(trimmed)
+
+def _word_limit(max_output_tokens):
+    """Words to ask for so a story ends well before the output cap cuts it off"""
+    return max_output_tokens * 3 // 5
+
+def _memory_palace_template(concepts):
+    return (
     "You are NeuroNest, a memory coach helping someone understand and remember information using the Memory Palace technique.\n\n"
     f"Here is the list of concepts: {', '.join(concepts)}.\n"
     "Create a simple and clear story that connects these concepts in a creative and memorable way.\n"
-    "Explain 1–2 concepts at a time using funny, unusual, or exaggerated situations that are easy to imagine.\n"
+    "Write one section per concept, in the order given, explaining it with a funny, unusual, or exaggerated situation that is easy to imagine and linking it to the one before.\n"
+    "Start each section with a line containing only ### and the concept exactly as written above.\n"
     "Keep the language simple but do not lose the correct meaning of the concepts.\n"
-    "Use bullet points or short paragraphs so it’s easy to follow.\n"
+    "Use bullet points or short paragraphs inside a section so it’s easy to follow.\n"
     "The story should be short, clear, crisp and help the person recall the concepts easily.\n"
-    "End with a quick summary of the full story and how the concepts were linked.\n"
+    f"Keep the whole story under {_word_limit(STORY_MAX_OUTPUT_TOKENS)} words.\n"
+    "End with a section headed ### Summary: a quick summary of the full story and how the concepts were linked.\n"
     "Only output the final memory story.\n"
 )
 
+def _memory_palace_prompt(concepts):
+    """Story prompt within STORY_MAX_INPUT_TOKENS, shortening overlong concepts"""
+    room = STORY_MAX_INPUT_TOKENS - estimate_tokens(_memory_palace_template([]))
+    return _memory_palace_template(fit_concepts(concepts, room))
 
-    try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        print(f"Error generating memory palace: {e}")
-        return f"Sorry, I couldn't generate a memory palace right now. Please try again later.\n\nError: {str(e)}"
+def _section_template(concepts, concept, before, after):
+    return (
+    "You are NeuroNest, a memory coach helping someone understand and remember information using the Memory Palace technique.\n\n"
+    f"A memory palace story explains these concepts in order, one section each: {', '.join(concepts)}.\n"
+    + (f"The section before this one, about {before.concept}:\n{before.text}\n\n" if before else "This is the first section.\n")
+    + (f"The section after this one, about {after.concept}:\n{after.text}\n\n" if after else "")
+    + f"Write the section for this concept: {concept}\n"
+    "Explain it with a funny, unusual, or exaggerated situation that is easy to imagine, following on from the section before.\n"
+    "Keep the language simple but do not lose the correct meaning of the concept.\n"
+    f"Keep it under {_word_limit(SECTION_MAX_OUTPUT_TOKENS)} words.\n"
+    "Only output the section text, without a heading.\n"
+)
+
+def _section_prompt(plan, index):
+    """
+    Prompt for the new section plan[index] within SECTION_MAX_INPUT_TOKENS:
+    only its written neighbours are sent, trimmed to share what's left.
+    """
+    before = next((s for s in reversed(plan[:index]) if s.concept is not None and s.text), None)
+    after = next((s for s in plan[index + 1:] if s.concept is not None and s.text), None)
+    concepts = [s.concept for s in plan if s.concept is not None]
+    room = SECTION_MAX_INPUT_TOKENS - estimate_tokens(_section_template([], "", None, None))
+    concepts = fit_concepts(concepts, room // 4)
+    room = (room - estimate_tokens(", ".join(concepts))) // 2
+    if before:
+        before = Segment(before.concept, trim_story(before.text, [before.concept], room))
+    if after:
+        after = Segment(after.concept, trim_story(after.text, [after.concept], room))
+    return _section_template(concepts, plan[index].concept, before, after)
+
+def _summary_template(outline):
+    return (
+    "You are NeuroNest, a memory coach helping someone understand and remember information using the Memory Palace technique.\n\n"
+    f"Here is a memory palace story, one section per concept:\n{outline}\n\n"
+    "Write a quick summary of the full story and how the concepts were linked.\n"
+    f"Keep it under {_word_limit(SECTION_MAX_OUTPUT_TOKENS)} words.\n"
+    "Only output the summary text, without a heading.\n"
+)
+
+def _summary_prompt(segments):
+    """Summary prompt within SECTION_MAX_INPUT_TOKENS: each section is cut to the same share of the room"""
+    room = SECTION_MAX_INPUT_TOKENS - estimate_tokens(_summary_template(""))
+    share = max(8, room // max(1, len(segments))) * CHARS_PER_TOKEN
+    outline = []
+    for segment in segments:
+        line = f"- {segment.concept}: {' '.join(segment.text.split())}"
+        outline.append(line if len(line) <= share else line[:share - 1].rsplit(" ", 1)[0] + "…")
+    return _summary_template("\n".join(outline))
 
-def generate_quiz_questions(concepts, story):
-    """Generate quiz questions based on the memory palace story"""
-    prompt = (
+def _quiz_template(concepts, story):
+    return (
         f"Based on this memory palace story:\n{story}\n\n"
         f"And these concepts: {', '.join(concepts)}\n\n"
         "Create 3-5 multiple choice questions to test understanding of the concepts.\n"
-        "Each question should have 4 options (A, B, C, D) (make sure options are printed on new line) with only one correct answer.\n"
+        "Each question should have exactly 4 options with only one correct answer.\n"
         "Make the questions engaging and related to the memory palace story.\n"
-        "Format as:\n"
-        "**Question 1:** [question text]\n"
-        "A) [option]\n\n"
-        "B) [option]\n\n" 
-        "C) [option]\n\n"
-        "D) [option]\n\n"
-        "**Correct Answer:** [letter]\n\n\n"
+        "Keep each question and option short.\n"
+        "Respond with JSON only, in this exact format:\n"
+        '{"questions": [{"question": "question text", '
+        '"options": ["option A", "option B", "option C", "option D"], '
+        '"answer": "A"}]}\n'
+        'where "answer" is the letter (A, B, C or D) of the correct option.\n'
     )
-    
+
+def _quiz_prompt(concepts, story):
+    """
+    Quiz prompt within QUIZ_MAX_INPUT_TOKENS: concepts may take a quarter of
+    the room, the story gets the rest and is trimmed to fit.
+    Returns (prompt, whether the story was trimmed).
+    """
+    room = QUIZ_MAX_INPUT_TOKENS - estimate_tokens(_quiz_template([], ""))
+    concepts = fit_concepts(concepts, room // 4)
+    trimmed = trim_story(story, concepts, room - estimate_tokens(", ".join(concepts)))
+    return _quiz_template(concepts, trimmed), trimmed != story
+
+def _token_counts(prompt, text, response=None) -> dict:
+    """Prompt/response token counts from Gemini's usage metadata, estimated when it is missing"""
+    usage = getattr(response, 'usage_metadata', None)
+    return {
+        'prompt_tokens': getattr(usage, 'prompt_token_count', 0) or estimate_tokens(prompt),
+        'response_tokens': getattr(usage, 'candidates_token_count', 0) or estimate_tokens(text),
+    }
+
+def _hit_output_cap(response) -> bool:
+    """Whether Gemini stopped because the response reached max_output_tokens"""
+    candidates = getattr(response, 'candidates', None) or ()
+    reason = getattr(candidates[0], 'finish_reason', None) if candidates else None
+    return getattr(reason, 'name', reason) == 'MAX_TOKENS'
+
+def _usage(prompt, text, response, generation_config) -> dict:
+    """Token counts plus the budget they were spent against, for the trace span and metrics"""
+    usage = {
+        **_token_counts(prompt, text, response),
+        'max_output_tokens': generation_config.max_output_tokens,
+        'truncated': _hit_output_cap(response),
+    }
+    if usage['truncated']:
+        print(f"⚠️ AI response stopped at the {usage['max_output_tokens']}-token output cap")
+        telemetry.count("llm_output_truncated")
+    return usage
+
+def _response_text(response) -> str:
+    """Return the text of a response, treating blocked or empty output as a failure"""
     try:
-        response = model.generate_content(prompt)
-        return response.text
-    except Exception as e:
-        print(f"Error generating quiz: {e}")
-        return "Sorry, I couldn't generate quiz questions right now."
\ No newline at end of file
+        text = response.text
+    except ValueError as e:
+        raise MalformedResponseError(f"AI response had no text: {e}") from e
+    if not text or not text.strip():
+        raise MalformedResponseError("AI response was empty")
+    return text
+
+def _stream_text(kind, prompt, generation_config, cache_key=None, user_id=None):
+    """
+    Yield response text chunks as they arrive, recording latency when done.
+
+    Raises GenerationError if the model fails, even part-way through, or if
+    user_id has no generations left (cache hits are free).
+    """
+    started = time.perf_counter()
+    with span(f"llm.{kind}", streamed=True) as trace:
+        if cache_key:
+            cached = _cache_get(cache_key)
+            trace['cache'] = 'miss' if cached is None else 'hit'
+            if cached is not None:
+                _record_generation(kind, started, None, len(cached), streamed=True, cached=True)
+                yield cached
+                return
+
+        charge_user(user_id)
+        first_token_at = None
+        parts = []
+        last_chunk = None
+        try:
+            for chunk in get_model().generate_content(prompt, stream=True, generation_config=generation_config):
+                # Gemini reports usage on the final chunk
+                last_chunk = chunk
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. the final finish_reason chunk)
+                    continue
+                if not text:
+                    continue
+                if first_token_at is None:
+                    first_token_at = time.perf_counter()
+                    trace['ttft'] = first_token_at - started
+                parts.append(text)
+                yield text
+            if not parts:
+                raise MalformedResponseError("AI response was empty")
+            if cache_key:
+                _cache_set(cache_key, ''.join(parts))
+        except GenerationError as e:
+            print(f"Error streaming {kind}: {e}")
+            raise
+        finally:
+            usage = None
+            if last_chunk is not None:
+                usage = _usage(prompt, ''.join(parts), last_chunk, generation_config)
+                trace.update(usage)
+            _record_generation(kind, started, first_token_at, sum(map(len, parts)), streamed=True, usage=usage)
+
+def _generate_text(kind, prompt, generation_config, cache_key=None, user_id=None):
+    """Generate a full response, serving it from the response cache when possible"""
+    started = time.perf_counter()
+    with span(f"llm.{kind}", streamed=False) as trace:
+        if cache_key:
+            cached = _cache_get(cache_key)
+            trace['cache'] = 'miss' if cached is None else 'hit'
+            if cached is not None:
+                _record_generation(kind, started, None, len(cached), streamed=False, cached=True)
+                return cached
+
+        charge_user(user_id)
+        response = get_model().generate_content(prompt, generation_config=generation_config)
+        text = _response_text(response)
+        usage = _usage(prompt, text, response, generation_config)
+        trace.update(usage)
+        _record_generation(kind, started, None, len(text), streamed=False, usage=usage)
+        if cache_key:
+            _cache_set(cache_key, text)
+        return text
+
+def generate_memory_palace(concepts, user_id, use_cache=True):
+    """
+    Generate a memory palace story using Google's Gemini AI.
+
+    Raises GenerationError if no story could be produced, including when
+    user_id has used up their generations (see quota.charge_user).
+    """
+    prompt = _memory_palace_prompt(concepts)
+    cache_key = _cache_key('memory_palace', concepts) if use_cache and LLM_CACHE_ENABLED else None
+
+    try:
+        return _generate_text('memory_palace', prompt, STORY_GENERATION_CONFIG, cache_key, user_id)
+    except GenerationError as e:
+        print(f"Error generating memory palace: {e}")
+        raise
+
+def stream_memory_palace(concepts, user_id, use_cache=True):
+    """
+    Stream a memory palace story chunk by chunk, e.g. into st.write_stream.
+
+    Raises GenerationError from the iterator if the story could not be completed.
+    """
+    return _stream_text(
+        'memory_palace',
+        _memory_palace_prompt(concepts),
+        STORY_GENERATION_CONFIG,
+        _cache_key('memory_palace', concepts) if use_cache and LLM_CACHE_ENABLED else None,
+        user_id
+    )
+
+def edit_memory_palace(concepts, story, new_concepts, user_id, use_cache=True):
+    """
+    Rewrite a palace's story for concepts that were added, removed or reordered.
+
+    Sections of kept concepts are reused as they are; only new concepts'
+    sections and the closing summary are written by the model, so the cost
+    grows with the size of the edit rather than the palace. Stories that
+    aren't split into sections (see story.split_story) are regenerated in
+    full. The edit counts as one of user_id's generations. Raises
+    GenerationError like generate_memory_palace.
+    """
+    with span("palace.edit", concepts=len(new_concepts)) as trace:
+        segments = split_story(story, concepts)
+        if segments is None:
+            trace['full'] = True
+            telemetry.count("edit_full_regenerations")
+            return generate_memory_palace(new_concepts, user_id, use_cache)
+
+        plan = plan_edit(segments, new_concepts)
+        if [s.concept for s in plan] == [s.concept for s in segments]:
+            return story
+        trace['written'] = sum(s.text is None for s in plan[:-1])
+        trace['reused'] = len(plan) - 1 - trace['written']
+
+        try:
+            charge_user(user_id)
+            for index, segment in enumerate(plan[:-1]):
+                if segment.text is None:
+                    text = _generate_text('section', _section_prompt(plan, index), SECTION_GENERATION_CONFIG)
+                    plan[index] = Segment(segment.concept, text.strip())
+            summary = _generate_text('summary', _summary_prompt(plan[:-1]), SECTION_GENERATION_CONFIG)
+        except GenerationError as e:
+            print(f"Error editing memory palace: {e}")
+            raise
+        plan[-1] = Segment(None, summary.strip())
+        return render_story(plan)
+
+def generate_quiz(concepts, story, use_cache=True, max_attempts=3, user_id=None):
+    """
+    Generate structured quiz questions based on the memory palace story.
+
+    Returns a list of QuizQuestion records. Malformed output is rejected and
+    regenerated up to max_attempts times; raises GenerationError if no valid
+    quiz could be produced. A quiz counts as one of user_id's generations,
+    however many attempts it takes.
+    """
+    prompt, trimmed = _quiz_prompt(concepts, story)
+    cache_key = _cache_key('quiz', concepts, story) if use_cache and LLM_CACHE_ENABLED else None
+
+    with span("llm.quiz", streamed=False, story_trimmed=trimmed) as trace:
+        if cache_key:
+            started = time.perf_counter()
+            cached = _cache_get(cache_key)
+            trace['cache'] = 'miss' if cached is None else 'hit'
+            if cached is not None:
+                _record_generation('quiz', started, None, len(cached), streamed=False, cached=True)
+                return quiz_from_json(json.loads(cached))
+        if trimmed:
+            telemetry.count("quiz_story_trimmed")
+        charge_user(user_id)
+
+        for attempt in range(1, max_attempts + 1):
+            started = time.perf_counter()
+            trace['attempts'] = attempt
+            text = ''
+            response = None
+            try:
+                response = get_model().generate_content(prompt, generation_config=QUIZ_GENERATION_CONFIG)
+                text = _response_text(response)
+                questions = parse_quiz(text)
+            except (ValueError, MalformedResponseError) as e:
+                print(f"Rejected malformed quiz (attempt {attempt}/{max_attempts}): {e}")
+                continue
+            except GenerationError as e:
+                print(f"Error generating quiz: {e}")
+                raise
+            finally:
+                # Every answered attempt spends tokens, including the rejected ones
+                usage = None
+                if response is not None:
+                    usage = _usage(prompt, text, response, QUIZ_GENERATION_CONFIG)
+                    for key in ('prompt_tokens', 'response_tokens'):
+                        trace[key] = trace.get(key, 0) + usage[key]
+                    trace['max_output_tokens'] = usage['max_output_tokens']
+                    trace['truncated'] = trace.get('truncated', False) or usage['truncated']
+                _record_generation('quiz', started, None, len(text), streamed=False, usage=usage)
+
+            if cache_key:
+                _cache_set(cache_key, json.dumps(quiz_to_json(questions)))
+            return questions
+
+        raise MalformedResponseError(f"AI returned no valid quiz after {max_attempts} attempts")
@@ -0,0 +1,381 @@
+"""
+Headless JSON API over the same palace logic as app.py, for the mobile
+client and integrations.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000
+
+Every request is one async call instead of a Streamlit rerun. The storage
+and Gemini clients are synchronous, so their calls run on worker threads
+and the event loop only ever awaits them. Clients sign in once and send
+the returned token as `Authorization: Bearer <token>`.
+"""
+import os
+import hmac
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import secrets
+from datetime import datetime
+from contextlib import asynccontextmanager
+
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.exceptions import HTTPException
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from db import (
+    init_db, create_user, authenticate,
+    save_palace, get_user_palace, update_palace, delete_palace,
+    get_palace_summaries, search_palaces, save_quiz, get_quiz
+)
+from ai_agent import (
+    generate_memory_palace, stream_memory_palace, edit_memory_palace, generate_quiz, GenerationError, init_ai
+)
+from gemini_client import RateLimitExceeded
+from quiz import quiz_to_json
+
+# Tokens are signed with this; set it to the same value on every replica so
+# tokens survive restarts and work behind a load balancer
+API_SECRET = os.getenv("NEURONEST_API_SECRET", "")
+API_TOKEN_TTL = float(os.getenv("NEURONEST_API_TOKEN_TTL", str(7 * 24 * 3600)))
+PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+MAX_CONCEPTS = 10
+MIN_PASSWORD_LENGTH = 6
+
+if not API_SECRET:
+    print("⚠️ NEURONEST_API_SECRET is not set; API tokens will stop working when this process exits")
+    API_SECRET = secrets.token_hex(32)
+
+
+class ApiError(Exception):
+    """An error returned to the client as {"error": message} with an HTTP status"""
+
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+def _sign(payload: str) -> str:
+    digest = hmac.new(API_SECRET.encode(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def issue_token(user_id: int, now: float = None) -> tuple:
+    """Create a signed bearer token for user_id; returns (token, expires_at)"""
+    expires_at = int((now or time.time()) + API_TOKEN_TTL)
+    payload = f"{user_id}.{expires_at}"
+    return f"{payload}.{_sign(payload)}", expires_at
+
+
+def verify_token(token: str, now: float = None) -> int:
+    """Get the user id of a valid, unexpired token, or None"""
+    try:
+        user_id, expires_at, signature = token.split(".")
+        if not hmac.compare_digest(signature, _sign(f"{user_id}.{expires_at}")):
+            return None
+        if int(expires_at) < (now or time.time()):
+            return None
+        return int(user_id)
+    except ValueError:
+        return None
+
+
+def _user_id(request) -> int:
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    user_id = verify_token(token.strip()) if scheme.lower() == "bearer" else None
+    if user_id is None:
+        raise ApiError(401, "Missing or invalid token")
+    return user_id
+
+
+async def _body(request, required: bool = True) -> dict:
+    """The JSON object sent as the body; an empty body is {} unless required"""
+    if not required and not await request.body():
+        return {}
+    try:
+        body = await request.json()
+    except ValueError:
+        raise ApiError(400, "Request body must be JSON")
+    if not isinstance(body, dict):
+        raise ApiError(400, "Request body must be a JSON object")
+    return body
+
+
+def _encode_cursor(value) -> str:
+    return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+
+def _decode_cursor(cursor: str):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except ValueError:
+        raise ApiError(400, "Invalid cursor")
+
+
+def _search_offset(cursor) -> int:
+    """A search cursor is the number of results already returned"""
+    if type(cursor) is not int or cursor < 0:
+        raise ApiError(400, "Invalid cursor")
+    return cursor
+
+
+def _keyset(cursor) -> tuple:
+    """
+    A listing cursor is the [created_at, id] of the last summary returned.
+    Backends put it straight into their queries (Supabase into a filter
+    string), so only an ISO timestamp and an id are let through.
+    """
+    if not isinstance(cursor, list) or len(cursor) != 2:
+        raise ApiError(400, "Invalid cursor")
+    created_at, last_id = cursor
+    if not isinstance(created_at, str) or type(last_id) is not int:
+        raise ApiError(400, "Invalid cursor")
+    try:
+        datetime.fromisoformat(created_at)
+    except ValueError:
+        raise ApiError(400, "Invalid cursor")
+    return created_at, last_id
+
+
+def _limit(request) -> int:
+    try:
+        limit = int(request.query_params.get("limit", PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, "limit must be a number")
+    return max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _concepts(body: dict) -> list:
+    concepts = body.get("concepts")
+    if not isinstance(concepts, list) or not all(isinstance(c, str) for c in concepts):
+        raise ApiError(400, "concepts must be a list of strings")
+    concepts = [c.strip() for c in concepts if c.strip()]
+    if not concepts:
+        raise ApiError(400, "Please add at least one concept.")
+    if len(concepts) > MAX_CONCEPTS:
+        raise ApiError(400, f"Please limit to {MAX_CONCEPTS} concepts.")
+    return concepts
+
+
+def palace_json(palace: tuple) -> dict:
+    palace_id, concepts, story, created_at = palace[:4]
+    return {'id': palace_id, 'concepts': list(concepts), 'story': story, 'created_at': created_at}
+
+
+def summary_json(summary: tuple) -> dict:
+    palace_id, created_at, label, preview = summary
+    return {'id': palace_id, 'created_at': created_at, 'label': label, 'preview': preview}
+
+
+async def _user_palace(request) -> tuple:
+    user_id = _user_id(request)
+    palace = await run_in_threadpool(get_user_palace, request.path_params["palace_id"], user_id)
+    if not palace:
+        raise ApiError(404, "Palace not found")
+    return user_id, palace
+
+
+async def signup(request):
+    body = await _body(request)
+    username, password = body.get("username"), body.get("password")
+    if not isinstance(username, str) or not isinstance(password, str) or not username.strip():
+        raise ApiError(400, "username and password are required")
+    if len(password) < MIN_PASSWORD_LENGTH:
+        raise ApiError(400, f"Password must be at least {MIN_PASSWORD_LENGTH} characters long")
+    if not await run_in_threadpool(create_user, username.strip(), password):
+        raise ApiError(409, "Email already registered or error creating account.")
+    return JSONResponse({'created': True}, status_code=201)
+
+
+async def login(request):
+    body = await _body(request)
+    username, password = body.get("username"), body.get("password")
+    if not isinstance(username, str) or not isinstance(password, str):
+        raise ApiError(400, "username and password are required")
+    user_id = await run_in_threadpool(authenticate, username.strip(), password)
+    if not user_id:
+        raise ApiError(401, "Invalid credentials")
+    token, expires_at = issue_token(user_id)
+    return JSONResponse({'token': token, 'user_id': user_id, 'expires_at': expires_at})
+
+
+async def list_palaces(request):
+    """One page of summaries, newest first or best search match first; pass next_cursor back for the next"""
+    user_id = _user_id(request)
+    limit = _limit(request)
+    query = request.query_params.get("q", "").strip()
+    cursor = request.query_params.get("cursor")
+    cursor = _decode_cursor(cursor) if cursor else None
+
+    if query:
+        offset = _search_offset(cursor) if cursor is not None else 0
+        summaries, has_more = await run_in_threadpool(search_palaces, user_id, query, limit, offset)
+        next_cursor = _encode_cursor(offset + len(summaries)) if has_more else None
+    else:
+        keyset = _keyset(cursor) if cursor is not None else None
+        summaries, next_page = await run_in_threadpool(get_palace_summaries, user_id, limit, keyset)
+        next_cursor = _encode_cursor(list(next_page)) if next_page else None
+    return JSONResponse({'palaces': [summary_json(s) for s in summaries], 'next_cursor': next_cursor})
+
+
+async def get_palace(request):
+    _, palace = await _user_palace(request)
+    return JSONResponse(palace_json(palace))
+
+
+def _generate_palace_lines(user_id: int, concepts: list, fresh: bool):
+    """Stream a story and save it, as NDJSON-ready dicts; runs entirely on one worker thread"""
+    chunks = []
+    try:
+        for chunk in stream_memory_palace(concepts, user_id, use_cache=not fresh):
+            chunks.append(chunk)
+            yield {'chunk': chunk}
+    except GenerationError as e:
+        yield {'error': str(e), 'status': 429 if isinstance(e, RateLimitExceeded) else 503}
+        return
+    palace = save_palace(user_id, concepts, "".join(chunks))
+    if palace:
+        yield {'palace': palace_json(palace)}
+    else:
+        yield {'error': "Failed to save memory palace.", 'status': 500}
+
+
+async def _stream_in_thread(generator):
+    """
+    Drive a blocking generator on one worker thread and yield its items here
+    as they arrive. Keeping it on one thread keeps its telemetry spans
+    together; if the client goes away, the thread still finishes (and saves).
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for item in generator:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except Exception as e:
+            print(f"Error streaming palace: {e}")
+            loop.call_soon_threadsafe(queue.put_nowait, {'error': "Unexpected error while generating.", 'status': 500})
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    worker = loop.run_in_executor(None, produce)
+    while (item := await queue.get()) is not done:
+        yield item
+    await worker
+
+
+async def create_palace(request):
+    """
+    Generate and save a palace for {"concepts": [...], "fresh": false, "stream": true}.
+    Streams application/x-ndjson lines: {"chunk"} as the story arrives, then
+    {"palace"} or {"error", "status"}; with "stream": false answers once with the palace.
+    """
+    user_id = _user_id(request)
+    body = await _body(request)
+    concepts = _concepts(body)
+    fresh = bool(body.get("fresh", False))
+
+    if body.get("stream", True):
+        async def lines():
+            async for item in _stream_in_thread(_generate_palace_lines(user_id, concepts, fresh)):
+                yield json.dumps(item) + "\n"
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    story = await run_in_threadpool(generate_memory_palace, concepts, user_id, not fresh)
+    palace = await run_in_threadpool(save_palace, user_id, concepts, story)
+    if not palace:
+        raise ApiError(500, "Failed to save memory palace.")
+    return JSONResponse(palace_json(palace), status_code=201)
+
+
+async def edit_palace(request):
+    """PATCH {"concepts": [...]}: add, remove or reorder concepts, rewriting only the sections that change"""
+    user_id, palace = await _user_palace(request)
+    concepts = _concepts(await _body(request))
+    if concepts == list(palace[1]):
+        return JSONResponse(palace_json(palace))
+    story = await run_in_threadpool(edit_memory_palace, list(palace[1]), palace[2], concepts, user_id)
+    updated = await run_in_threadpool(update_palace, palace[0], user_id, concepts, story)
+    if not updated:
+        raise ApiError(500, "Failed to save memory palace.")
+    return JSONResponse(palace_json(updated))
+
+
+async def remove_palace(request):
+    user_id = _user_id(request)
+    if not await run_in_threadpool(delete_palace, request.path_params["palace_id"], user_id):
+        raise ApiError(404, "Palace not found")
+    return Response(status_code=204)
+
+
+async def palace_quiz(request):
+    """GET the stored quiz; POST {"fresh": false} to generate one, reusing the stored quiz unless fresh"""
+    user_id, palace = await _user_palace(request)
+    fresh = request.method == "POST" and bool((await _body(request, required=False)).get("fresh", False))
+    questions = None if fresh else await run_in_threadpool(get_quiz, palace[0])
+    if not questions:
+        if request.method == "GET":
+            raise ApiError(404, "No quiz yet; POST to generate one")
+        questions = await run_in_threadpool(
+            lambda: generate_quiz(palace[1], palace[2], use_cache=not fresh, user_id=user_id)
+        )
+        await run_in_threadpool(save_quiz, palace[0], questions)
+    return JSONResponse({'questions': quiz_to_json(questions)})
+
+
+async def health(request):
+    readiness = request.app.state.readiness
+    return JSONResponse(readiness, status_code=200 if all(readiness.values()) else 503)
+
+
+async def api_error(request, exc):
+    return JSONResponse({'error': exc.message}, status_code=exc.status)
+
+
+async def generation_error(request, exc):
+    status = 429 if isinstance(exc, RateLimitExceeded) else 503
+    return JSONResponse({'error': str(exc)}, status_code=status)
+
+
+async def http_error(request, exc):
+    return JSONResponse({'error': exc.detail}, status_code=exc.status_code)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    # Same readiness probes as the Streamlit app, run once per process
+    app.state.readiness = {
+        'database': await run_in_threadpool(init_db),
+        'ai': await run_in_threadpool(init_ai),
+    }
+    yield
+
+
+routes = [
+    Route("/api/health", health),
+    Route("/api/signup", signup, methods=["POST"]),
+    Route("/api/login", login, methods=["POST"]),
+    Route("/api/palaces", list_palaces, methods=["GET"]),
+    Route("/api/palaces", create_palace, methods=["POST"]),
+    Route("/api/palaces/{palace_id:int}", get_palace, methods=["GET"]),
+    Route("/api/palaces/{palace_id:int}", edit_palace, methods=["PATCH"]),
+    Route("/api/palaces/{palace_id:int}", remove_palace, methods=["DELETE"]),
+    Route("/api/palaces/{palace_id:int}/quiz", palace_quiz, methods=["GET", "POST"]),
+]
+
+app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    exception_handlers={
+        ApiError: api_error,
+        GenerationError: generation_error,
+        HTTPException: http_error,
+    },
+)
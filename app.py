@@ -1,15 +1,60 @@
+import os
+import uuid
+import base64
+from functools import wraps
 import streamlit as st
+import telemetry
 from db import (
     init_db, create_user, authenticate,
-    save_palace, get_palaces, get_palace_by_id, delete_palace, get_user_by_id
+    save_palace, get_palace_by_id, update_palace, delete_palace, get_user_by_id,
+    get_palace_summaries, get_palace_count, summarize_palace, save_quiz, get_quiz,
+    search_palaces, get_due_reviews, count_due_reviews, save_reviews, find_similar_palaces,
+    get_jobs, delete_job
 )
-from ai_agent import generate_memory_palace, generate_quiz_questions
-
-# Initialize database connection
-if init_db():
+from ai_agent import generate_quiz, edit_memory_palace, GenerationError, init_ai
+from jobs import QUEUED, RUNNING, DONE, FAILED, MAX_PENDING_JOBS, submit_job, job_progress, start_workers
+from review import DueQueue, GRADES, schedule
+from similarity import record_reuse
+from storage import concept_display
+
+# Seconds between sidebar checks on palaces being built in the background
+JOB_POLL_SECONDS = 2
+
+# Each backend is probed until it first succeeds, then once per process.
+# Failures raise so st.cache_resource doesn't keep them, and the next rerun
+# checks again instead of leaving the app "not ready" until a restart.
+
+@st.cache_resource(show_spinner=False)
+def database_ready():
+    """Check the database and start the background job workers"""
+    if not init_db():
+        raise ConnectionError("Failed to connect to database. Please check your Supabase configuration.")
     print("✅ Connected to Supabase database")
-else:
-    print("❌ Failed to connect to database. Please check your Supabase configuration.")
+    # Pick up generation jobs a previous process didn't finish
+    start_workers()
+    return True
+
+@st.cache_resource(show_spinner=False)
+def ai_ready():
+    """Check the AI backend is configured"""
+    if not init_ai():
+        raise RuntimeError("Failed to initialize Gemini. Please check your GOOGLE_API_KEY.")
+    return True
+
+def check_readiness():
+    """Probe the database and AI backends, reusing checks that have already succeeded"""
+    readiness = {}
+    for name, probe in (('database', database_ready), ('ai', ai_ready)):
+        try:
+            readiness[name] = probe()
+        except Exception as e:
+            print(f"❌ {e}")
+            readiness[name] = False
+    return readiness
+
+check_readiness()
+# Prometheus-style /metrics for this process when NEURONEST_METRICS_PORT is set
+telemetry.serve_metrics()
 
 st.set_page_config(
     page_title="NeuroNest", 
@@ -21,501 +66,51 @@ st.set_page_config(
 if "page" not in st.session_state:
     st.session_state.page = "landing"
 
-st.markdown("""
-<style>
-/* Base responsive styles */
-body, .stApp {
-    background: linear-gradient(135deg, #0f0c29, #302b63, #24243e);
-    color: white;
-    font-family: 'Inter', sans-serif;
-}
-
-/* Mobile-first approach */
-.main .block-container {
-    padding: 1rem;
-    max-width: 100%;
-}
-
-/* Responsive sidebar */
-[data-testid="stSidebar"] {
-    background-color: #111827;
-    color: white;
-    padding: 1rem;
-}
-
-[data-testid="stSidebar"] > div:first-child {
-    width: 100%;
-    min-width: 280px;
-}
-
-/* Animated Logo Styles - Responsive */
-@keyframes float {
-    0% { transform: translateY(0px) rotate(0deg); }
-    33% { transform: translateY(-5px) rotate(3deg); }
-    66% { transform: translateY(3px) rotate(-2deg); }
-    100% { transform: translateY(0px) rotate(0deg); }
-}
-
-@keyframes glow {
-    0% { text-shadow: 0 0 5px #a855f7, 0 0 10px #a855f7, 0 0 15px #a855f7; }
-    50% { text-shadow: 0 0 10px #6366f1, 0 0 20px #6366f1, 0 0 30px #6366f1; }
-    100% { text-shadow: 0 0 5px #a855f7, 0 0 10px #a855f7, 0 0 15px #a855f7; }
-}
-
-@keyframes pulse {
-    0% { transform: scale(1); }
-    50% { transform: scale(1.03); }
-    100% { transform: scale(1); }
-}
-
-.animated-header {
-    display: flex;
-    justify-content: center;
-    align-items: center;
-    padding: 1rem 0;
-    margin-bottom: 1rem;
-    text-align: center;
-}
-
-.animated-logo {
-    display: flex;
-    align-items: center;
-    justify-content: center;
-    gap: 10px;
-    flex-wrap: wrap;
-}
-
-.brain-icon {
-    animation: float 3s ease-in-out infinite, pulse 2s ease-in-out infinite;
-    filter: drop-shadow(0 0 10px #a855f7);
-    width: 40px;
-    height: 40px;
-}
-
-.app-title {
-    font-size: 2rem;
-    font-weight: 800;
-    background: linear-gradient(45deg, #a855f7, #6366f1, #8b5cf6);
-    -webkit-background-clip: text;
-    -webkit-text-fill-color: transparent;
-    background-clip: text;
-    animation: glow 2s ease-in-out infinite alternate;
-    letter-spacing: 1px;
-    margin: 0;
-}
-
-/* Hero section responsive */
-.hero-section {
-    text-align: center;
-    padding: 1rem;
-    margin-bottom: 2rem;
-}
-
-.hero-title {
-    font-size: 1.8rem;
-    font-weight: 800;
-    line-height: 1.2;
-    margin-bottom: 1rem;
-}
-
-.hero-subtitle {
-    color: #d1d5db;
-    font-size: 1rem;
-    line-height: 1.4;
-    margin-bottom: 1.5rem;
-}
-
-.hero-input {
-    width: 100%;
-    max-width: 600px;
-    padding: 1rem;
-    margin: 0 auto;
-    display: block;
-    background-color: #1f2937 !important;
-    color: white !important;
-    border: 1px solid #4b5563 !important;
-    border-radius: 8px !important;
-    box-sizing: border-box;
-}
-
-/* Button styles - responsive */
-.stButton > button {
-    background: linear-gradient(to right, #a855f7, #6366f1);
-    color: white;
-    font-weight: bold;
-    border-radius: 8px;
-    width: 100%;
-    padding: 0.75rem 1.5rem;
-    border: none;
-    font-size: 1rem;
-    transition: all 0.3s ease;
-}
-
-.stButton > button:hover {
-    background: linear-gradient(to right, #9333ea, #4f46e5);
-    transform: translateY(-2px);
-    box-shadow: 0 4px 15px rgba(168, 85, 247, 0.3);
-}
-
-/* Card styles - responsive */
-.card {
-    background-color: #111827;
-    border-radius: 16px;
-    padding: 1.5rem;
-    box-shadow: 0 4px 30px rgba(0,0,0,0.4);
-    color: white;
-    margin: 1rem auto;
-    width: 100%;
-    box-sizing: border-box;
-}
-
-.feature-cards {
-    display: grid;
-    grid-template-columns: 1fr;
-    gap: 1.5rem;
-    padding: 1rem;
-    margin-top: 2rem;
-}
-
-.feature-card {
-    background-color: #111827;
-    border-radius: 16px;
-    padding: 1.5rem;
-    box-shadow: 0 4px 30px rgba(0,0,0,0.4);
-    color: white;
-    text-align: center;
-    transition: transform 0.3s ease;
-}
-
-.feature-card:hover {
-    transform: translateY(-5px);
-}
-
-.feature-card img {
-    width: 48px;
-    height: 48px;
-    margin-bottom: 1rem;
-}
-
-.feature-card h3 {
-    color: #a855f7;
-    margin: 1rem 0 0.5rem 0;
-    font-size: 1.2rem;
-}
-
-.feature-card p {
-    margin: 0;
-    line-height: 1.5;
-    font-size: 0.9rem;
-}
-
-/* Auth card styles */
-.auth-card {
-    background-color: #111827;
-    border-radius: 16px;
-    padding: 2rem;
-    box-shadow: 0 4px 30px rgba(0,0,0,0.4);
-    color: white;
-    max-width: 400px;
-    margin: 2rem auto;
-    width: 100%;
-    box-sizing: border-box;
-}
-
-/* Form styles - responsive */
-input, textarea, .stTextInput > div > div > input, .stTextArea > div > div > textarea {
-    background-color: #1f2937 !important;
-    color: white !important;
-    border: 1px solid #4b5563 !important;
-    border-radius: 8px !important;
-    padding: 0.75rem !important;
-    width: 100% !important;
-    box-sizing: border-box !important;
-    font-size: 1rem !important;
-}
-
-.stTextInput > div > div > input:focus,
-.stTextArea > div > div > textarea:focus {
-    border-color: #a855f7 !important;
-    box-shadow: 0 0 0 2px rgba(168, 85, 247, 0.2) !important;
-}
-
-/* Sidebar styles - responsive */
-.sidebar-palace-btn {
-    background-color: #1f2937;
-    color: white;
-    border: 1px solid #4b5563;
-    border-radius: 12px;
-    padding: 0.75rem;
-    margin-bottom: 0.5rem;
-    text-align: left;
-    font-size: 0.85rem;
-    font-weight: 500;
-    cursor: pointer;
-    width: 100%;
-    box-sizing: border-box;
-    transition: all 0.3s ease;
-}
-
-.sidebar-palace-btn:hover {
-    background-color: #374151;
-    color: #a855f7;
-    transform: translateX(3px);
-}
-
-/* Content sections - responsive */
-.palace-content {
-    background-color: #1f2937;
-    border-radius: 12px;
-    padding: 1.5rem;
-    margin: 1rem 0;
-    border-left: 4px solid #a855f7;
-    word-wrap: break-word;
-    overflow-wrap: break-word;
-}
-
-.quiz-section {
-    background-color: #0f172a;
-    border-radius: 12px;
-    padding: 1.5rem;
-    margin: 1rem 0;
-    border: 1px solid #334155;
-    word-wrap: break-word;
-    overflow-wrap: break-word;
-}
-
-/* Success and error messages */
-.success-message {
-    background-color: #10b981;
-    color: white;
-    padding: 1rem;
-    border-radius: 8px;
-    margin: 1rem 0;
-}
-
-.error-message {
-    background-color: #ef4444;
-    color: white;
-    padding: 1rem;
-    border-radius: 8px;
-    margin: 1rem 0;
-}
-
-/* Tab styles */
-.stTabs [data-baseweb="tab-list"] {
-    gap: 0.5rem;
-}
-
-.stTabs [data-baseweb="tab"] {
-    background-color: #1f2937;
-    color: white;
-    border-radius: 8px 8px 0 0;
-    padding: 0.75rem 1rem;
-    font-weight: 500;
-}
-
-.stTabs [aria-selected="true"] {
-    background-color: #a855f7;
-    color: white;
-}
-
-/* Mobile specific adjustments */
-@media (max-width: 768px) {
-    .main .block-container {
-        padding: 0.5rem;
-    }
-    
-    .brain-icon {
-        width: 35px;
-        height: 35px;
-    }
-    
-    .app-title {
-        font-size: 1.8rem;
-    }
-    
-    .hero-title {
-        font-size: 1.5rem;
-    }
-    
-    .hero-subtitle {
-        font-size: 0.9rem;
-    }
-    
-    .card, .auth-card {
-        padding: 1rem;
-        margin: 0.5rem;
-    }
-    
-    .feature-card {
-        padding: 1rem;
-    }
-    
-    .feature-card h3 {
-        font-size: 1.1rem;
-    }
-    
-    .palace-content, .quiz-section {
-        padding: 1rem;
-    }
-    
-    /* Ensure sidebar is properly sized on mobile */
-    [data-testid="stSidebar"] > div:first-child {
-        min-width: 250px;
-    }
-}
-
-/* Tablet adjustments */
-@media (min-width: 769px) and (max-width: 1024px) {
-    .feature-cards {
-        grid-template-columns: repeat(2, 1fr);
-    }
-    
-    .brain-icon {
-        width: 50px;
-        height: 50px;
-    }
-    
-    .app-title {
-        font-size: 2.2rem;
-    }
-    
-    .hero-title {
-        font-size: 2rem;
-    }
-}
-
-/* Desktop adjustments */
-@media (min-width: 1025px) {
-    .feature-cards {
-        grid-template-columns: repeat(3, 1fr);
-        max-width: 1200px;
-        margin: 2rem auto;
-    }
-    
-    .brain-icon {
-        width: 60px;
-        height: 60px;
-    }
-    
-    .app-title {
-        font-size: 2.5rem;
-    }
-    
-    .hero-title {
-        font-size: 2.6rem;
-    }
-    
-    .hero-section {
-        padding: 2rem;
-    }
-    
-    .card {
-        max-width: 480px;
-    }
-}
-
-/* Large desktop adjustments */
-@media (min-width: 1440px) {
-    .main .block-container {
-        max-width: 1400px;
-        margin: 0 auto;
-    }
-    
-    .hero-title {
-        font-size: 3rem;
-    }
-    
-    .app-title {
-        font-size: 3rem;
-    }
-}
-
-/* Print styles */
-@media print {
-    .animated-header, .stButton, .stSidebar {
-        display: none !important;
-    }
-    
-    .palace-content, .quiz-section {
-        background-color: white !important;
-        color: black !important;
-        border: 1px solid #333 !important;
-    }
-}
-
-/* High contrast mode support */
-@media (prefers-contrast: high) {
-    .card, .auth-card, .feature-card {
-        border: 2px solid #ffffff;
-    }
-    
-    .stButton > button {
-        border: 2px solid #ffffff;
-    }
-}
-
-/* Reduced motion support */
-@media (prefers-reduced-motion: reduce) {
-    .brain-icon {
-        animation: none;
-    }
-    
-    .app-title {
-        animation: none;
-    }
-    
-    .stButton > button:hover {
-        transform: none;
-    }
-    
-    .feature-card:hover {
-        transform: none;
-    }
-}
-
-/* Focus styles for accessibility */
-.stButton > button:focus,
-input:focus,
-textarea:focus {
-    outline: 2px solid #a855f7;
-    outline-offset: 2px;
-}
-
-/* Ensure text remains readable */
-* {
-    -webkit-font-smoothing: antialiased;
-    -moz-osx-font-smoothing: grayscale;
-}
-
-/* Responsive utilities */
-.mobile-hide {
-    display: block;
-}
-
-.mobile-show {
-    display: none;
-}
-
-@media (max-width: 768px) {
-    .mobile-hide {
-        display: none;
-    }
-    
-    .mobile-show {
-        display: block;
-    }
-}
-</style>
-""", unsafe_allow_html=True)
+SIDEBAR_PAGE_SIZE = 20
+REVIEW_SESSION_SIZE = 50  # Due palaces loaded into one review session
+REVIEW_FLUSH_EVERY = 20  # Graded palaces are written in batches of this size
+
+# Stylesheet and icons live in ./static and are inlined into the page: Streamlit's
+# static file serving sends .css and .svg as text/plain with nosniff, which
+# browsers refuse as a stylesheet or image
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+
+@st.cache_resource(show_spinner=False)
+def asset_url(name):
+    """data: URL of an icon in ./static, read once per process"""
+    with open(os.path.join(STATIC_DIR, name), "rb") as f:
+        return f"data:image/svg+xml;base64,{base64.b64encode(f.read()).decode()}"
+
+@st.cache_resource(show_spinner=False)
+def stylesheet():
+    """The app's CSS, read once per process rather than on every rerun"""
+    with open(os.path.join(STATIC_DIR, "neuronest.css"), encoding="utf-8") as f:
+        return f.read()
+
+def inject_stylesheet():
+    """Inline the cached stylesheet into the page"""
+    st.markdown(f"<style>{stylesheet()}</style>", unsafe_allow_html=True)
+
+inject_stylesheet()
+
+def fragment(func, run_every=None):
+    """
+    st.fragment whose own reruns are traced like full ones. Widgets inside a
+    fragment rerun just that function; st.rerun() still reruns the whole app.
+    """
+    @wraps(func)
+    def run(*args, **kwargs):
+        with telemetry.rerun(st.session_state.trace_session, fragment=func.__name__):
+            return func(*args, **kwargs)
+    return st.fragment(run, run_every=run_every)
 
 def landing_page():
     """Landing page with hero section and features"""
     # Animated Header with centered logo
-    st.markdown("""
+    st.markdown(f"""
     <div class="animated-header">
         <div class="animated-logo">
-            <img src="https://img.icons8.com/ios-filled/50/ffffff/brain.png" class="brain-icon" alt="Brain Icon"> 
+            <img src="{asset_url('brain.svg')}" class="brain-icon" alt="Brain Icon"> 
             <h1 class="app-title">NeuroNest</h1>
         </div>
     </div>
@@ -537,20 +132,20 @@ def landing_page():
             st.rerun()
     
     # Feature cards with responsive grid
-    st.markdown("""
+    st.markdown(f"""
     <div class="feature-cards">
         <div class="feature-card">
-            <img src="https://img.icons8.com/ios-filled/50/ffffff/storytelling.png" alt="Storytelling Icon" />
+            <img src="{asset_url('storytelling.svg')}" alt="Storytelling Icon" />
             <h3>AI-Powered Stories</h3>
             <p>Turn concepts into vivid stories using AI trained on how memory works.</p>
         </div>
         <div class="feature-card">
-            <img src="https://img.icons8.com/ios-filled/50/ffffff/questions.png" alt="Questions Icon" />
+            <img src="{asset_url('questions.svg')}" alt="Questions Icon" />
             <h3>Interactive Quizzes</h3>
             <p>Personalized questions that reinforce memory and track your learning.</p>
         </div>
         <div class="feature-card">
-            <img src="https://img.icons8.com/ios-filled/50/ffffff/books.png" alt="Books Icon" />
+            <img src="{asset_url('books.svg')}" alt="Books Icon" />
             <h3>Personal Library</h3>
             <p>Save, revisit, and organize your memory palaces in one place.</p>
         </div>
@@ -574,10 +169,10 @@ def landing_page():
 def login_signup_page():
     """Login and signup page"""
     # Animated Header for auth page too
-    st.markdown("""
+    st.markdown(f"""
     <div class="animated-header">
         <div class="animated-logo">
-            <img src="https://img.icons8.com/ios-filled/50/ffffff/brain.png" class="brain-icon" alt="Brain Icon"> 
+            <img src="{asset_url('brain.svg')}" class="brain-icon" alt="Brain Icon"> 
             <h1 class="app-title">NeuroNest</h1>
         </div>
     </div>
@@ -638,8 +233,9 @@ def login_signup_page():
             st.session_state.page = "landing"
             st.rerun()
 
+@fragment
 def build_memory_palace_ui():
-    """UI for building a new memory palace"""
+    """UI for building a new memory palace; validation and similar-palace offers rerun only this form"""
     st.subheader("🧠 Build a New Memory Palace")
     
     with st.form("palace_form"):
@@ -650,6 +246,11 @@ def build_memory_palace_ui():
             help="Enter each concept on a new line. The AI will create a story connecting all concepts."
         )
         
+        fresh_story = st.checkbox(
+            "Always generate a fresh story",
+            help="Ask the AI again instead of reusing a saved story or offering a similar palace."
+        )
+        
         generate_button = st.form_submit_button("🏰 Generate Palace", use_container_width=True)
         
         if generate_button:
@@ -658,19 +259,83 @@ def build_memory_palace_ui():
                 st.warning("⚠️ Please add at least one concept.")
             elif len(concepts) > 10:
                 st.warning("⚠️ Please limit to 10 concepts for optimal results.")
+            elif not fresh_story and (matches := find_similar_palaces(st.session_state.user_id, concepts)):
+                # Offer what the user already has before spending an AI call on it
+                st.session_state.similar_offer = {'concepts': concepts, 'matches': matches}
+                record_reuse("offered")
             else:
-                with st.spinner("🤖 AI is creating your memory palace..."):
-                    story = generate_memory_palace(concepts, st.session_state.user_id)
-                    if save_palace(st.session_state.user_id, concepts, story):
-                        st.success("🎉 Memory palace created successfully!")
-                        
-                        # Auto-select the newly created palace
-                        palaces = get_palaces(st.session_state.user_id)
-                        if palaces:
-                            st.session_state.selected_palace_id = palaces[0][0]
-                        st.rerun()
-                    else:
-                        st.error("❌ Failed to save memory palace. Please try again.")
+                queue_palace(concepts, fresh_story)
+    
+    if st.session_state.get("similar_offer"):
+        similar_palace_offer()
+
+def queue_palace(concepts: list, fresh_story: bool = False):
+    """Hand the concepts to a background generation job; the sidebar shows it until the palace is saved"""
+    pending = [job for job in get_jobs(st.session_state.user_id) if job[4] in (QUEUED, RUNNING)]
+    if len(pending) >= MAX_PENDING_JOBS:
+        st.warning(f"⚠️ {len(pending)} palaces are already being built. Please wait for one to finish.")
+        return
+    if submit_job(st.session_state.user_id, concepts, fresh_story):
+        st.session_state.jobs_active = True
+        st.rerun()
+    else:
+        st.error("❌ Couldn't start building your memory palace. Please try again.")
+
+def similar_palace_offer():
+    """Offer to open or fork a near-duplicate palace instead of generating a new story"""
+    offer = st.session_state.similar_offer
+    palace_id, similarity = offer['matches'][0]
+    existing = get_palace_by_id(palace_id)
+    if not existing:
+        # Deleted since the offer was made
+        st.session_state.similar_offer = None
+        queue_palace(offer['concepts'])
+        return
+    
+    st.info(
+        f"♻️ You already have a palace for {similarity:.0%} similar concepts: "
+        f"**{', '.join(existing[1])}**"
+    )
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("📖 Open It", key="reuse_similar", use_container_width=True):
+            st.session_state.similar_offer = None
+            st.session_state.selected_palace_id = existing[0]
+            st.session_state.pop("current_quiz", None)
+            record_reuse("reused")
+            st.rerun()
+    with col2:
+        if st.button("🍴 Fork It", key="fork_similar", use_container_width=True,
+                     help="Save its story under your new concepts without asking the AI"):
+            palace = save_palace(st.session_state.user_id, offer['concepts'], existing[2])
+            st.session_state.similar_offer = None
+            if palace:
+                st.session_state.selected_palace_id = palace[0]
+                st.session_state.pop("current_quiz", None)
+                add_palace_summary(palace)
+                record_reuse("forked")
+                st.rerun()
+            else:
+                st.error("❌ Failed to save memory palace. Please try again.")
+    with col3:
+        generate_new = st.button("✨ Generate New", key="decline_similar", use_container_width=True)
+    if generate_new:
+        st.session_state.similar_offer = None
+        record_reuse("declined")
+        queue_palace(offer['concepts'])
+
+@fragment
+def palace_viewer():
+    """The selected palace, loaded by the viewer itself so its fragment can rerun without the rest of the page"""
+    palace_id = st.session_state.get("selected_palace_id")
+    if not palace_id:
+        return
+    palace = get_palace_by_id(palace_id)
+    if palace:
+        show_selected_palace(palace)
+    else:
+        st.error("Palace not found or deleted.")
+        st.session_state.selected_palace_id = None
 
 def show_selected_palace(palace):
     """Display the selected memory palace"""
@@ -681,18 +346,20 @@ def show_selected_palace(palace):
         col1, col2 = st.columns([2, 1])
         with col1:
             st.markdown(f"**Created:** {palace[3][:19].replace('T', ' ')}")
-            concepts_list = palace[1].replace('\n', ', ')
-            st.markdown(f"**Concepts:** {concepts_list}")
+            st.markdown(f"**Concepts:** {', '.join(palace[1])}")
         
         with col2:
             if st.button("🗑️ Delete Palace", key="delete_palace"):
                 if delete_palace(palace[0], st.session_state.user_id):
                     st.success("🗑️ Palace deleted successfully!")
                     st.session_state.selected_palace_id = None
+                    reset_palace_summaries()
                     st.rerun()
                 else:
                     st.error("❌ Failed to delete palace.")
         
+        edit_palace_form(palace)
+        
         st.markdown("---")
         
         # Display the palace story with responsive container
@@ -700,24 +367,228 @@ def show_selected_palace(palace):
         st.markdown(palace[2])
         st.markdown('</div>', unsafe_allow_html=True)
         
-        # Quiz section
-        st.markdown("### 🧩 Test Your Memory")
-        if st.button("📝 Generate Quiz Questions", key="generate_quiz"):
-            with st.spinner("Creating quiz questions..."):
-                concepts = palace[1].split('\n')
-                quiz = generate_quiz_questions(concepts, palace[2])
+        quiz_panel(palace)
+
+def edit_palace_form(palace):
+    """Add, remove or reorder a palace's concepts; only the sections that change are rewritten"""
+    with st.expander("✏️ Edit Concepts"):
+        with st.form(f"edit_palace_{palace[0]}"):
+            input_text = st.text_area(
+                "Concepts (one per line)",
+                value="\n".join(palace[1]),
+                height=100,
+                help="Sections of concepts you keep are reused; new concepts get new sections and the summary is rewritten."
+            )
+            save_button = st.form_submit_button("💾 Save Changes", use_container_width=True)
+        
+        if save_button:
+            concepts = [c.strip() for c in input_text.splitlines() if c.strip()]
+            if not concepts:
+                st.warning("⚠️ Please add at least one concept.")
+            elif len(concepts) > 10:
+                st.warning("⚠️ Please limit to 10 concepts for optimal results.")
+            elif concepts == list(palace[1]):
+                st.info("No changes to save.")
+            else:
+                with st.spinner("Rewriting the changed parts of your story..."):
+                    try:
+                        story = edit_memory_palace(list(palace[1]), palace[2], concepts, st.session_state.user_id)
+                    except GenerationError as e:
+                        st.error(f"❌ Couldn't update the story right now. Please try again.\n\n{e}")
+                        return
+                if update_palace(palace[0], st.session_state.user_id, concepts, story):
+                    # The stored quiz was for the old story
+                    st.session_state.pop("current_quiz", None)
+                    reset_palace_summaries()
+                    st.rerun()
+                else:
+                    st.error("❌ Failed to save memory palace. Please try again.")
+
+@fragment
+def quiz_panel(palace):
+    """Quiz section; its buttons rerun only this panel"""
+    st.markdown("### 🧩 Test Your Memory")
+    
+    # The New/Clear buttons are drawn below the quiz, so act on their clicks
+    # first and show the result in this same run instead of rerunning again
+    if st.session_state.get("clear_quiz"):
+        st.session_state.pop("current_quiz", None)
+    regenerate = st.session_state.get("regenerate_quiz")
+    
+    if st.button("📝 Generate Quiz Questions", key="generate_quiz") or regenerate:
+        with st.spinner("Creating quiz questions..."):
+            try:
+                # Reuse the stored quiz if there is one; only call the AI the first time
+                quiz = None if regenerate else get_quiz(palace[0])
+                if not quiz:
+                    quiz = create_quiz(palace, use_cache=not regenerate)
+            except GenerationError as e:
+                st.error(f"❌ Couldn't generate quiz questions right now. Please try again.\n\n{e}")
+            else:
                 st.session_state.current_quiz = quiz
-                st.rerun()
+    
+    if st.session_state.get("current_quiz"):
+        # st.markdown('<div class="quiz-section">', unsafe_allow_html=True)
+        st.markdown(format_quiz(st.session_state.current_quiz))
+        st.markdown('</div>', unsafe_allow_html=True)
         
-        if hasattr(st.session_state, 'current_quiz') and st.session_state.current_quiz:
-            # st.markdown('<div class="quiz-section">', unsafe_allow_html=True)
-            st.markdown(st.session_state.current_quiz)
-            st.markdown('</div>', unsafe_allow_html=True)
-            
-            if st.button("🔄 Clear Quiz", key="clear_quiz"):
-                if hasattr(st.session_state, 'current_quiz'):
-                    del st.session_state.current_quiz
-                st.rerun()
+        col1, col2 = st.columns(2)
+        with col1:
+            st.button("🎲 New Questions", key="regenerate_quiz")
+        with col2:
+            st.button("🔄 Clear Quiz", key="clear_quiz")
+
+def create_quiz(palace, use_cache=True):
+    """Generate a quiz for a palace with the AI and store it (raises GenerationError)"""
+    quiz = generate_quiz(list(palace[1]), palace[2], use_cache=use_cache, user_id=st.session_state.user_id)
+    save_quiz(palace[0], quiz)
+    return quiz
+
+def format_quiz(quiz):
+    """Render QuizQuestion records as markdown"""
+    blocks = []
+    for number, question in enumerate(quiz, start=1):
+        lines = [f"**Question {number}:** {question.question}"]
+        for letter, option in zip("ABCD", question.options):
+            lines.append(f"{letter}) {option}")
+        lines.append(f"**Correct Answer:** {question.answer}")
+        blocks.append("\n\n".join(lines))
+    return "\n\n---\n\n".join(blocks)
+
+def reset_palace_summaries():
+    """Forget the loaded sidebar pages so the next render starts from the top"""
+    st.session_state.pop("palace_summaries", None)
+    st.session_state.pop("palace_cursor", None)
+    st.session_state.pop("search_results_for", None)
+
+def add_palace_summary(palace):
+    """Put a freshly saved palace at the top of the loaded sidebar list"""
+    summaries = st.session_state.get("palace_summaries")
+    if summaries is not None and all(summary[0] != palace[0] for summary in summaries):
+        summary = summarize_palace(palace[0], palace[1], palace[3])
+        st.session_state.palace_summaries = [summary] + summaries
+
+def load_more_palace_summaries():
+    """Fetch the next page of palace summaries into session state"""
+    summaries, cursor = get_palace_summaries(
+        st.session_state.user_id,
+        SIDEBAR_PAGE_SIZE,
+        st.session_state.get("palace_cursor")
+    )
+    st.session_state.palace_summaries = st.session_state.get("palace_summaries", []) + summaries
+    st.session_state.palace_cursor = cursor
+
+def start_review_session():
+    """Load the palaces due now into a review queue and switch to the review page"""
+    st.session_state.review_queue = DueQueue(get_due_reviews(st.session_state.user_id, REVIEW_SESSION_SIZE))
+    st.session_state.review_graded = {}
+    st.session_state.review_current = None
+    st.session_state.review_revealed = False
+    st.session_state.page = "review"
+
+def flush_reviews():
+    """Write the grades collected so far in one batch"""
+    graded = st.session_state.get("review_graded")
+    if graded and save_reviews(st.session_state.user_id, graded.values()):
+        graded.clear()
+
+def end_review_session():
+    """Save outstanding grades and go back to the palace builder"""
+    flush_reviews()
+    for key in ("review_queue", "review_graded", "review_current", "review_revealed"):
+        st.session_state.pop(key, None)
+    st.session_state.page = "app"
+
+def grade_current_review(quality):
+    """Schedule the palace under review and move on to the next one"""
+    state = schedule(st.session_state.review_current, quality)
+    st.session_state.review_graded[state.palace_id] = state
+    if state.interval == 0:
+        # Forgotten palaces come back later in the same session
+        st.session_state.review_queue.push(state)
+    st.session_state.review_current = None
+    if len(st.session_state.review_graded) >= REVIEW_FLUSH_EVERY:
+        flush_reviews()
+
+def review_session_ui():
+    """Spaced-repetition review: recall each due palace, check the story, grade yourself"""
+    st.subheader("🔁 Review Session")
+    
+    if st.session_state.review_current is None:
+        st.session_state.review_current = st.session_state.review_queue.pop_due()
+        st.session_state.review_revealed = False
+    state = st.session_state.review_current
+    
+    if state is None:
+        flush_reviews()
+        st.success("🎉 All caught up! Come back when more palaces are due.")
+        if st.button("← Back to Palaces", key="finish_review"):
+            end_review_session()
+            st.rerun()
+        return
+    
+    palace = get_palace_by_id(state.palace_id)
+    if not palace:
+        # Deleted since the session started
+        st.session_state.review_current = None
+        st.rerun()
+    
+    st.markdown(f"**Concepts:** {', '.join(palace[1])}")
+    st.caption(f"Palaces left in this session: {len(st.session_state.review_queue)}")
+    
+    if not st.session_state.review_revealed:
+        st.markdown("Walk through the palace in your head, then check the story.")
+        if st.button("👀 Show Story", key="reveal_story"):
+            st.session_state.review_revealed = True
+            st.rerun()
+    else:
+        st.markdown(palace[2])
+        st.markdown("**How well did you remember it?**")
+        for column, (label, quality) in zip(st.columns(len(GRADES)), GRADES):
+            with column:
+                if st.button(label, key=f"grade_{quality}", use_container_width=True):
+                    grade_current_review(quality)
+                    st.rerun()
+    
+    st.markdown("---")
+    if st.button("⏹️ End Session", key="end_review"):
+        end_review_session()
+        st.rerun()
+
+def load_search_results(query, reset=False):
+    """Fetch the next page of search results for query into session state"""
+    if reset or st.session_state.get("search_results_for") != query:
+        st.session_state.search_results = []
+        st.session_state.search_results_for = query
+    results, has_more = search_palaces(
+        st.session_state.user_id,
+        query,
+        SIDEBAR_PAGE_SIZE,
+        len(st.session_state.search_results)
+    )
+    st.session_state.search_results = st.session_state.search_results + results
+    st.session_state.search_has_more = has_more
+
+def palace_button(summary):
+    """Sidebar button that opens a palace"""
+    palace_id, created_at, first_concept, preview = summary
+    # Create a shorter label for the sidebar
+    date_str = created_at[:10]  # Just the date part
+    label = f"🏰 {date_str}\n{first_concept}"
+    
+    if st.button(
+        label, 
+        key=f"palace_{palace_id}", 
+        help=f"Concepts: {preview}", 
+        use_container_width=True
+    ):
+        if st.session_state.page == "review":
+            end_review_session()
+        st.session_state.selected_palace_id = palace_id
+        # Clear any existing quiz when switching palaces
+        if hasattr(st.session_state, 'current_quiz'):
+            del st.session_state.current_quiz
+        st.rerun()
 
 def sidebar_navigation():
     """Sidebar with navigation and palace list"""
@@ -729,42 +600,108 @@ def sidebar_navigation():
         if user_info:
             st.markdown(f"**Welcome, {user_info['username']}!**")
         
+        due = count_due_reviews(st.session_state.user_id)
+        if st.session_state.page != "review":
+            if st.button(f"🔁 Review ({due} due)", key="start_review", disabled=not due, use_container_width=True):
+                start_review_session()
+                st.rerun()
+        
         st.markdown("### 📂 My Memory Palaces")
         
-        palaces = get_palaces(st.session_state.user_id)
+        # Poll only while something is being built
+        fragment(pending_palaces, run_every=JOB_POLL_SECONDS if st.session_state.get("jobs_active") else None)()
         
-        if not palaces:
-            st.info("No memory palaces yet. Create your first one!")
-        else:
-            for palace in palaces:
-                # Create a shorter label for the sidebar
-                date_str = palace[3][:10]  # Just the date part
-                first_concept = palace[1].split('\n')[0][:20]
-                if len(palace[1].split('\n')[0]) > 20:
-                    first_concept += "..."
-                
-                label = f"🏰 {date_str}\n{first_concept}"
-                
-                if st.button(
-                    label, 
-                    key=f"palace_{palace[0]}", 
-                    help=f"Concepts: {palace[1].replace(chr(10), ', ')}", 
-                    use_container_width=True
-                ):
-                    st.session_state.selected_palace_id = palace[0]
-                    # Clear any existing quiz when switching palaces
-                    if hasattr(st.session_state, 'current_quiz'):
-                        del st.session_state.current_quiz
-                    st.rerun()
+        palace_list()
         
         st.markdown("---")
-        st.markdown(f"**Total Palaces:** {len(palaces)}")
+        st.markdown(f"**Total Palaces:** {get_palace_count(st.session_state.user_id)}")
         
         if st.button("🚪 Logout", use_container_width=True):
             logout()
 
+@fragment
+def palace_list():
+    """Searchable palace list; searching and paging rerun only this list, opening a palace reruns the app"""
+    # Paging buttons are drawn below the list, so load the next page before drawing it
+    query = st.session_state.get("palace_search", "").strip()
+    if query and st.session_state.get("more_search_results") and st.session_state.get("search_results_for") == query:
+        load_search_results(query)
+    elif not query and st.session_state.get("load_more_palaces") and "palace_summaries" in st.session_state:
+        load_more_palace_summaries()
+    
+    query = st.text_input(
+        "🔍 Search palaces",
+        key="palace_search",
+        placeholder="Search concepts and stories"
+    ).strip()
+        
+    if query:
+        if st.session_state.get("search_results_for") != query:
+            load_search_results(query, reset=True)
+        
+        if not st.session_state.search_results:
+            st.info("No memory palaces match your search.")
+        for summary in st.session_state.search_results:
+            palace_button(summary)
+        
+        if st.session_state.search_has_more:
+            st.button("⬇️ More results", key="more_search_results", use_container_width=True)
+    else:
+        if "palace_summaries" not in st.session_state:
+            load_more_palace_summaries()
+        palaces = st.session_state.palace_summaries
+        
+        if not palaces:
+            st.info("No memory palaces yet. Create your first one!")
+        else:
+            for summary in palaces:
+                palace_button(summary)
+            
+            if st.session_state.palace_cursor:
+                st.button("⬇️ Load more", key="load_more_palaces", use_container_width=True)
+
+def pending_palaces():
+    """Sidebar entries for palaces being built in the background; they turn into palaces when saved"""
+    user_id = st.session_state.user_id
+    jobs = get_jobs(user_id)
+    finished = False
+    for job_id, _, concepts, fresh, status, palace_id, error, _, _ in jobs:
+        label, _ = concept_display(concepts)
+        if status == DONE:
+            # Show the saved palace like one built in this session, then forget the job
+            palace = get_palace_by_id(palace_id) if palace_id else None
+            if palace:
+                add_palace_summary(palace)
+                if not st.session_state.get("selected_palace_id"):
+                    st.session_state.selected_palace_id = palace[0]
+            delete_job(job_id, user_id)
+            finished = True
+        elif status == FAILED:
+            st.warning(f"⚠️ {label} failed: {error}")
+            col1, col2 = st.columns(2)
+            with col1:
+                if st.button("🔁 Retry", key=f"retry_job_{job_id}", use_container_width=True):
+                    delete_job(job_id, user_id)
+                    queue_palace(list(concepts), fresh)
+            with col2:
+                if st.button("✖️ Dismiss", key=f"dismiss_job_{job_id}", use_container_width=True):
+                    delete_job(job_id, user_id)
+                    st.rerun()
+        else:
+            st.caption(f"⏳ {label} — {'building' if status == RUNNING else 'waiting'}...")
+            preview = job_progress(job_id)
+            if preview:
+                st.caption(f"…{preview[-120:]}")
+    
+    active = any(job[4] in (QUEUED, RUNNING) for job in jobs)
+    if finished or active != st.session_state.get("jobs_active", False):
+        # A full rerun refreshes the palace list and switches polling on or off
+        st.session_state.jobs_active = active
+        st.rerun()
+
 def logout():
     """Clear session and return to landing page"""
+    flush_reviews()
     # Clear all session state
     for key in list(st.session_state.keys()):
         del st.session_state[key]
@@ -784,21 +721,22 @@ def main():
         st.title("🧠 NeuroNest – Memory Palace Builder")
         st.markdown("*Transform your learning with AI-powered memory palaces*")
         
-        # Main content area
+        # Main content area; each part reruns on its own when its widgets are used
         build_memory_palace_ui()
+        palace_viewer()
+    elif st.session_state.get("user_id") and st.session_state.page == "review":
+        sidebar_navigation()
         
-        # Show selected palace if any
-        if st.session_state.get("selected_palace_id"):
-            palace = get_palace_by_id(st.session_state.selected_palace_id)
-            if palace:
-                show_selected_palace(palace)
-            else:
-                st.error("Palace not found or deleted.")
-                st.session_state.selected_palace_id = None
+        st.title("🧠 NeuroNest – Memory Palace Builder")
+        review_session_ui()
     else:
         # Default fallback
         st.session_state.page = "landing"
         st.rerun()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    # Group this rerun's DB and AI spans under the browser session
+    if "trace_session" not in st.session_state:
+        st.session_state.trace_session = uuid.uuid4().hex[:12]
+    with telemetry.rerun(st.session_state.trace_session):
+        main()
\ No newline at end of file
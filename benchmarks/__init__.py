@@ -0,0 +1,4 @@
+"""Benchmarks for NeuroNest hot paths, run against local fakes.
+
+Run from the project root, e.g. ``python -m benchmarks.auth``.
+"""
@@ -0,0 +1,189 @@
+"""Requests/sec of the JSON API (api.py) against the same actions through Streamlit.
+
+    python -m benchmarks.api --concurrency 1 8 --seconds 5
+    python -m benchmarks.api --skip-streamlit
+
+Serves api.py under uvicorn and app.py under `streamlit run`, both against
+the same seeded fakes (see benchmarks/fake_app.py), and keeps `concurrency`
+clients busy on each for a few seconds per action:
+
+    login       POST /api/login           vs. open a tab and sign in
+    get_palace  GET /api/palaces/{id}     vs. click a palace in the sidebar
+    search      GET /api/palaces?q=...    vs. type into the sidebar search
+
+Reports completed actions per second and p50/p95 latency for both. The
+Streamlit numbers are what a client pays today for the same data: a script
+rerun and the page diff over the websocket.
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import argparse
+import itertools
+import subprocess
+import tempfile
+import urllib.request
+from contextlib import contextmanager, AsyncExitStack
+
+import httpx
+
+from benchmarks.browser import ROOT, free_port, serve_app, open_tab
+from benchmarks.common import summarize
+from benchmarks.fake_app import USERNAME, PASSWORD
+
+ACTIONS = ("login", "get_palace", "search")
+
+
+@contextmanager
+def serve_api(env: dict = None, timeout: float = 60):
+    """Run api.py against the fakes under uvicorn; yields its base URL"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    environment = {
+        **os.environ,
+        'PYTHONPATH': os.pathsep.join(filter(None, (ROOT, os.getenv("PYTHONPATH")))),
+        'NEURONEST_BCRYPT_ROUNDS': "4",
+        **(env or {}),
+    }
+    command = [
+        sys.executable, "-m", "uvicorn", "benchmarks.fake_api:app",
+        "--port", str(port), "--log-level", "warning",
+    ]
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(command, cwd=ROOT, env=environment, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    log.seek(0)
+                    raise RuntimeError(f"API server didn't start:\n{log.read().decode(errors='replace')}")
+                try:
+                    with urllib.request.urlopen(f"{url}/api/health", timeout=1):
+                        break
+                except OSError:
+                    time.sleep(0.2)
+            yield url
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+async def _drive(clients: list, act, seconds: float) -> list:
+    """Run act(client, n) back to back on every client until time is up; returns each action's latency"""
+    latencies = []
+    deadline = time.perf_counter() + seconds
+    counter = itertools.count()
+
+    async def loop(client):
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            await act(client, next(counter))
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(loop(client) for client in clients))
+    return latencies
+
+
+async def _api_action(url: str, action: str, concurrency: int, seconds: float) -> list:
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as http:
+        response = await http.post("/api/login", json={'username': USERNAME, 'password': PASSWORD})
+        response.raise_for_status()
+        headers = {'Authorization': f"Bearer {response.json()['token']}"}
+        page = (await http.get("/api/palaces", params={'limit': 20}, headers=headers)).json()
+        palace_ids = [palace['id'] for palace in page['palaces']]
+
+        async def act(_, n):
+            if action == "login":
+                response = await http.post("/api/login", json={'username': USERNAME, 'password': PASSWORD})
+            elif action == "get_palace":
+                response = await http.get(f"/api/palaces/{palace_ids[n % len(palace_ids)]}", headers=headers)
+            else:
+                response = await http.get("/api/palaces", params={'q': f"Concept {n % 100}"}, headers=headers)
+            response.raise_for_status()
+
+        return await _drive([None] * concurrency, act, seconds)
+
+
+async def _sign_in(tab):
+    await tab.click("signin_to_create")
+    tab.fill("login_email", USERNAME)
+    tab.fill("login_pass", PASSWORD)
+    result = await tab.click("Sign In")
+    if result['exceptions']:
+        raise RuntimeError(f"sign in raised: {result['exceptions'][0]}")
+
+
+async def _streamlit_action(server, action: str, concurrency: int, seconds: float) -> list:
+    if action == "login":
+        async def act(_, n):
+            async with open_tab(server) as tab:
+                await _sign_in(tab)
+        return await _drive([None] * concurrency, act, seconds)
+
+    async with AsyncExitStack() as stack:
+        tabs = [await stack.enter_async_context(open_tab(server)) for _ in range(concurrency)]
+        for tab in tabs:
+            await _sign_in(tab)
+        palaces = [key for key in tabs[0].widgets if re.fullmatch(r"palace_\d+", key)]
+
+        async def act(tab, n):
+            if action == "get_palace":
+                result = await tab.click(palaces[n % len(palaces)])
+            else:
+                result = await tab.type("palace_search", f"Concept {n % 100}")
+            if result['exceptions']:
+                raise RuntimeError(f"{action} raised: {result['exceptions'][0]}")
+        return await _drive(tabs, act, seconds)
+
+
+def _row(latencies: list, seconds: float) -> dict:
+    stats = summarize(latencies)
+    return {'per_sec': len(latencies) / seconds, 'p50_ms': stats['p50_ms'], 'p95_ms': stats['p95_ms']}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8], help="Concurrent clients")
+    parser.add_argument("--seconds", type=float, default=5.0, help="Duration of each action at each concurrency")
+    parser.add_argument("--palaces", type=int, default=100)
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Seconds per fake Supabase round-trip")
+    parser.add_argument("--actions", nargs="+", choices=ACTIONS, default=list(ACTIONS))
+    parser.add_argument("--skip-streamlit", action="store_true", help="Only measure the API")
+    args = parser.parse_args(argv)
+
+    env = {
+        'NEURONEST_BENCH_PALACES': str(args.palaces),
+        'NEURONEST_BENCH_DB_LATENCY': str(args.db_latency),
+    }
+    results = {}  # (action, concurrency) -> {'api': row, 'streamlit': row}
+    with serve_api(env) as url:
+        for action, concurrency in itertools.product(args.actions, args.concurrency):
+            latencies = asyncio.run(_api_action(url, action, concurrency, args.seconds))
+            results[(action, concurrency)] = {'api': _row(latencies, args.seconds)}
+    if not args.skip_streamlit:
+        with serve_app(env=env) as server:
+            for action, concurrency in itertools.product(args.actions, args.concurrency):
+                latencies = asyncio.run(_streamlit_action(server, action, concurrency, args.seconds))
+                results[(action, concurrency)]['streamlit'] = _row(latencies, args.seconds)
+
+    print(f"\n{args.palaces} palaces, {args.db_latency * 1000:g}ms per DB round-trip, {args.seconds:g}s per action")
+    print(f"{'action':<11} {'clients':>7} {'api/s':>8} {'p50':>8} {'p95':>8} {'streamlit/s':>12} {'p50':>8} {'p95':>8} {'speedup':>8}")
+    for (action, concurrency), row in results.items():
+        api = row['api']
+        line = f"{action:<11} {concurrency:>7} {api['per_sec']:>8.1f} {api['p50_ms']:>6.1f}ms {api['p95_ms']:>6.1f}ms"
+        if 'streamlit' in row:
+            streamlit = row['streamlit']
+            speedup = api['per_sec'] / streamlit['per_sec'] if streamlit['per_sec'] else float('inf')
+            line += (f" {streamlit['per_sec']:>12.1f} {streamlit['p50_ms']:>6.1f}ms {streamlit['p95_ms']:>6.1f}ms"
+                     f" {speedup:>7.1f}x")
+        print(line)
+
+
+if __name__ == "__main__":
+    main()
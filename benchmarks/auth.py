@@ -0,0 +1,72 @@
+"""Login and signup latency under concurrent sessions.
+
+    python -m benchmarks.auth --sessions 1 4 16 --rounds 4 --latency 0.02
+
+Each simulated session signs up a fresh user and then logs in, against an
+in-process fake Supabase with the given per-query latency. Reports p50/p99
+for both operations at each concurrency level.
+"""
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.common import use_fake_environment, summarize
+
+use_fake_environment()
+
+import db  # noqa: E402
+from storage.supabase_backend import SupabaseBackend  # noqa: E402
+from fakes import FakeSupabase  # noqa: E402
+
+
+def run_level(sessions: int, rounds: int, latency: float) -> dict:
+    fake = FakeSupabase(latency=latency)
+    db.set_backend(SupabaseBackend(fake))
+    signups, logins = [], []
+
+    def session(n):
+        for r in range(rounds):
+            username = f"user-{sessions}-{n}-{r}@example.com"
+            started = time.perf_counter()
+            assert db.create_user(username, "correct horse")
+            signups.append(time.perf_counter() - started)
+
+            started = time.perf_counter()
+            assert db.authenticate(username, "correct horse")
+            logins.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as pool:
+        list(pool.map(session, range(sessions)))
+    elapsed = time.perf_counter() - started
+
+    return {
+        'sessions': sessions,
+        'elapsed_s': elapsed,
+        'signup': summarize(signups),
+        'login': summarize(logins),
+        'db_calls': sum(fake.calls.values()),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--rounds", type=int, default=4, help="Signup+login pairs per session")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds per fake DB round-trip")
+    args = parser.parse_args(argv)
+
+    print(f"bcrypt rounds={db.BCRYPT_ROUNDS}, hash workers={db.HASH_WORKERS}, db latency={args.latency}s")
+    print(f"{'sessions':>8} {'signup p50':>11} {'signup p99':>11} {'login p50':>10} {'login p99':>10} {'db calls':>9}")
+    for sessions in args.sessions:
+        result = run_level(sessions, args.rounds, args.latency)
+        print(
+            f"{sessions:>8} "
+            f"{result['signup']['p50_ms']:>9.0f}ms {result['signup']['p99_ms']:>9.0f}ms "
+            f"{result['login']['p50_ms']:>8.0f}ms {result['login']['p99_ms']:>8.0f}ms "
+            f"{result['db_calls']:>9}"
+        )
+
+
+if __name__ == "__main__":
+    main()
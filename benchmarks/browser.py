@@ -0,0 +1,212 @@
+"""A minimal Streamlit browser for benchmarks that need a real server.
+
+serve_app() starts `streamlit run benchmarks/fake_app.py` in a subprocess;
+BrowserTab speaks the websocket protocol the Streamlit frontend uses, so a
+click reruns exactly what it would in a browser: the whole script, or only
+the fragment the widget belongs to. Unlike AppTest, which always reruns
+the whole script, this measures what users actually wait for.
+"""
+import os
+import re
+import sys
+import json
+import time
+import socket
+import tempfile
+import subprocess
+import urllib.request
+from contextlib import contextmanager, asynccontextmanager
+
+import websockets
+from streamlit.proto.BackMsg_pb2 import BackMsg
+from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FAKE_APP = os.path.join(ROOT, "benchmarks", "fake_app.py")
+WIDGET_ID_PREFIX = "$$ID-"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """A running `streamlit run` process and the telemetry endpoint of its app"""
+
+    def __init__(self, port: int, metrics_port: int):
+        self.port = port
+        self.metrics_port = metrics_port
+        self.pid = None
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.health_url = f"http://127.0.0.1:{port}/_stcore/health"
+        self.metrics_url = f"http://127.0.0.1:{metrics_port}"
+
+    def sessions(self) -> dict:
+        """Per-session rerun totals from the app's /sessions endpoint (empty before the first run)"""
+        try:
+            with urllib.request.urlopen(f"{self.metrics_url}/sessions", timeout=10) as response:
+                return json.load(response)['sessions']
+        except OSError:
+            return {}
+
+
+@contextmanager
+def serve_app(app_root: str = ROOT, env: dict = None, timeout: float = 60):
+    """Run app_root/app.py against the fakes under `streamlit run`; yields a Server"""
+    server = Server(free_port(), free_port())
+    environment = {
+        **os.environ,
+        # The app's own modules first, so an older checkout runs its own code
+        'PYTHONPATH': os.pathsep.join(filter(None, (app_root, ROOT, os.getenv("PYTHONPATH")))),
+        'NEURONEST_BENCH_APP': os.path.join(app_root, "app.py"),
+        'NEURONEST_METRICS_PORT': str(server.metrics_port),
+        'NEURONEST_BCRYPT_ROUNDS': "4",
+        **(env or {}),
+    }
+    command = [
+        sys.executable, "-m", "streamlit", "run", FAKE_APP,
+        "--server.headless", "true",
+        "--server.port", str(server.port),
+        "--server.enableXsrfProtection", "false",
+        "--server.fileWatcherType", "none",
+        "--browser.gatherUsageStats", "false",
+    ]
+    with tempfile.TemporaryFile() as log:
+        process = subprocess.Popen(command, cwd=app_root, env=environment, stdout=log, stderr=subprocess.STDOUT)
+        server.pid = process.pid
+        try:
+            deadline = time.monotonic() + timeout
+            while True:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    log.seek(0)
+                    raise RuntimeError(f"Streamlit server didn't start:\n{log.read().decode(errors='replace')}")
+                try:
+                    with urllib.request.urlopen(server.health_url, timeout=1):
+                        break
+                except OSError:
+                    time.sleep(0.2)
+            yield server
+        finally:
+            process.terminate()
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+class BrowserTab:
+    """
+    One browser tab on the app. Keeps the widgets of the current page, by key
+    and by label, and sends every value it has typed with each rerun like the
+    frontend does.
+    """
+
+    def __init__(self, websocket):
+        self.websocket = websocket
+        self.widgets = {}  # key or label -> (widget id, fragment id)
+        self.values = {}   # widget id -> WidgetState sent with every rerun
+        self.auto_reruns = {}  # fragment id -> seconds between reruns, for st.fragment(run_every=...)
+        self.first_load = None  # result of loading the page
+
+    async def rerun(self, state: WidgetState = None, fragment_id: str = "", auto: bool = False) -> dict:
+        """
+        Send one rerun request and wait until the app has settled, following
+        any st.rerun() it triggers. Returns the wall time, the bytes and
+        deltas received, how many script runs the request caused and the
+        messages of any exceptions the app showed.
+        """
+        message = BackMsg()
+        message.rerun_script.query_string = ""
+        message.rerun_script.fragment_id = fragment_id
+        message.rerun_script.is_auto_rerun = auto
+        states = dict(self.values)
+        if state is not None:
+            states[state.id] = state
+        message.rerun_script.widget_states.widgets.extend(states.values())
+
+        started = time.perf_counter()
+        await self.websocket.send(message.SerializeToString())
+        result = {'seconds': 0.0, 'bytes': 0, 'deltas': 0, 'full_runs': 0, 'fragment_runs': 0, 'exceptions': []}
+        while True:
+            data = await self.websocket.recv()
+            result['bytes'] += len(data)
+            forward = ForwardMsg()
+            forward.ParseFromString(data)
+            kind = forward.WhichOneof("type")
+            if kind == "new_session":
+                if forward.new_session.fragment_ids_this_run:
+                    result['fragment_runs'] += 1
+                else:
+                    result['full_runs'] += 1
+                    self.widgets = {}
+                    self.auto_reruns = {}
+            elif kind == "delta":
+                result['deltas'] += 1
+                self._remember(forward.delta)
+                if forward.delta.new_element.WhichOneof("type") == "exception":
+                    result['exceptions'].append(forward.delta.new_element.exception.message)
+            elif kind == "auto_rerun":
+                self.auto_reruns[forward.auto_rerun.fragment_id] = forward.auto_rerun.interval
+            elif kind == "stop_auto_rerun":
+                for stopped in forward.stop_auto_rerun.fragment_ids:
+                    self.auto_reruns.pop(stopped, None)
+            elif kind == "script_finished" and forward.script_finished != ForwardMsg.FINISHED_EARLY_FOR_RERUN:
+                break
+        result['seconds'] = time.perf_counter() - started
+        return result
+
+    def _remember(self, delta):
+        if delta.WhichOneof("type") != "new_element":
+            return
+        element = delta.new_element
+        proto = getattr(element, element.WhichOneof("type"))
+        widget_id = getattr(proto, "id", "")
+        if not widget_id.startswith(WIDGET_ID_PREFIX):
+            return
+        # Keyed widget ids end in the key; unkeyed ones in "None"
+        key = widget_id[len(WIDGET_ID_PREFIX):].split("-", 1)[1]
+        if key != "None":
+            self.widgets[key] = (widget_id, delta.fragment_id)
+        if getattr(proto, "label", ""):
+            self.widgets.setdefault(proto.label, (widget_id, delta.fragment_id))
+
+    def find(self, pattern: str) -> str:
+        """Key or label of the first widget on the page matching a regular expression, or None"""
+        for key in self.widgets:
+            if re.fullmatch(pattern, key):
+                return key
+        return None
+
+    async def click(self, name: str) -> dict:
+        widget_id, fragment_id = self.widgets[name]
+        return await self.rerun(WidgetState(id=widget_id, trigger_value=True), fragment_id)
+
+    def fill(self, name: str, value):
+        """Set a text field (or a checkbox, given a bool) without rerunning, as filling in a form does"""
+        widget_id, _ = self.widgets[name]
+        if isinstance(value, bool):
+            self.values[widget_id] = WidgetState(id=widget_id, bool_value=value)
+        else:
+            self.values[widget_id] = WidgetState(id=widget_id, string_value=value)
+
+    async def type(self, name: str, text: str) -> dict:
+        """Enter text into a field outside a form, which reruns its script or fragment"""
+        self.fill(name, text)
+        widget_id, fragment_id = self.widgets[name]
+        return await self.rerun(fragment_id=fragment_id)
+
+    async def poll(self) -> list:
+        """Rerun every fragment with run_every once, as the frontend's timers do; returns their results"""
+        return [await self.rerun(fragment_id=fragment_id, auto=True) for fragment_id in list(self.auto_reruns)]
+
+
+@asynccontextmanager
+async def open_tab(server: Server):
+    """Connect a new browser session and load the first page"""
+    async with websockets.connect(server.url, subprotocols=["streamlit"], max_size=None) as websocket:
+        tab = BrowserTab(websocket)
+        tab.first_load = await tab.rerun()
+        yield tab
@@ -0,0 +1,45 @@
+import os
+import math
+import statistics
+
+
+def use_fake_environment():
+    """Give db.py/ai_agent.py placeholder credentials so they import without a real backend"""
+    os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+    os.environ.setdefault("SUPABASE_KEY", "benchmark-key")
+    os.environ.setdefault("GOOGLE_API_KEY", "benchmark-key")
+    os.environ.setdefault("NEURONEST_LLM_CACHE", "0")
+
+
+def percentile(values, pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarize(values) -> dict:
+    """p50/p95/p99/mean/max of a list of durations, in milliseconds"""
+    return {
+        'count': len(values),
+        'p50_ms': percentile(values, 50) * 1000,
+        'p95_ms': percentile(values, 95) * 1000,
+        'p99_ms': percentile(values, 99) * 1000,
+        'mean_ms': (statistics.fmean(values) if values else 0.0) * 1000,
+        'max_ms': (max(values) if values else 0.0) * 1000,
+    }
+
+
+def rerun_payload_bytes(app_test) -> int:
+    """Serialized size of every element an AppTest run produced (what a rerun sends)"""
+    total = 0
+    stack = [app_test._tree]
+    while stack:
+        node = stack.pop()
+        proto = getattr(node, 'proto', None)
+        if proto is not None and hasattr(proto, 'ByteSize'):
+            total += proto.ByteSize()
+        stack.extend(getattr(node, 'children', {}).values())
+    return total
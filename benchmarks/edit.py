@@ -0,0 +1,83 @@
+"""Editing a palace's concepts against regenerating its whole story.
+
+    python -m benchmarks.edit --sizes 4 8 10 --llm-latency 0.3 --token-latency 0.01
+
+For palaces of each size, applies typical edits (add one concept, remove
+one, swap two, replace two) both ways: ai_agent.edit_memory_palace, which
+reuses the sections of kept concepts and writes only new sections and the
+summary, and a full generate_memory_palace call over the new list, which
+is what creating a new palace costs. Reports model calls, prompt and
+response tokens (from the trace spans) and wall time. The fake model
+charges a fixed latency per call plus a per-token decoding time, so the
+time follows the tokens the way Gemini's does.
+"""
+import time
+import argparse
+
+from benchmarks.common import use_fake_environment
+
+use_fake_environment()
+
+import telemetry  # noqa: E402
+import ai_agent  # noqa: E402
+from fakes import FakeGenerativeModel  # noqa: E402
+from benchmarks.similarity import VOCABULARY  # noqa: E402
+
+EDITS = ("add_one", "remove_one", "swap_two", "replace_two")
+
+
+def apply_edit(concepts: list, edit: str, extra: list) -> list:
+    edited = list(concepts)
+    if edit == "add_one":
+        edited.append(extra[0])
+    elif edit == "remove_one":
+        edited.pop(len(edited) // 2)
+    elif edit == "swap_two":
+        edited[0], edited[-1] = edited[-1], edited[0]
+    elif edit == "replace_two":
+        edited[1:3] = extra[:2]
+    return edited
+
+
+def measure(func, *args) -> dict:
+    """Run one generation inside its own trace; returns calls, tokens and seconds"""
+    telemetry.start_rerun("benchmark")
+    started = time.perf_counter()
+    func(*args)
+    seconds = time.perf_counter() - started
+    rerun = telemetry.end_rerun()
+    return {
+        'calls': rerun['llm_calls'],
+        'prompt_tokens': rerun['prompt_tokens'],
+        'response_tokens': rerun['response_tokens'],
+        'seconds': seconds,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[4, 8, 10], help="Concepts per palace")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="Seconds per fake Gemini call")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="Seconds per response token")
+    args = parser.parse_args(argv)
+    ai_agent.set_model(FakeGenerativeModel(latency=args.llm_latency, token_latency=args.token_latency))
+
+    print(f"{args.llm_latency * 1000:g}ms per call, {args.token_latency * 1000:g}ms per response token")
+    print(f"{'concepts':>8} {'edit':<12} {'calls':>10} {'prompt tokens':>14} {'response tokens':>16} "
+          f"{'time':>17} {'saved':>6}")
+    for size in args.sizes:
+        concepts = VOCABULARY[:size]
+        story = ai_agent.generate_memory_palace(concepts, None, use_cache=False)
+        for edit in EDITS:
+            new_concepts = apply_edit(concepts, edit, VOCABULARY[size:size + 2])
+            edited = measure(ai_agent.edit_memory_palace, concepts, story, new_concepts, None)
+            full = measure(ai_agent.generate_memory_palace, new_concepts, None, False)
+            print(f"{size:>8} {edit:<12} {edited['calls']:>3} vs {full['calls']:<4} "
+                  f"{edited['prompt_tokens']:>5} vs {full['prompt_tokens']:<5} "
+                  f"{edited['response_tokens']:>6} vs {full['response_tokens']:<6} "
+                  f"{edited['seconds'] * 1000:>6.0f} vs {full['seconds'] * 1000:<6.0f}ms "
+                  f"{1 - edited['seconds'] / full['seconds']:>5.0%}")
+
+
+if __name__ == "__main__":
+    main()
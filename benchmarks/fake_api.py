@@ -0,0 +1,11 @@
+"""ASGI entry point serving api.py against the same seeded fakes as fake_app.py.
+
+    uvicorn benchmarks.fake_api:app
+
+Takes the NEURONEST_BENCH_* settings documented in benchmarks/fake_app.py.
+"""
+from benchmarks.fake_app import seed_fakes
+
+seed_fakes()
+
+from api import app  # noqa: E402,F401
@@ -0,0 +1,73 @@
+"""Streamlit entry point serving app.py against the in-process fakes.
+
+    streamlit run benchmarks/fake_app.py
+
+Used by benchmarks.browser to drive a real Streamlit server without Supabase
+or Gemini, and by benchmarks.fake_api to serve api.py the same way. The
+fakes are installed and seeded once per server process, then app.py (or
+NEURONEST_BENCH_APP, e.g. an older checkout's) runs as usual.
+
+    NEURONEST_BENCH_PALACES      palaces seeded for reader@example.com / secret1 (default 100)
+    NEURONEST_BENCH_USERS        users seeded like it, reader1@example.com and on (default 1)
+    NEURONEST_BENCH_DB_LATENCY   seconds per fake Supabase round-trip (default 0.005)
+    NEURONEST_BENCH_LLM_LATENCY  seconds per fake Gemini call (default 0.2)
+"""
+import os
+import sys
+import runpy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.dirname(HERE)
+# `streamlit run` puts this folder first on sys.path, where benchmarks/review.py
+# and friends would shadow the app's modules of the same name
+sys.path[:] = [path for path in sys.path if os.path.abspath(path) != HERE]
+if ROOT not in sys.path:
+    sys.path.append(ROOT)
+
+from benchmarks.common import use_fake_environment  # noqa: E402
+
+use_fake_environment()
+
+import streamlit as st  # noqa: E402
+import db  # noqa: E402
+import ai_agent  # noqa: E402
+from storage.supabase_backend import SupabaseBackend  # noqa: E402
+from fakes import FakeSupabase, FakeGenerativeModel  # noqa: E402
+
+APP_PATH = os.getenv("NEURONEST_BENCH_APP", os.path.join(ROOT, "app.py"))
+USERNAME, PASSWORD = "reader@example.com", "secret1"
+
+
+def bench_username(n: int) -> str:
+    """Login of the n-th seeded user; all share PASSWORD"""
+    return USERNAME if n == 0 else f"reader{n}@example.com"
+
+
+def seed_fakes():
+    """Point db.py and ai_agent.py at seeded fakes; latency applies only after seeding"""
+    fake = FakeSupabase()
+    model = FakeGenerativeModel(latency=float(os.getenv("NEURONEST_BENCH_LLM_LATENCY", "0.2")))
+    db.set_backend(SupabaseBackend(fake))
+    ai_agent.set_model(model)
+    palaces = int(os.getenv("NEURONEST_BENCH_PALACES", "100"))
+    for user in range(int(os.getenv("NEURONEST_BENCH_USERS", "1"))):
+        db.create_user(bench_username(user), PASSWORD)
+        user_id = fake.tables['users'][user]['id']
+        for start in range(0, palaces, 1000):
+            db.save_palaces_bulk(user_id, [
+                ([f"Concept {n}", "Mitochondria"], f"A story about concept {n}.")
+                for n in range(start, min(palaces, start + 1000))
+            ])
+    fake.latency = float(os.getenv("NEURONEST_BENCH_DB_LATENCY", "0.005"))
+    return fake, model
+
+
+@st.cache_resource(show_spinner=False)
+def install_fakes():
+    """Seed the fakes once per server process"""
+    return seed_fakes()
+
+
+if __name__ == "__main__":
+    install_fakes()
+    runpy.run_path(APP_PATH, run_name="__main__")
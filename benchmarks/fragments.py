@@ -0,0 +1,188 @@
+"""Per-click work in a real Streamlit server, where fragments rerun on their own.
+
+    python -m benchmarks.fragments --palaces 100 --repeats 5
+    python -m benchmarks.fragments --baseline HEAD~1
+
+Starts `streamlit run` against the fakes (see benchmarks/fake_app.py) and
+clicks through the app over the browser websocket protocol: open a palace,
+generate, regenerate and clear its quiz, page and search the sidebar list
+and submit an empty build form. Each click is measured as everything the
+server does before the page settles: wall time, time spent running the
+script, bytes sent to the browser, full and fragment script runs, and DB
+and LLM calls from the app's telemetry. Wall time includes delivering the
+messages over the websocket; script time is the app's own work. AppTest
+can't show either, since it reruns the whole script for every click.
+
+--baseline runs the same clicks against another commit's app.py, exported
+with `git archive`, and prints both side by side.
+"""
+import os
+import json
+import asyncio
+import argparse
+import tarfile
+import tempfile
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+from benchmarks.browser import ROOT, serve_app, open_tab
+from benchmarks.fake_app import USERNAME, PASSWORD
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+BUILD_BUTTON = r"FormSubmitter:palace_form-.*"
+
+
+# Each scenario is one user action: (name, widget pattern, text to type or None to click)
+SCENARIOS = (
+    ("open_palace", r"palace_\d+", None),
+    ("generate_quiz", "generate_quiz", None),
+    ("new_questions", "regenerate_quiz", None),
+    ("clear_quiz", "clear_quiz", None),
+    ("load_more", "load_more_palaces", None),
+    ("search", "palace_search", "Concept 7"),
+    ("clear_search", "palace_search", ""),
+    ("empty_build", BUILD_BUTTON, None),
+)
+TOTALS = ('seconds', 'db_calls', 'llm_calls')
+
+
+def _totals(server) -> dict:
+    sessions = server.sessions().values()
+    return {key: sum(session.get(key, 0) for session in sessions) for key in TOTALS}
+
+
+async def _session(server) -> dict:
+    """Sign in on a new tab and run every scenario once; returns one sample per scenario"""
+    samples = {}
+    async with open_tab(server) as tab:
+        await tab.click("signin_to_create")
+        tab.fill("login_email", USERNAME)
+        tab.fill("login_pass", PASSWORD)
+        await tab.click("Sign In")
+        for name, pattern, text in SCENARIOS:
+            widget = tab.find(pattern)
+            if widget is None:
+                continue
+            before = _totals(server)
+            result = await (tab.click(widget) if text is None else tab.type(widget, text))
+            if result['exceptions']:
+                raise RuntimeError(f"{name} raised: {result['exceptions'][0]}")
+            after = _totals(server)
+            samples[name] = {
+                'wall_ms': result['seconds'] * 1000,
+                'script_ms': (after['seconds'] - before['seconds']) * 1000,
+                'bytes': result['bytes'],
+                'deltas': result['deltas'],
+                'full_runs': result['full_runs'],
+                'fragment_runs': result['fragment_runs'],
+                'db_calls': after['db_calls'] - before['db_calls'],
+                'llm_calls': after['llm_calls'] - before['llm_calls'],
+            }
+    return samples
+
+
+def run_app(app_root: str, palaces: int, repeats: int, db_latency: float, llm_latency: float) -> dict:
+    """Run every scenario in `repeats` fresh sessions against app_root's app.py"""
+    env = {
+        'NEURONEST_BENCH_PALACES': str(palaces),
+        'NEURONEST_BENCH_DB_LATENCY': str(db_latency),
+        'NEURONEST_BENCH_LLM_LATENCY': str(llm_latency),
+    }
+    samples = {name: [] for name, _, _ in SCENARIOS}
+    with serve_app(app_root, env) as server:
+        for _ in range(repeats):
+            for name, sample in asyncio.run(_session(server)).items():
+                samples[name].append(sample)
+
+    results = {}
+    for name, runs in samples.items():
+        if not runs:
+            continue
+        results[name] = {
+            'runs': len(runs),
+            'wall_ms_p50': statistics.median(run['wall_ms'] for run in runs),
+            'script_ms_p50': statistics.median(run['script_ms'] for run in runs),
+        }
+        for key in ('bytes', 'deltas', 'full_runs', 'fragment_runs', 'db_calls', 'llm_calls'):
+            results[name][key] = statistics.median(run[key] for run in runs)
+    return results
+
+
+def _git(*args) -> bytes:
+    return subprocess.run(["git", *args], cwd=ROOT, capture_output=True, check=True).stdout
+
+
+def export_commit(revision: str, directory: str) -> str:
+    """Unpack revision's tree into directory with `git archive`; returns its short hash"""
+    with tempfile.TemporaryFile() as archive:
+        archive.write(_git("archive", "--format=tar", revision))
+        archive.seek(0)
+        with tarfile.open(fileobj=archive) as tar:
+            tar.extractall(directory, filter="data")
+    return _git("rev-parse", "--short", revision).decode().strip()
+
+
+def _commit() -> str:
+    try:
+        return _git("rev-parse", "--short", "HEAD").decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: dict):
+    baseline = report.get('baseline')
+    print(f"\n{report['settings']['palaces']} palaces, {report['commit']}"
+          + (f" against {baseline['commit']}" if baseline else ""))
+    print(f"{'click':<14} {'wall p50':>10} {'script':>9} {'sent':>9} {'runs':>11} {'db':>4} {'llm':>4}")
+    for name, result in report['scenarios'].items():
+        runs = f"{result['full_runs']:g} full"
+        if result['fragment_runs']:
+            runs = f"{result['fragment_runs']:g} frag" if not result['full_runs'] else f"{runs}+{result['fragment_runs']:g}f"
+        line = (f"{name:<14} {result['wall_ms_p50']:>8.1f}ms {result['script_ms_p50']:>7.1f}ms "
+                f"{result['bytes'] / 1024:>6.1f}KiB {runs:>11} "
+                f"{result['db_calls']:>4g} {result['llm_calls']:>4g}")
+        old = (baseline or {}).get('scenarios', {}).get(name)
+        if old:
+            line += (f"  was {old['wall_ms_p50']:.1f}ms, {old['script_ms_p50']:.1f}ms, {old['bytes'] / 1024:.1f}KiB, "
+                     f"{old['full_runs']:g} full, {old['db_calls']:g} db")
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--palaces", type=int, default=100)
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh browser sessions")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Seconds per fake Supabase round-trip")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per fake Gemini call")
+    parser.add_argument("--baseline", help="Commit to run the same clicks against, e.g. HEAD~1")
+    parser.add_argument("--output", help="JSON file for the results (default benchmarks/results/fragments-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    settings = (args.palaces, args.repeats, args.db_latency, args.llm_latency)
+    commit = _commit()
+    report = {
+        'benchmark': 'fragments',
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'settings': {
+            'palaces': args.palaces, 'repeats': args.repeats,
+            'db_latency': args.db_latency, 'llm_latency': args.llm_latency,
+        },
+        'scenarios': run_app(ROOT, *settings),
+    }
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as checkout:
+            baseline = export_commit(args.baseline, checkout)
+            report['baseline'] = {'commit': baseline, 'scenarios': run_app(checkout, *settings)}
+    print_report(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"fragments-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
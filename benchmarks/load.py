@@ -0,0 +1,232 @@
+"""Concurrent sessions through whole user journeys against one Streamlit process.
+
+    python -m benchmarks.load --concurrency 1 4 16 --journeys 2
+    python -m benchmarks.load --concurrency 8 32 --db-latency 0.05 --llm-latency 1 --bcrypt-rounds 12
+
+Starts `streamlit run` against the fakes (see benchmarks/fake_app.py) and,
+for each concurrency level, runs that many browser sessions at once, each
+as its own seeded user. Every journey opens a new tab and walks through
+the app like a visitor: landing page, sign-in page, login, create a palace
+(then wait for it, polling like the browser does), open it, generate a
+quiz and log out.
+
+For each level it reports journeys and reruns per second, p50/p95/p99
+latency of every rerun (and p95 per step), how long palaces took to be
+built, and the server's resident memory before and at its peak. When
+reruns start queueing behind blocking DB, bcrypt or Gemini calls,
+latency climbs while throughput stops growing.
+"""
+import os
+import json
+import time
+import asyncio
+import argparse
+import threading
+import subprocess
+from collections import defaultdict
+from datetime import datetime, timezone
+
+from benchmarks.browser import ROOT, serve_app, open_tab
+from benchmarks.common import summarize
+from benchmarks.fake_app import PASSWORD, bench_username
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+BUILD_BUTTON = r"FormSubmitter:palace_form-.*"
+STEPS = ("landing", "sign_in_page", "login", "create_palace", "poll", "open_palace", "quiz", "logout")
+RSS_INTERVAL = 0.1
+
+
+def rss_bytes(pid: int) -> int:
+    """Resident memory of a process, from /proc (Linux); None where that isn't available"""
+    try:
+        with open(f"/proc/{pid}/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        return None
+    return None
+
+
+class RssSampler:
+    """Samples a process's RSS on a background thread; peak is the largest seen"""
+
+    def __init__(self, pid: int):
+        self.pid = pid
+        self.start = rss_bytes(pid)
+        self.peak = self.start
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(RSS_INTERVAL):
+            rss = rss_bytes(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class Recorder:
+    """Collects every rerun's latency by step"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)  # step -> seconds
+        self.ready = []  # seconds from submitting a palace to it being shown
+
+    def add(self, step: str, result: dict):
+        if result['exceptions']:
+            raise RuntimeError(f"{step} raised: {result['exceptions'][0]}")
+        self.latencies[step].append(result['seconds'])
+
+    def reruns(self) -> list:
+        return [seconds for values in self.latencies.values() for seconds in values]
+
+
+async def journey(server, recorder: Recorder, user: int, number: int, timeout: float):
+    """One visit from landing to logout by the user-th seeded user"""
+    async with open_tab(server) as tab:
+        recorder.add("landing", tab.first_load)
+        recorder.add("sign_in_page", await tab.click("signin_to_create"))
+        tab.fill("login_email", bench_username(user))
+        tab.fill("login_pass", PASSWORD)
+        recorder.add("login", await tab.click("Sign In"))
+
+        tab.fill("Enter concepts (one per line)", f"Load test {user}-{number}\nPhotosynthesis\nMitochondria")
+        # Skip the similar-palace offer, so every journey builds a palace
+        tab.fill("Always generate a fresh story", True)
+        submitted = time.perf_counter()
+        recorder.add("create_palace", await tab.click(tab.find(BUILD_BUTTON)))
+        # The finished job selects the new palace, which shows its delete button
+        while "delete_palace" not in tab.widgets:
+            if time.perf_counter() - submitted > timeout:
+                raise RuntimeError(f"palace for user {user} wasn't built within {timeout:g}s")
+            if not tab.auto_reruns:
+                raise RuntimeError(f"palace for user {user} isn't being built")
+            await asyncio.sleep(min(tab.auto_reruns.values()))
+            for result in await tab.poll():
+                recorder.add("poll", result)
+        recorder.ready.append(time.perf_counter() - submitted)
+
+        recorder.add("open_palace", await tab.click(tab.find(r"palace_\d+")))
+        recorder.add("quiz", await tab.click("generate_quiz"))
+        recorder.add("logout", await tab.click("🚪 Logout"))
+
+
+async def run_level(server, concurrency: int, journeys: int, timeout: float) -> dict:
+    """Run `concurrency` sessions of `journeys` journeys each at once"""
+    recorder = Recorder()
+
+    async def session(user):
+        for number in range(journeys):
+            await journey(server, recorder, user, number, timeout)
+
+    with RssSampler(server.pid) as rss:
+        started = time.perf_counter()
+        await asyncio.gather(*(session(user) for user in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    reruns = recorder.reruns()
+    return {
+        'concurrency': concurrency,
+        'seconds': elapsed,
+        'journeys': concurrency * journeys,
+        'journeys_per_sec': concurrency * journeys / elapsed,
+        'reruns_per_sec': len(reruns) / elapsed,
+        'reruns': summarize(reruns),
+        'steps': {step: summarize(recorder.latencies[step]) for step in STEPS},
+        'palace_ready': summarize(recorder.ready),
+        'rss_start_bytes': rss.start,
+        'rss_peak_bytes': rss.peak,
+    }
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, check=True
+        ).stdout.decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def _mib(value) -> str:
+    return "n/a" if value is None else f"{value / 2 ** 20:.0f}"
+
+
+def print_report(report: dict):
+    settings = report['settings']
+    print(f"\n{settings['palaces']} palaces per user, {settings['db_latency'] * 1000:g}ms DB, "
+          f"{settings['llm_latency'] * 1000:g}ms LLM, bcrypt rounds {settings['bcrypt_rounds']}, "
+          f"{settings['journeys']} journeys per session, {report['commit']}")
+    print(f"{'sessions':>8} {'journeys/s':>11} {'reruns/s':>9} {'p50':>9} {'p95':>9} {'p99':>9} "
+          f"{'ready p50':>10} {'RSS MiB':>12}")
+    for level in report['levels']:
+        reruns = level['reruns']
+        print(f"{level['concurrency']:>8} {level['journeys_per_sec']:>11.2f} {level['reruns_per_sec']:>9.1f} "
+              f"{reruns['p50_ms']:>7.1f}ms {reruns['p95_ms']:>7.1f}ms {reruns['p99_ms']:>7.1f}ms "
+              f"{level['palace_ready']['p50_ms'] / 1000:>9.2f}s "
+              f"{_mib(level['rss_start_bytes']):>5} -> {_mib(level['rss_peak_bytes']):<4}")
+    print("\np95 per step (ms)")
+    print(f"{'sessions':>8} " + " ".join(f"{step:>13}" for step in STEPS))
+    for level in report['levels']:
+        print(f"{level['concurrency']:>8} " + " ".join(
+            f"{level['steps'][step]['p95_ms']:>13.1f}" for step in STEPS
+        ))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16],
+                        help="Concurrent sessions at each level, run one level after another")
+    parser.add_argument("--journeys", type=int, default=2, help="Journeys per session at each level")
+    parser.add_argument("--palaces", type=int, default=100, help="Palaces seeded per user")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Seconds per fake Supabase round-trip")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per fake Gemini call")
+    parser.add_argument("--bcrypt-rounds", type=int, default=4,
+                        help="NEURONEST_BCRYPT_ROUNDS of the server; production uses 12")
+    parser.add_argument("--timeout", type=float, default=120, help="Seconds to wait for a palace to be built")
+    parser.add_argument("--output", help="JSON file for the results (default benchmarks/results/load-<commit>.json)")
+    args = parser.parse_args(argv)
+
+    commit = _commit()
+    report = {
+        'benchmark': 'load',
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'settings': {
+            'palaces': args.palaces, 'journeys': args.journeys, 'db_latency': args.db_latency,
+            'llm_latency': args.llm_latency, 'bcrypt_rounds': args.bcrypt_rounds,
+        },
+        'levels': [],
+    }
+    env = {
+        'NEURONEST_BENCH_PALACES': str(args.palaces),
+        'NEURONEST_BENCH_USERS': str(max(args.concurrency)),
+        'NEURONEST_BENCH_DB_LATENCY': str(args.db_latency),
+        'NEURONEST_BENCH_LLM_LATENCY': str(args.llm_latency),
+        'NEURONEST_BCRYPT_ROUNDS': str(args.bcrypt_rounds),
+    }
+    with serve_app(env=env, timeout=300) as server:
+        for concurrency in args.concurrency:
+            level = asyncio.run(run_level(server, concurrency, args.journeys, args.timeout))
+            report['levels'].append(level)
+            print(f"{concurrency} sessions: {level['journeys_per_sec']:.2f} journeys/s, "
+                  f"rerun p95 {level['reruns']['p95_ms']:.0f}ms")
+    print_report(report)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"load-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Per-rerun message size for each page of the app.
+
+    python -m benchmarks.payload
+
+Runs app.py through Streamlit's AppTest harness against local fakes and
+reports the serialized size of the elements each rerun sends to the browser.
+"""
+import os
+import argparse
+
+from benchmarks.common import use_fake_environment, rerun_payload_bytes
+
+use_fake_environment()
+
+import db  # noqa: E402
+import ai_agent  # noqa: E402
+from storage.supabase_backend import SupabaseBackend  # noqa: E402
+from fakes import FakeSupabase, FakeGenerativeModel  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+
+
+def measure(palaces: int) -> dict:
+    fake = FakeSupabase()
+    db.set_backend(SupabaseBackend(fake))
+    ai_agent.set_model(FakeGenerativeModel())
+    db.create_user("reader@example.com", "secret1")
+    user_id = fake.tables['users'][0]['id']
+    if palaces:
+        db.save_palaces_bulk(user_id, [([f"Concept {n}", "Mitochondria"], "A story.") for n in range(palaces)])
+
+    at = AppTest.from_file(APP_PATH, default_timeout=60)
+    results = {}
+    at.run()
+    results['landing'] = rerun_payload_bytes(at)
+    at.session_state.page = "auth"
+    at.run()
+    results['auth'] = rerun_payload_bytes(at)
+    at.session_state.user_id = user_id
+    at.session_state.username = "reader@example.com"
+    at.session_state.page = "app"
+    at.run()
+    results['app'] = rerun_payload_bytes(at)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--palaces", type=int, default=10, help="Palaces in the signed-in user's library")
+    args = parser.parse_args(argv)
+
+    for page, size in measure(args.palaces).items():
+        print(f"{page:>8}: {size / 1024:7.1f} KiB per rerun")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""Replicas sharing one Gemini budget: requests granted and cost per quota check.
+
+    python -m benchmarks.quota --replicas 4 --seconds 5 --rpm 600
+    python -m benchmarks.quota --stores memory sqlite redis://localhost:6379/0
+
+Starts one process per replica, each taking request tokens from the same
+bucket as fast as it is allowed for the same few seconds, the way replicas
+behind a load balancer do when users are waiting. With the per-process
+memory store every replica has its own budget, so together they are granted
+about replicas times the budget; a shared store (SQLite file or Redis)
+should keep the total at one budget. Also reports the latency of each
+atomic take, which every AI call pays once per bucket.
+"""
+import os
+import time
+import argparse
+import tempfile
+import multiprocessing
+
+from benchmarks.common import summarize
+from quota import QuotaBucket, create_store
+
+
+def _replica(url: str, rpm: float, start_at: float, seconds: float, results):
+    store = create_store("" if url == "memory" else url)
+    bucket = QuotaBucket("gemini:requests", rpm, store=store, clock=time.time)
+    granted, takes = 0, []
+    while time.time() < start_at:
+        time.sleep(0.001)
+    while (remaining := start_at + seconds - time.time()) > 0:
+        started = time.perf_counter()
+        wait = bucket.try_acquire()
+        takes.append(time.perf_counter() - started)
+        if wait:
+            time.sleep(min(wait, remaining))
+        else:
+            granted += 1
+    results.put((granted, takes))
+
+
+def run_store(url: str, replicas: int, rpm: float, seconds: float) -> dict:
+    """Run the replicas against one store; returns requests granted in total and take latencies"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    start_at = time.time() + 2  # time for every process to start
+    processes = [
+        context.Process(target=_replica, args=(url, rpm, start_at, seconds, results))
+        for _ in range(replicas)
+    ]
+    for process in processes:
+        process.start()
+    outcomes = [results.get() for _ in processes]
+    for process in processes:
+        process.join()
+    return {
+        'granted': sum(granted for granted, _ in outcomes),
+        'per_replica': [granted for granted, _ in outcomes],
+        'takes': [take for _, takes in outcomes for take in takes],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--replicas", type=int, default=4)
+    parser.add_argument("--seconds", type=float, default=5.0)
+    parser.add_argument("--rpm", type=float, default=600, help="NEURONEST_GEMINI_RPM shared by all replicas")
+    parser.add_argument("--stores", nargs="+", default=["memory", "sqlite"],
+                        help="memory, sqlite (a temporary file) or a NEURONEST_QUOTA_URL such as redis://...")
+    args = parser.parse_args(argv)
+    # A full bucket to start with, then the refill over the run
+    budget = args.rpm + args.rpm / 60 * args.seconds
+
+    print(f"{args.replicas} replicas for {args.seconds:g}s at {args.rpm:g} requests/min: one budget is {budget:.0f}")
+    print(f"{'store':<10} {'granted':>8} {'x budget':>9} {'per replica':<24} {'take p50':>9} {'take p99':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for store in args.stores:
+            url = f"sqlite://{os.path.join(tmp, 'quota.sqlite3')}" if store == "sqlite" else store
+            result = run_store(url, args.replicas, args.rpm, args.seconds)
+            takes = summarize(result['takes'])
+            name = store.split("://")[0]
+            print(f"{name:<10} {result['granted']:>8} {result['granted'] / budget:>8.2f}x "
+                  f"{str(result['per_replica']):<24} {takes['p50_ms']:>7.3f}ms {takes['p99_ms']:>7.3f}ms")
+
+
+if __name__ == "__main__":
+    main()
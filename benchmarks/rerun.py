@@ -0,0 +1,197 @@
+"""Cost of each click in app.py, per rerun, for small and large libraries.
+
+    python -m benchmarks.rerun --palaces 10 1000 10000 --db-latency 0.005 --llm-latency 0.2
+    python -m benchmarks.rerun --compare benchmarks/results/rerun-<old commit>.json
+
+Drives app.py's main() through Streamlit's AppTest harness against the
+in-process fake Supabase client and fake Gemini model. Each scenario is one
+user action (a click or text entry) and is measured as the rerun it causes:
+wall time, database round-trips by table, model calls and the size of the
+elements sent to the browser. Results are written as JSON, named after the
+current commit, so runs can be compared across commits with --compare.
+"""
+import os
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from collections import Counter
+from datetime import datetime, timezone
+
+from benchmarks.common import use_fake_environment, rerun_payload_bytes
+
+use_fake_environment()
+
+import db  # noqa: E402
+import ai_agent  # noqa: E402
+from storage.supabase_backend import SupabaseBackend  # noqa: E402
+from fakes import FakeSupabase, FakeGenerativeModel  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP_PATH = os.path.join(ROOT, "app.py")
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+
+def _click(at, key=None, label=None, prefix=None):
+    """Click the first matching button, or return None if the page has none"""
+    for button in at.button:
+        button_key = button.key or ""
+        if (key and button_key == key) or (label and label in button.label) or (prefix and button_key.startswith(prefix)):
+            return button.click()
+    return None
+
+
+def _sign_in(at, user_id):
+    at.session_state.user_id = user_id
+    at.session_state.username = "reader@example.com"
+    at.session_state.page = "app"
+    return at
+
+
+def _build_palace(at, user_id):
+    at.text_area[0].input("Photosynthesis\nMitochondria")
+    return _click(at, label="Generate Palace")
+
+
+# Each scenario prepares one user action on the rendered app and returns the
+# element to rerun, or None to skip it when the page does not offer that action
+SCENARIOS = (
+    ("first_load", _sign_in),
+    ("idle_rerun", lambda at, user_id: at),
+    ("open_palace", lambda at, user_id: _click(at, prefix="palace_")),
+    ("generate_quiz", lambda at, user_id: _click(at, key="generate_quiz")),
+    ("load_more", lambda at, user_id: _click(at, key="load_more_palaces")),
+    ("search", lambda at, user_id: at.text_input(key="palace_search").input("Concept 7")),
+    ("clear_search", lambda at, user_id: at.text_input(key="palace_search").input("")),
+    ("build_palace", _build_palace),
+    ("start_review", lambda at, user_id: _click(at, key="start_review")),
+)
+
+
+def _calls_by_table(before: Counter, after: Counter) -> dict:
+    return {f"{table}.{op}": after[(table, op)] - before[(table, op)]
+            for table, op in after if after[(table, op)] - before[(table, op)]}
+
+
+def run_library(palaces: int, repeats: int, db_latency: float, llm_latency: float) -> dict:
+    """Run every scenario `repeats` times against a library of `palaces` palaces"""
+    fake = FakeSupabase()
+    model = FakeGenerativeModel(latency=llm_latency)
+    db.set_backend(SupabaseBackend(fake))
+    ai_agent.set_model(model)
+    db.create_user("reader@example.com", "secret1")
+    user_id = fake.tables['users'][0]['id']
+    for start in range(0, palaces, 1000):
+        db.save_palaces_bulk(user_id, [
+            ([f"Concept {n}", "Mitochondria"], f"A story about concept {n}.")
+            for n in range(start, min(palaces, start + 1000))
+        ])
+    # Latency applies to the measured clicks, not to seeding the library
+    fake.latency = db_latency
+
+    samples = {name: [] for name, _ in SCENARIOS}
+    for _ in range(repeats):
+        db._cache.clear()
+        at = AppTest.from_file(APP_PATH, default_timeout=120)
+        at.run()
+        for name, action in SCENARIOS:
+            interaction = action(at, user_id)
+            if interaction is None:
+                continue
+            calls, model_calls = Counter(fake.calls), model.calls
+            started = time.perf_counter()
+            interaction.run()
+            elapsed = time.perf_counter() - started
+            if at.exception:
+                raise RuntimeError(f"{name} raised: {at.exception[0].message}")
+            samples[name].append({
+                'wall_ms': elapsed * 1000,
+                'db_calls': sum(fake.calls.values()) - sum(calls.values()),
+                'db_calls_by_table': _calls_by_table(calls, fake.calls),
+                'llm_calls': model.calls - model_calls,
+                'payload_bytes': rerun_payload_bytes(at),
+            })
+
+    results = {}
+    for name, runs in samples.items():
+        if not runs:
+            continue
+        results[name] = {
+            'runs': len(runs),
+            'wall_ms_p50': statistics.median(run['wall_ms'] for run in runs),
+            'wall_ms_max': max(run['wall_ms'] for run in runs),
+            'db_calls': statistics.median(run['db_calls'] for run in runs),
+            'db_calls_by_table': runs[-1]['db_calls_by_table'],
+            'llm_calls': statistics.median(run['llm_calls'] for run in runs),
+            'payload_bytes': runs[-1]['payload_bytes'],
+        }
+    return results
+
+
+def _commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def print_report(report: dict, baseline: dict = None):
+    for size, scenarios in report['libraries'].items():
+        print(f"\n{size} palaces")
+        print(f"{'scenario':<15} {'wall p50':>10} {'wall max':>10} {'db calls':>9} {'llm':>4} {'payload':>10}")
+        for name, result in scenarios.items():
+            line = (
+                f"{name:<15} {result['wall_ms_p50']:>8.1f}ms {result['wall_ms_max']:>8.1f}ms "
+                f"{result['db_calls']:>9g} {result['llm_calls']:>4g} {result['payload_bytes'] / 1024:>7.1f}KiB"
+            )
+            old = (baseline or {}).get('libraries', {}).get(size, {}).get(name)
+            if old:
+                change = (result['wall_ms_p50'] - old['wall_ms_p50']) / max(old['wall_ms_p50'], 1e-9) * 100
+                line += f"  ({change:+.0f}% wall, {result['db_calls'] - old['db_calls']:+g} db calls)"
+            print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--palaces", type=int, nargs="+", default=[10, 1000, 10000])
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh sessions per library size")
+    parser.add_argument("--db-latency", type=float, default=0.005, help="Seconds per fake Supabase round-trip")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="Seconds per fake Gemini call")
+    parser.add_argument("--output", help="JSON file for the results (default benchmarks/results/rerun-<commit>.json)")
+    parser.add_argument("--compare", help="Earlier results JSON to show changes against")
+    args = parser.parse_args(argv)
+
+    commit = _commit()
+    report = {
+        'benchmark': 'rerun',
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        'settings': {
+            'repeats': args.repeats, 'db_latency': args.db_latency, 'llm_latency': args.llm_latency,
+        },
+        'libraries': {
+            str(size): run_library(size, args.repeats, args.db_latency, args.llm_latency)
+            for size in args.palaces
+        },
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Comparing {commit} against {baseline.get('commit')}")
+    print_report(report, baseline)
+
+    output = args.output or os.path.join(RESULTS_DIR, f"rerun-{commit}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nSaved results to {output}")
+
+
+if __name__ == "__main__":
+    main()
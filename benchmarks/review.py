@@ -0,0 +1,93 @@
+"""Review scheduler latency with tens of thousands of review items.
+
+    python -m benchmarks.review --palaces 50000 --sessions 50
+
+Fills a temporary SQLite store with one user's palaces, spreads their due
+dates over two months, then times what a review session does: fetch the
+due set, count it, and write a session's grades back in one batch. Also
+times the in-memory DueQueue at the same size.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from benchmarks.common import use_fake_environment, summarize
+
+use_fake_environment()
+
+import db  # noqa: E402
+from review import DueQueue, GRADES, schedule, timestamp  # noqa: E402
+from storage.sqlite_backend import SQLiteBackend  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--palaces", type=int, default=50000)
+    parser.add_argument("--sessions", type=int, default=50, help="Review sessions to simulate")
+    parser.add_argument("--session-size", type=int, default=50, help="Palaces graded per session")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+    now = datetime.now(timezone.utc)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.set_backend(SQLiteBackend(os.path.join(tmp, "review.sqlite3")))
+        db.create_user("reader@example.com", "secret1")
+        user_id = db.authenticate("reader@example.com", "secret1")
+
+        started = time.perf_counter()
+        for start in range(0, args.palaces, 1000):
+            count = min(1000, args.palaces - start)
+            db.save_palaces_bulk(user_id, [([f"concept {start + n}"], "story") for n in range(count)])
+        states = db.get_due_reviews(user_id, limit=args.palaces)
+        spread = [
+            state._replace(due_at=timestamp(now + timedelta(days=rng.uniform(-30, 30))))
+            for state in states
+        ]
+        db.save_reviews(user_id, spread)
+        print(f"Created {args.palaces} review items in {time.perf_counter() - started:.1f}s")
+
+        fetch, count, write = [], [], []
+        for _ in range(args.sessions):
+            started = time.perf_counter()
+            due = db.get_due_reviews(user_id, limit=args.session_size)
+            fetch.append(time.perf_counter() - started)
+
+            db._cache.invalidate(('due_count', user_id))
+            started = time.perf_counter()
+            db.count_due_reviews(user_id)
+            count.append(time.perf_counter() - started)
+
+            graded = [schedule(state, rng.choice(GRADES)[1], now) for state in due]
+            started = time.perf_counter()
+            db.save_reviews(user_id, graded)
+            write.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    queue = DueQueue(spread)
+    build = time.perf_counter() - started
+    pops = []
+    while True:
+        started = time.perf_counter()
+        state = queue.pop_due(now)
+        pops.append(time.perf_counter() - started)
+        if state is None:
+            break
+    print(f"DueQueue: built from {len(spread)} states in {build * 1000:.1f}ms, drained {len(pops) - 1} due")
+
+    print(f"{'operation':<22} {'p50':>9} {'p99':>9} {'count':>6}")
+    for name, values in (
+        ("get_due_reviews", fetch),
+        ("count_due_reviews", count),
+        (f"save_reviews x{args.session_size}", write),
+        ("DueQueue.pop_due", pops),
+    ):
+        result = summarize(values)
+        print(f"{name:<22} {result['p50_ms']:>7.3f}ms {result['p99_ms']:>7.3f}ms {result['count']:>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Palace search latency on large libraries.
+
+    python -m benchmarks.search --palaces 10000 --queries 200
+
+Fills a temporary SQLite store with one user's palaces and compares the
+FTS5-backed db.search_palaces against the old approach of scanning every
+get_palaces row in Python. Also reports the cost of keeping the index
+up to date on save_palace and delete_palace.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from benchmarks.common import use_fake_environment, summarize
+
+use_fake_environment()
+
+import db  # noqa: E402
+from storage.sqlite_backend import SQLiteBackend  # noqa: E402
+
+WORDS = (
+    "photosynthesis mitochondria enzyme osmosis neuron synapse gravity inertia "
+    "momentum entropy catalyst isotope electron proton neutron molecule genome "
+    "protein ribosome chlorophyll glucose membrane nucleus volcano glacier delta "
+    "estuary tectonic magma sediment fossil climate monsoon equator latitude"
+).split()
+# A few thousand distinct terms so queries are selective, like real study notes
+VOCABULARY = [f"{word}{n}" for word in WORDS for n in range(100)]
+
+
+def fill(user_id: int, palaces: int, rng: random.Random):
+    batch = []
+    for _ in range(palaces):
+        concepts = rng.sample(VOCABULARY, 4)
+        story = " ".join(rng.choice(VOCABULARY) for _ in range(120))
+        batch.append((concepts, story))
+        if len(batch) == 500:
+            db.save_palaces_bulk(user_id, batch)
+            batch = []
+    if batch:
+        db.save_palaces_bulk(user_id, batch)
+
+
+def scan_search(user_id: int, query: str, limit: int = 20) -> list:
+    """The client-side alternative: fetch everything and filter in Python"""
+    words = query.lower().split()
+    db._cache.invalidate(('palaces', user_id))
+    matches = [
+        palace for palace in db.get_palaces(user_id)
+        if all(word in ", ".join(palace[1]).lower() or word in palace[2].lower() for word in words)
+    ]
+    return matches[:limit]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--palaces", type=int, default=10000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.set_backend(SQLiteBackend(os.path.join(tmp, "search.sqlite3")))
+        db.create_user("reader@example.com", "secret1")
+        user_id = db.authenticate("reader@example.com", "secret1")
+
+        started = time.perf_counter()
+        fill(user_id, args.palaces, rng)
+        print(f"Indexed {args.palaces} palaces in {time.perf_counter() - started:.1f}s")
+
+        queries = [
+            " ".join(rng.sample(VOCABULARY, rng.choice((1, 2)))) for _ in range(args.queries)
+        ]
+        fts, scan = [], []
+        for query in queries:
+            started = time.perf_counter()
+            db.search_palaces(user_id, query)
+            fts.append(time.perf_counter() - started)
+        for query in queries[:max(1, args.queries // 10)]:
+            started = time.perf_counter()
+            scan_search(user_id, query)
+            scan.append(time.perf_counter() - started)
+
+        saves, deletes = [], []
+        for _ in range(100):
+            started = time.perf_counter()
+            palace = db.save_palace(user_id, rng.sample(VOCABULARY, 4), " ".join(rng.sample(VOCABULARY, 20)))
+            saves.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            db.delete_palace(palace[0], user_id)
+            deletes.append(time.perf_counter() - started)
+
+    print(f"{'operation':<16} {'p50':>9} {'p99':>9} {'count':>6}")
+    for name, values in (
+        ("fts search", fts),
+        ("python scan", scan),
+        ("save_palace", saves),
+        ("delete_palace", deletes),
+    ):
+        result = summarize(values)
+        print(f"{name:<16} {result['p50_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms {result['count']:>6}")
+
+
+if __name__ == "__main__":
+    main()
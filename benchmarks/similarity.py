@@ -0,0 +1,101 @@
+"""Near-duplicate palace detection: index cost, query latency and hit rate.
+
+    python -m benchmarks.similarity --palaces 10000 --requests 500
+
+Fills a temporary SQLite store with one user's palaces, then replays build
+requests where half are edits of an existing palace (reordered, re-cased,
+a plural, or one concept added) and half are unrelated. Reports how long
+the first lookup takes to build the user's index, the per-request lookup
+latency, and how many requests would have been offered a reuse, i.e. the
+AI calls a user accepting every offer would avoid.
+"""
+import os
+import time
+import random
+import argparse
+import tempfile
+
+from benchmarks.common import use_fake_environment, summarize
+
+use_fake_environment()
+
+import db  # noqa: E402
+from storage.sqlite_backend import SQLiteBackend  # noqa: E402
+
+WORDS = (
+    "photosynthesis mitochondria enzyme osmosis neuron synapse gravity inertia "
+    "momentum entropy catalyst isotope electron proton neutron molecule genome "
+    "protein ribosome chlorophyll glucose membrane nucleus volcano glacier delta "
+    "estuary tectonic magma sediment fossil climate monsoon equator latitude"
+).split()
+# Two-word concepts like "glacier entropy", about a thousand distinct ones
+VOCABULARY = [f"{first} {second}" for first in WORDS for second in WORDS if first != second]
+
+
+def near_duplicate(concepts: list, rng: random.Random) -> list:
+    """The kind of edit a user makes when re-entering a list they already studied"""
+    edited = [concept.casefold() if rng.random() < 0.5 else concept.title() for concept in concepts]
+    rng.shuffle(edited)
+    change = rng.choice(("reorder", "plural", "extra"))
+    if change == "plural":
+        edited[0] += "s"
+    elif change == "extra":
+        edited.append(rng.choice(VOCABULARY))
+    return edited
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--palaces", type=int, default=10000)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--threshold", type=float, default=None, help="Default NEURONEST_SIMILARITY_THRESHOLD")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args(argv)
+    rng = random.Random(args.seed)
+    threshold = db.SIMILARITY_THRESHOLD if args.threshold is None else args.threshold
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.set_backend(SQLiteBackend(os.path.join(tmp, "similarity.sqlite3")))
+        db.create_user("reader@example.com", "secret1")
+        user_id = db.authenticate("reader@example.com", "secret1")
+
+        library = [rng.sample(VOCABULARY, rng.randint(3, 6)) for _ in range(args.palaces)]
+        for start in range(0, len(library), 1000):
+            db.save_palaces_bulk(user_id, [(concepts, "story") for concepts in library[start:start + 1000]])
+
+        started = time.perf_counter()
+        db.find_similar_palaces(user_id, ["warm up"])
+        build = time.perf_counter() - started
+        print(f"Built the similarity index for {args.palaces} palaces in {build * 1000:.0f}ms")
+
+        lookups, offered = [], {'near-duplicate': 0, 'unrelated': 0}
+        for n in range(args.requests):
+            kind = 'near-duplicate' if n % 2 == 0 else 'unrelated'
+            if kind == 'near-duplicate':
+                concepts = near_duplicate(rng.choice(library), rng)
+            else:
+                concepts = rng.sample(VOCABULARY, rng.randint(3, 6))
+            started = time.perf_counter()
+            matches = db.find_similar_palaces(user_id, concepts, threshold=threshold)
+            lookups.append(time.perf_counter() - started)
+            offered[kind] += bool(matches)
+
+        saves = []
+        for _ in range(100):
+            started = time.perf_counter()
+            palace = db.save_palace(user_id, rng.sample(VOCABULARY, 4), "story")
+            saves.append(time.perf_counter() - started)
+            db.delete_palace(palace[0], user_id)
+
+    half = args.requests / 2
+    print(f"Threshold {threshold:.2f}: offered reuse for {offered['near-duplicate']}/{half:.0f} near-duplicates "
+          f"and {offered['unrelated']}/{half:.0f} unrelated requests")
+    print(f"AI calls avoided if every offer is taken: {sum(offered.values())}/{args.requests}")
+    print(f"{'operation':<22} {'p50':>9} {'p99':>9} {'count':>6}")
+    for name, values in (("find_similar_palaces", lookups), ("save_palace (indexed)", saves)):
+        result = summarize(values)
+        print(f"{name:<22} {result['p50_ms']:>7.2f}ms {result['p99_ms']:>7.2f}ms {result['count']:>6}")
+
+
+if __name__ == "__main__":
+    main()
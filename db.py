@@ -1,17 +1,71 @@
 import os
 import bcrypt
-from supabase import create_client, Client
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
+from cache import TTLCache
+from quiz import quiz_to_json, quiz_from_json
+from review import timestamp
+from similarity import SimilarityIndex
+from storage import StorageBackend, DuplicateUserError, concept_display, create_backend
+from telemetry import TracedBackend, annotate, traced
 
 load_dotenv()
 
-# Initialize Supabase client
-url: str = os.getenv("SUPABASE_URL")
-key: str = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(url, key)
+# Storage backend (Supabase by default), created on first use and shared by the whole process.
+# It is wrapped so every call is recorded as a storage.<method> trace span.
+_backend: StorageBackend = None
+_backend_lock = threading.Lock()
+_db_ready: bool = None
 
-def init_db():
+# Read-through cache for user and palace lookups, keyed by user and palace ID
+_cache = TTLCache(
+    maxsize=int(os.getenv("NEURONEST_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("NEURONEST_CACHE_TTL", "300")),
+)
+
+# Per-user concept similarity indexes, built from storage on first use and kept
+# current by this process's saves and deletes; the TTL picks up other replicas' writes
+SIMILARITY_THRESHOLD = float(os.getenv("NEURONEST_SIMILARITY_THRESHOLD", "0.9"))
+_similarity = TTLCache(maxsize=int(os.getenv("NEURONEST_SIMILARITY_USERS", "16")), ttl=3600)
+_similarity_lock = threading.Lock()
+
+# bcrypt work runs on a small bounded pool so concurrent logins can't saturate every core
+BCRYPT_ROUNDS = int(os.getenv("NEURONEST_BCRYPT_ROUNDS", "12"))
+HASH_WORKERS = int(os.getenv("NEURONEST_HASH_WORKERS", "2"))
+_hash_pool = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+
+def get_backend() -> StorageBackend:
+    """Get the process-wide storage backend selected by NEURONEST_STORAGE, creating it on first use"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = TracedBackend(create_backend())
+    return _backend
+
+def set_backend(backend: StorageBackend):
+    """Use the given backend (e.g. SQLite, or Supabase over a local fake client)"""
+    global _backend, _db_ready
+    with _backend_lock:
+        _backend = TracedBackend(backend)
+        _db_ready = None
+    _cache.clear()
+    _similarity.clear()
+
+def _cached(key):
+    """Look key up in the lookup cache, noting the hit or miss on the current trace span"""
+    value = _cache.get(key)
+    annotate(cache='miss' if value is None else 'hit')
+    return value
+
+def cache_stats() -> dict:
+    """Return hit/miss counters for the lookup cache"""
+    return _cache.stats()
+
+@traced("db.init_db")
+def init_db(force: bool = False) -> bool:
     """
     Initialize database tables. 
     Note: You should create these tables in your Supabase dashboard:
@@ -29,135 +83,480 @@ def init_db():
        - story (text)
        - created_at (timestamptz, default now())
     
+    3. Create 'quizzes' table with columns:
+       - id (int8, primary key, auto-increment)
+       - palace_id (int8, unique, foreign key to palaces.id, on delete cascade)
+       - questions (jsonb)
+       - created_at (timestamptz, default now())
+    
     Enable Row Level Security (RLS) and create policies as needed.
+    With NEURONEST_STORAGE=sqlite the tables are created automatically.
+    
+    This is the readiness probe: the connectivity check runs once per
+    process and its result is reused, unless force=True.
     """
+    global _db_ready
+    if _db_ready is not None and not force:
+        return _db_ready
+    
     try:
         # Test connection
-        response = supabase.table('users').select("id").limit(1).execute()
+        get_backend().ping()
         print("✅ Database connection successful")
-        return True
+        _db_ready = True
     except Exception as e:
         print(f"❌ Database connection failed: {e}")
-        return False
+        _db_ready = False
+    return _db_ready
+
+def _hashpw(password: str, rounds: int) -> str:
+    salt = bcrypt.gensalt(rounds=rounds)
+    return bcrypt.hashpw(password.encode('utf-8'), salt).decode('utf-8')
+
+def _checkpw(password: str, hashed: str) -> bool:
+    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
 
 def hash_password(password: str) -> str:
-    """Hash password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    """Hash password using bcrypt on the hashing pool"""
+    return _hash_pool.submit(_hashpw, password, BCRYPT_ROUNDS).result()
 
 def verify_password(password: str, hashed: str) -> bool:
-    """Verify password against hash"""
-    return bcrypt.checkpw(password.encode('utf-8'), hashed.encode('utf-8'))
+    """Verify password against hash on the hashing pool"""
+    return _hash_pool.submit(_checkpw, password, hashed).result()
 
+def needs_rehash(hashed: str) -> bool:
+    """Check whether a bcrypt hash was made with a different cost than BCRYPT_ROUNDS"""
+    try:
+        return int(hashed.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+def _rehash_password(user_id: int, password: str):
+    """Store a hash with the current cost factor for a user (runs on the hashing pool)"""
+    try:
+        get_backend().update_password_hash(user_id, _hashpw(password, BCRYPT_ROUNDS))
+    except Exception as e:
+        print(f"Error rehashing password: {e}")
+
+@traced("db.create_user")
 def create_user(username: str, password: str) -> bool:
-    """Create a new user account"""
+    """Create a new user account (one insert; the unique username constraint rejects duplicates)"""
     try:
-        # Check if user already exists
-        existing_user = supabase.table('users').select("id").eq('username', username).execute()
-        if existing_user.data:
-            return False  # User already exists
-        
-        # Create new user
         hashed_password = hash_password(password)
-        response = supabase.table('users').insert({
-            'username': username,
-            'password_hash': hashed_password
-        }).execute()
-        
-        return len(response.data) > 0
+        return get_backend().create_user(username, hashed_password) is not None
+    except DuplicateUserError:
+        return False  # User already exists
     except Exception as e:
         print(f"Error creating user: {e}")
         return False
 
+@traced("db.authenticate")
 def authenticate(username: str, password: str) -> int:
     """Authenticate user and return user ID if successful"""
     try:
-        response = supabase.table('users').select("id, password_hash").eq('username', username).execute()
+        credentials = get_backend().get_credentials(username)
         
-        if not response.data:
+        if not credentials:
             return None  # User not found
         
-        user = response.data[0]
-        if verify_password(password, user['password_hash']):
-            return user['id']
+        user_id, password_hash = credentials
+        if verify_password(password, password_hash):
+            if needs_rehash(password_hash):
+                # Upgrade the stored hash in the background; login doesn't wait for it
+                _hash_pool.submit(_rehash_password, user_id, password)
+            return user_id
         
         return None  # Invalid password
     except Exception as e:
         print(f"Error authenticating user: {e}")
         return None
 
-def save_palace(user_id: int, concepts: list, story: str) -> bool:
-    """Save a new memory palace"""
+@traced("db.save_palace")
+def save_palace(user_id: int, concepts: list, story: str) -> tuple:
+    """Save a new memory palace and return the created (id, concepts, story, created_at) row"""
     try:
-        response = supabase.table('palaces').insert({
-            'user_id': user_id,
-            'concepts': '\n'.join(concepts),
-            'story': story
-        }).execute()
+        rows = get_backend().insert_palaces(user_id, [(list(concepts), story)])
+        
+        _cache.invalidate(('palaces', user_id), ('palace_count', user_id), ('due_count', user_id))
+        if not rows:
+            return None
         
-        return len(response.data) > 0
+        palace = tuple(rows[0])
+        _cache.set(('palace', palace[0]), palace)
+        _index_palaces(user_id, [palace])
+        return palace
     except Exception as e:
         print(f"Error saving palace: {e}")
-        return False
+        return None
+
+@traced("db.save_palaces_bulk")
+def save_palaces_bulk(user_id: int, palaces: list) -> list:
+    """
+    Save many (concepts, story) pairs for a user in a single insert.
+
+    Returns the created (id, concepts, story, created_at) rows, or an empty
+    list if the insert failed.
+    """
+    if not palaces:
+        return []
+    try:
+        rows = get_backend().insert_palaces(
+            user_id, [(list(concepts), story) for concepts, story in palaces]
+        )
+        
+        _cache.invalidate(('palaces', user_id), ('palace_count', user_id), ('due_count', user_id))
+        rows = [tuple(row) for row in rows]
+        _index_palaces(user_id, rows)
+        return rows
+    except Exception as e:
+        print(f"Error saving palaces: {e}")
+        return []
 
+@traced("db.get_palaces")
 def get_palaces(user_id: int) -> list:
     """Get all palaces for a user"""
+    cached = _cached(('palaces', user_id))
+    if cached is not None:
+        return list(cached)
+
     try:
-        response = supabase.table('palaces').select("*").eq('user_id', user_id).order('created_at', desc=True).execute()
-        
-        # Convert to format expected by the app
-        palaces = []
-        for palace in response.data:
-            palaces.append((
-                palace['id'],
-                palace['concepts'],
-                palace['story'],
-                palace['created_at']
-            ))
+        palaces = [tuple(row) for row in get_backend().list_palaces(user_id)]
         
+        _cache.set(('palaces', user_id), tuple(palaces))
         return palaces
     except Exception as e:
         print(f"Error getting palaces: {e}")
         return []
 
+def summarize_palace(palace_id: int, concepts: tuple, created_at: str) -> tuple:
+    """Build the (id, created_at, label, preview) summary shown in the sidebar for a new palace"""
+    return (palace_id, created_at, *concept_display(concepts))
+
+@traced("db.get_palace_summaries")
+def get_palace_summaries(user_id: int, limit: int = 20, cursor: tuple = None) -> tuple:
+    """Get one page of (id, created_at, label, preview) summaries, newest first, and the cursor of the next (None on the last)"""
+    try:
+        rows = get_backend().list_palace_summaries(user_id, limit + 1, cursor)
+
+        summaries = [tuple(row) for row in rows[:limit]]
+
+        next_cursor = None
+        if len(rows) > limit:
+            next_cursor = (summaries[-1][1], summaries[-1][0])
+
+        return summaries, next_cursor
+    except Exception as e:
+        print(f"Error getting palace summaries: {e}")
+        return [], None
+
+@traced("db.search_palaces")
+def search_palaces(user_id: int, query: str, limit: int = 20, offset: int = 0) -> tuple:
+    """
+    Full-text search a user's palaces by concepts and story, best match first.
+
+    Returns (summaries, has_more) with summaries shaped like
+    get_palace_summaries; pass offset=len(results so far) for the next page.
+    """
+    if not query.strip():
+        return [], False
+    try:
+        rows = get_backend().search_palaces(user_id, query, limit + 1, offset)
+        summaries = [tuple(row) for row in rows[:limit]]
+        return summaries, len(rows) > limit
+    except Exception as e:
+        print(f"Error searching palaces: {e}")
+        return [], False
+
+@traced("db.get_palaces_with_concept")
+def get_palaces_with_concept(user_id: int, concept: str, limit: int = 20) -> list:
+    """Get summaries of a user's palaces that include the exact concept, newest first"""
+    try:
+        return [
+            tuple(row)
+            for row in get_backend().list_palaces_with_concept(user_id, concept.strip(), limit)
+        ]
+    except Exception as e:
+        print(f"Error getting palaces with concept: {e}")
+        return []
+
+def _index_palaces(user_id: int, palaces: list):
+    """Add freshly saved or edited palaces to the user's similarity index, if it is loaded"""
+    index = _similarity.get(user_id)
+    if index is not None:
+        index.add_many((palace[0], palace[1]) for palace in palaces)
+
+def _similarity_index(user_id: int) -> SimilarityIndex:
+    index = _similarity.get(user_id)
+    annotate(cache='miss' if index is None else 'hit')
+    if index is None:
+        # One build per user at a time; concurrent callers wait for it instead of repeating it
+        with _similarity_lock:
+            index = _similarity.get(user_id)
+            if index is None:
+                index = SimilarityIndex()
+                index.add_many(get_backend().list_concepts(user_id))
+                _similarity.set(user_id, index)
+    return index
+
+@traced("db.find_similar_palaces")
+def find_similar_palaces(user_id: int, concepts: list, threshold: float = None, limit: int = 3) -> list:
+    """
+    Get (palace_id, similarity) pairs for a user's palaces whose concepts are
+    at least `threshold` (default NEURONEST_SIMILARITY_THRESHOLD) similar to
+    the given ones, most similar first.
+    """
+    threshold = SIMILARITY_THRESHOLD if threshold is None else threshold
+    try:
+        return _similarity_index(user_id).query(concepts, limit=limit, threshold=threshold)
+    except Exception as e:
+        print(f"Error finding similar palaces: {e}")
+        return []
+
+@traced("db.get_palace_count")
+def get_palace_count(user_id: int) -> int:
+    """Get the number of palaces a user has"""
+    cached = _cached(('palace_count', user_id))
+    if cached is not None:
+        return cached
+
+    try:
+        count = get_backend().count_palaces(user_id)
+        _cache.set(('palace_count', user_id), count)
+        return count
+    except Exception as e:
+        print(f"Error counting palaces: {e}")
+        return 0
+
+@traced("db.get_palace_by_id")
 def get_palace_by_id(palace_id: int) -> tuple:
     """Get a specific palace by ID"""
+    cached = _cached(('palace', palace_id))
+    if cached is not None:
+        return cached
+
     try:
-        response = supabase.table('palaces').select("*").eq('id', palace_id).execute()
+        row = get_backend().get_palace(palace_id)
         
-        if not response.data:
+        if not row:
             return None
         
-        palace = response.data[0]
-        return (
-            palace['id'],
-            palace['concepts'],
-            palace['story'],
-            palace['created_at']
-        )
+        result = tuple(row)
+        _cache.set(('palace', palace_id), result)
+        return result
     except Exception as e:
         print(f"Error getting palace by ID: {e}")
         return None
 
+@traced("db.get_user_palace")
+def get_user_palace(palace_id: int, user_id: int) -> tuple:
+    """Get a palace only if user_id owns it, for callers (like the API) that take ids from outside"""
+    cached = _cached(('palace', palace_id, user_id))
+    if cached is not None:
+        return cached
+
+    try:
+        row = get_backend().get_palace(palace_id, user_id)
+        if not row:
+            return None
+        result = tuple(row)
+        _cache.set(('palace', palace_id, user_id), result)
+        return result
+    except Exception as e:
+        print(f"Error getting palace by ID: {e}")
+        return None
+
+@traced("db.update_palace")
+def update_palace(palace_id: int, user_id: int, concepts: list, story: str) -> tuple:
+    """
+    Replace a palace's concepts and story (with user verification), e.g. after
+    ai_agent.edit_memory_palace. Its stored quiz is dropped and its review
+    state kept. Returns the updated row, or None.
+    """
+    try:
+        row = get_backend().update_palace(palace_id, user_id, list(concepts), story)
+        _cache.invalidate(
+            ('palace', palace_id), ('palace', palace_id, user_id), ('palaces', user_id), ('quiz', palace_id)
+        )
+        if not row:
+            return None
+        
+        palace = tuple(row)
+        _cache.set(('palace', palace_id), palace)
+        _index_palaces(user_id, [palace])
+        return palace
+    except Exception as e:
+        print(f"Error updating palace: {e}")
+        return None
+
+@traced("db.delete_palace")
 def delete_palace(palace_id: int, user_id: int) -> bool:
     """Delete a palace (with user verification)"""
     try:
-        response = supabase.table('palaces').delete().eq('id', palace_id).eq('user_id', user_id).execute()
-        return len(response.data) > 0
+        deleted = get_backend().delete_palace(palace_id, user_id)
+        if deleted:
+            _cache.invalidate(
+                ('palace', palace_id), ('palace', palace_id, user_id), ('palaces', user_id),
+                ('palace_count', user_id), ('quiz', palace_id),
+                ('due_count', user_id)
+            )
+            index = _similarity.get(user_id)
+            if index is not None:
+                index.remove(palace_id)
+        return deleted
     except Exception as e:
         print(f"Error deleting palace: {e}")
         return False
 
+@traced("db.get_due_reviews")
+def get_due_reviews(user_id: int, limit: int = 50, now: datetime = None) -> list:
+    """Get up to `limit` ReviewState records due now, earliest first, from the (user_id, due_at) index"""
+    try:
+        return get_backend().list_due_reviews(user_id, timestamp(now), limit)
+    except Exception as e:
+        print(f"Error getting due reviews: {e}")
+        return []
+
+@traced("db.count_due_reviews")
+def count_due_reviews(user_id: int) -> int:
+    """Number of palaces due for review; cached, so newly due palaces show up within the cache TTL"""
+    cached = _cached(('due_count', user_id))
+    if cached is not None:
+        return cached
+
+    try:
+        count = get_backend().count_due_reviews(user_id, timestamp())
+        _cache.set(('due_count', user_id), count)
+        return count
+    except Exception as e:
+        print(f"Error counting due reviews: {e}")
+        return 0
+
+@traced("db.save_reviews")
+def save_reviews(user_id: int, states: list) -> bool:
+    """Store the graded ReviewState records of a review session in a single write"""
+    if not states:
+        return True
+    try:
+        get_backend().save_reviews(user_id, list(states))
+        _cache.invalidate(('due_count', user_id))
+        return True
+    except Exception as e:
+        print(f"Error saving reviews: {e}")
+        return False
+
+@traced("db.create_job")
+def create_job(user_id: int, concepts: list, fresh: bool = False) -> tuple:
+    """Queue a palace generation job and return its row, or None if it couldn't be stored"""
+    try:
+        return get_backend().insert_job(user_id, list(concepts), fresh)
+    except Exception as e:
+        print(f"Error creating job: {e}")
+        return None
+
+@traced("db.claim_job")
+def claim_job(job_id: int) -> bool:
+    """Mark a queued job as running; False if it isn't queued any more"""
+    try:
+        return get_backend().claim_job(job_id)
+    except Exception as e:
+        print(f"Error claiming job: {e}")
+        return False
+
+@traced("db.finish_job")
+def finish_job(job_id: int, status: str, palace_id: int = None, error: str = None) -> bool:
+    """Record a job's outcome: done with the saved palace, or failed with an error message"""
+    try:
+        return get_backend().finish_job(job_id, status, palace_id, error)
+    except Exception as e:
+        print(f"Error finishing job: {e}")
+        return False
+
+@traced("db.touch_jobs")
+def touch_jobs(job_ids: list) -> int:
+    """Mark running jobs as still alive, so requeue_stale_jobs leaves them alone"""
+    if not job_ids:
+        return 0
+    try:
+        return get_backend().touch_jobs(list(job_ids))
+    except Exception as e:
+        print(f"Error touching jobs: {e}")
+        return 0
+
+@traced("db.get_jobs")
+def get_jobs(user_id: int, limit: int = 20) -> list:
+    """Get a user's generation jobs, newest first; never cached since they are polled for progress"""
+    try:
+        return get_backend().list_jobs(user_id, limit)
+    except Exception as e:
+        print(f"Error getting jobs: {e}")
+        return []
+
+@traced("db.delete_job")
+def delete_job(job_id: int, user_id: int) -> bool:
+    """Remove a finished or failed job (with user verification)"""
+    try:
+        return get_backend().delete_job(job_id, user_id)
+    except Exception as e:
+        print(f"Error deleting job: {e}")
+        return False
+
+@traced("db.requeue_stale_jobs")
+def requeue_stale_jobs(stale_after: float) -> list:
+    """Re-queue unfinished jobs that nothing has touched for `stale_after` seconds and return them"""
+    updated_before = timestamp(datetime.now(timezone.utc) - timedelta(seconds=stale_after))
+    try:
+        return get_backend().requeue_stale_jobs(updated_before)
+    except Exception as e:
+        print(f"Error requeuing jobs: {e}")
+        return []
+
+@traced("db.save_quiz")
+def save_quiz(palace_id: int, questions: list) -> bool:
+    """Store the quiz for a palace, replacing any earlier one"""
+    try:
+        saved = get_backend().save_quiz(palace_id, quiz_to_json(questions))
+        
+        _cache.set(('quiz', palace_id), tuple(questions))
+        return saved
+    except Exception as e:
+        print(f"Error saving quiz: {e}")
+        return False
+
+@traced("db.get_quiz")
+def get_quiz(palace_id: int) -> list:
+    """Get the stored quiz for a palace as QuizQuestion records"""
+    cached = _cached(('quiz', palace_id))
+    if cached is not None:
+        return list(cached)
+
+    try:
+        stored = get_backend().get_quiz(palace_id)
+        
+        if not stored:
+            return None
+        
+        questions = quiz_from_json(stored)
+        _cache.set(('quiz', palace_id), tuple(questions))
+        return questions
+    except Exception as e:
+        print(f"Error getting quiz: {e}")
+        return None
+
+@traced("db.get_user_by_id")
 def get_user_by_id(user_id: int) -> dict:
     """Get user information by ID"""
+    cached = _cached(('user', user_id))
+    if cached is not None:
+        return dict(cached)
+
     try:
-        response = supabase.table('users').select("id, username, created_at").eq('id', user_id).execute()
+        user = get_backend().get_user(user_id)
         
-        if not response.data:
+        if not user:
             return None
         
-        return response.data[0]
+        _cache.set(('user', user_id), dict(user))
+        return user
     except Exception as e:
         print(f"Error getting user by ID: {e}")
         return None
\ No newline at end of file
@@ -0,0 +1,421 @@
+import re
+import json
+import itertools
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from google.api_core import exceptions as google_exceptions
+from postgrest.exceptions import APIError
+from gemini_client import estimate_tokens
+
+
+class FakeResponse:
+    """Minimal stand-in for a Gemini response or streamed chunk"""
+
+    def __init__(self, text: str):
+        self.text = text
+
+
+# Lines of ai_agent's prompts that say what is being asked for
+STORY_CONCEPTS = re.compile(r"^Here is the list of concepts: (.*)\.$", re.MULTILINE)
+SECTION_CONCEPT = re.compile(r"^Write the section for this concept: (.*)$", re.MULTILINE)
+
+
+class FakeGenerativeModel:
+    """
+    Local stand-in for genai.GenerativeModel.
+
+    Answers instantly (or after latency seconds, plus token_latency per
+    response token like a real model's decoding) with a canned story laid
+    out one section per concept, a canned section or summary for palace
+    edits, or a valid quiz when JSON output is requested. The next
+    `failures` calls raise `error`, which is handy for exercising retries
+    and the circuit breaker.
+    """
+
+    def __init__(self, latency: float = 0.0, chunk_latency: float = 0.0, failures: int = 0,
+                 error=google_exceptions.ResourceExhausted, responder=None, token_latency: float = 0.0):
+        self.latency = latency
+        self.chunk_latency = chunk_latency
+        self.token_latency = token_latency
+        self.failures = failures
+        self.error = error
+        self.responder = responder
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _respond(self, prompt, generation_config):
+        if self.responder:
+            return self.responder(prompt)
+        if getattr(generation_config, "response_mime_type", None) == "application/json":
+            return json.dumps({"questions": [
+                {
+                    "question": f"Which concept appeared in scene {n}?",
+                    "options": ["The first", "The second", "The third", "The fourth"],
+                    "answer": "ABCD"[n % 4],
+                }
+                for n in range(1, 4)
+            ]})
+        if match := STORY_CONCEPTS.search(prompt):
+            sections = [
+                f"### {concept}\nA giant walks into room {n} of the palace carrying {concept}, "
+                "trips over it and everything in the room links together."
+                for n, concept in enumerate(match.group(1).split(", "), start=1)
+            ]
+            return "\n\n".join(sections + ["### Summary\nEach room holds one concept, and the giant connects them all."])
+        if match := SECTION_CONCEPT.search(prompt):
+            return (f"A giant walks into the next room of the palace carrying {match.group(1)}, "
+                    "trips over it and everything in the room links together.")
+        return "Each room holds one concept, and the giant connects them all."
+
+    def generate_content(self, prompt, stream=False, generation_config=None, **kwargs):
+        with self._lock:
+            self.calls += 1
+            if self.failures > 0:
+                self.failures -= 1
+                raise self.error("fake upstream failure")
+
+        if self.latency:
+            time.sleep(self.latency)
+        text = self._respond(prompt, generation_config)
+        if not stream:
+            if self.token_latency:
+                time.sleep(self.token_latency * estimate_tokens(text))
+            return FakeResponse(text)
+        return self._chunks(text)
+
+    def _chunks(self, text):
+        for line in text.splitlines(keepends=True):
+            if self.chunk_latency or self.token_latency:
+                time.sleep(self.chunk_latency + self.token_latency * estimate_tokens(line))
+            yield FakeResponse(line)
+
+
+class FakeAPIResponse:
+    """Minimal stand-in for a postgrest APIResponse"""
+
+    def __init__(self, data, count=None):
+        self.data = data
+        self.count = count
+
+
+# Columns with a UNIQUE constraint, and child tables removed with their parent
+UNIQUE_COLUMNS = {'users': ('username',), 'quizzes': ('palace_id',), 'reviews': ('palace_id',)}
+CASCADES = {
+    'palaces': (('quizzes', 'palace_id'), ('reviews', 'palace_id')),
+    'users': (('palaces', 'user_id'), ('jobs', 'user_id')),
+}
+
+
+def _review_for_palace(row: dict) -> dict:
+    return {
+        'palace_id': row['id'], 'user_id': row['user_id'], 'due_at': row['created_at'],
+        'interval': 0.0, 'ease': 2.5, 'repetitions': 0, 'lapses': 0, 'reviewed_at': None,
+    }
+
+
+# Rows the database creates itself after an insert, like the README's triggers
+INSERT_TRIGGERS = {'palaces': (('reviews', _review_for_palace),)}
+
+
+def _parse_value(value: str):
+    value = value.strip('"')
+    return int(value) if re.fullmatch(r"-?\d+", value) else value
+
+
+def _split_top_level(expr: str) -> list:
+    """Split a PostgREST logic expression on commas outside parentheses/quotes"""
+    parts, depth, quoted, current = [], 0, False, ''
+    for char in expr:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == '(':
+            depth += 1
+        elif not quoted and char == ')':
+            depth -= 1
+        elif not quoted and depth == 0 and char == ',':
+            parts.append(current)
+            current = ''
+            continue
+        current += char
+    parts.append(current)
+    return parts
+
+
+_OPERATORS = {
+    'eq': lambda a, b: a == b,
+    'neq': lambda a, b: a != b,
+    'lt': lambda a, b: a < b,
+    'lte': lambda a, b: a <= b,
+    'gt': lambda a, b: a > b,
+    'gte': lambda a, b: a >= b,
+}
+
+
+def _compile_logic(expr: str):
+    """Compile the subset of PostgREST or=/and= syntax the app uses into a predicate"""
+    terms = []
+    for part in _split_top_level(expr):
+        for combinator in ('and', 'or'):
+            if part.startswith(f'{combinator}(') and part.endswith(')'):
+                inner = _compile_logic(part[len(combinator) + 1:-1])
+                terms.append((combinator, inner))
+                break
+        else:
+            column, op, value = part.split('.', 2)
+            terms.append(('term', (column, _OPERATORS[op], _parse_value(value))))
+
+    def evaluate(row, mode):
+        results = []
+        for kind, term in terms:
+            if kind == 'term':
+                column, op, value = term
+                results.append(row.get(column) is not None and op(row.get(column), value))
+            else:
+                results.append(term(row, kind))
+        return all(results) if mode == 'and' else any(results)
+
+    return evaluate
+
+
+class FakeQuery:
+    """Chainable query builder mimicking the parts of supabase-py the app uses"""
+
+    def __init__(self, client, table: str):
+        self.client = client
+        self.table = table
+        self.op = 'select'
+        self.payload = None
+        self.filters = []
+        self.columns = '*'
+        self.count = None
+        self.head = False
+        self.order_by = []
+        self.row_limit = None
+        self.on_conflict = None
+
+    def select(self, *columns, count=None, head=None):
+        self.columns = ','.join(columns) or '*'
+        self.count = count
+        self.head = bool(head)
+        return self
+
+    def insert(self, json, **kwargs):
+        self.op, self.payload = 'insert', json
+        return self
+
+    def upsert(self, json, on_conflict=None, **kwargs):
+        self.op, self.payload, self.on_conflict = 'upsert', json, on_conflict
+        return self
+
+    def update(self, json, **kwargs):
+        self.op, self.payload = 'update', json
+        return self
+
+    def delete(self, **kwargs):
+        self.op = 'delete'
+        return self
+
+    def _filter(self, column, op, value):
+        self.filters.append(lambda row: row.get(column) is not None and _OPERATORS[op](row.get(column), value))
+        return self
+
+    def eq(self, column, value):
+        return self._filter(column, 'eq', value)
+
+    def neq(self, column, value):
+        return self._filter(column, 'neq', value)
+
+    def lt(self, column, value):
+        return self._filter(column, 'lt', value)
+
+    def lte(self, column, value):
+        return self._filter(column, 'lte', value)
+
+    def gt(self, column, value):
+        return self._filter(column, 'gt', value)
+
+    def gte(self, column, value):
+        return self._filter(column, 'gte', value)
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def contains(self, column, values):
+        values = list(values)
+        self.filters.append(lambda row: all(value in (row.get(column) or ()) for value in values))
+        return self
+
+    def or_(self, filters, reference_table=None):
+        predicate = _compile_logic(filters)
+        self.filters.append(lambda row: predicate(row, 'or'))
+        return self
+
+    def order(self, column, desc=False, **kwargs):
+        self.order_by.append((column, desc))
+        return self
+
+    def limit(self, size, **kwargs):
+        self.row_limit = size
+        return self
+
+    def _project(self, row):
+        if self.columns.strip() == '*':
+            return dict(row)
+        return {c.strip(): row.get(c.strip()) for c in self.columns.split(',')}
+
+    def execute(self):
+        return self.client._execute(self)
+
+
+class FakeRPC:
+    """Stored-procedure call; only the functions the app defines are emulated"""
+
+    def __init__(self, client, fn: str, params: dict):
+        self.client = client
+        self.fn = fn
+        self.params = params
+
+    def execute(self):
+        return self.client._call(self.fn, self.params)
+
+
+class FakeSupabase:
+    """
+    In-process stand-in for the Supabase client.
+
+    Tables are plain lists of dicts guarded by a lock. Every execute() can be
+    delayed by `latency` seconds to simulate a network round-trip, and call
+    counts and response payload sizes are tracked for benchmarks.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.tables = {}
+        self.calls = Counter()
+        self.payload_bytes = 0
+        self._ids = {}
+        self._lock = threading.Lock()
+        self._clock = datetime(2024, 1, 1, tzinfo=timezone.utc)
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, fn: str, params: dict = None, **kwargs):
+        return FakeRPC(self, fn, params or {})
+
+    def reset_stats(self):
+        with self._lock:
+            self.calls.clear()
+            self.payload_bytes = 0
+
+    def _next_row_defaults(self, table):
+        ids = self._ids.setdefault(table, itertools.count(1))
+        # Strictly increasing timestamps keep ordering deterministic
+        self._clock += timedelta(microseconds=1)
+        return {'id': next(ids), 'created_at': self._clock.isoformat()}
+
+    def _check_unique(self, table, row, rows, ignore=None):
+        for column in UNIQUE_COLUMNS.get(table, ()):
+            for existing in rows:
+                if existing is not ignore and existing.get(column) == row.get(column):
+                    raise APIError({
+                        'code': '23505',
+                        'message': f'duplicate key value violates unique constraint "{table}_{column}_key"',
+                    })
+
+    def _delete_cascade(self, table, deleted):
+        for child, column in CASCADES.get(table, ()):
+            ids = {row['id'] for row in deleted}
+            children = self.tables.get(child, [])
+            removed = [row for row in children if row.get(column) in ids]
+            self.tables[child] = [row for row in children if row.get(column) not in ids]
+            self._delete_cascade(child, removed)
+
+    def _call(self, fn: str, params: dict) -> FakeAPIResponse:
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.calls[('rpc', fn)] += 1
+            if fn != 'search_palaces':
+                raise APIError({'code': '42883', 'message': f'function {fn} does not exist'})
+
+            # A plain scan standing in for the tsvector/GIN query
+            words = re.findall(r"\w+", params['p_query'].lower())
+            scored = []
+            for row in self.tables.get('palaces', []):
+                if row['user_id'] != params['p_user_id'] or not words:
+                    continue
+                concepts, story = row['preview'].lower(), row['story'].lower()
+                if all(word in concepts or word in story for word in words):
+                    rank = sum(2 * concepts.count(word) + story.count(word) for word in words)
+                    scored.append((rank, row))
+            scored.sort(key=lambda item: (item[0], item[1]['id']), reverse=True)
+            page = scored[params['p_offset']:params['p_offset'] + params['p_limit']]
+            data = [
+                {
+                    'id': row['id'], 'created_at': row['created_at'],
+                    'label': row['label'], 'preview': row['preview'], 'rank': rank
+                }
+                for rank, row in page
+            ]
+            self.payload_bytes += len(json.dumps(data))
+            return FakeAPIResponse(data)
+
+    def _execute(self, query: FakeQuery) -> FakeAPIResponse:
+        if self.latency:
+            time.sleep(self.latency)
+
+        with self._lock:
+            self.calls[(query.table, query.op)] += 1
+            rows = self.tables.setdefault(query.table, [])
+            matched = [row for row in rows if all(f(row) for f in query.filters)]
+
+            if query.op in ('insert', 'upsert'):
+                payload = query.payload if isinstance(query.payload, list) else [query.payload]
+                created = []
+                for item in payload:
+                    existing = None
+                    if query.op == 'upsert' and query.on_conflict:
+                        existing = next(
+                            (row for row in rows if row.get(query.on_conflict) == item.get(query.on_conflict)),
+                            None
+                        )
+                    if existing is not None:
+                        existing.update(json.loads(json.dumps(item)))
+                        created.append(dict(existing))
+                        continue
+                    row = {**self._next_row_defaults(query.table), **json.loads(json.dumps(item))}
+                    self._check_unique(query.table, row, rows)
+                    rows.append(row)
+                    created.append(dict(row))
+                    for child, make_row in INSERT_TRIGGERS.get(query.table, ()):
+                        self.tables.setdefault(child, []).append(make_row(row))
+                data = created
+            elif query.op == 'update':
+                for row in matched:
+                    self._check_unique(query.table, {**row, **query.payload}, rows, ignore=row)
+                    row.update(query.payload)
+                data = [dict(row) for row in matched]
+            elif query.op == 'delete':
+                ids = {id(row) for row in matched}
+                self.tables[query.table] = [row for row in rows if id(row) not in ids]
+                self._delete_cascade(query.table, matched)
+                data = [dict(row) for row in matched]
+            else:
+                for column, desc in reversed(query.order_by):
+                    matched.sort(key=lambda row: row.get(column), reverse=desc)
+                count = len(matched) if query.count else None
+                if query.row_limit is not None:
+                    matched = matched[:query.row_limit]
+                data = [] if query.head else [query._project(row) for row in matched]
+                response = FakeAPIResponse(data, count)
+                self.payload_bytes += len(json.dumps(data))
+                return response
+
+            self.payload_bytes += len(json.dumps(data))
+            return FakeAPIResponse(data)
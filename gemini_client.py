@@ -0,0 +1,224 @@
+import random
+import threading
+import time
+from typing import Protocol
+from google.api_core import exceptions as google_exceptions
+
+
+class GenerationError(Exception):
+    """Base class for failures that mean no usable AI output was produced"""
+
+
+class RateLimitExceeded(GenerationError):
+    """The request/token budget could not be acquired in time"""
+
+
+class UserQuotaExceeded(RateLimitExceeded):
+    """The user has used up their share of AI generations for now"""
+
+
+class CircuitOpenError(GenerationError):
+    """The upstream model has been failing and calls are short-circuited"""
+
+
+class UpstreamError(GenerationError):
+    """The model call failed, after retries where the error was retryable"""
+
+
+class MalformedResponseError(GenerationError):
+    """The model answered, but not in a usable form"""
+
+
+# Errors worth retrying: quota/rate limits, transient server errors and timeouts
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+    google_exceptions.DeadlineExceeded,
+    ConnectionError,
+    TimeoutError,
+)
+
+
+# Rough size of a Gemini token in characters of English text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for budgeting (about four characters per token)"""
+    return max(1, len(text) // CHARS_PER_TOKEN)
+
+
+class Bucket(Protocol):
+    """A request or token budget, e.g. quota.QuotaBucket"""
+
+    def acquire(self, amount: float = 1, timeout: float = None):
+        """Take amount from the budget, waiting at most timeout seconds; raise RateLimitExceeded otherwise"""
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets one probe through after a cool-down"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if self._clock() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self) -> bool:
+        """
+        Raise CircuitOpenError unless a call may go upstream right now.
+        Returns True when the call is the half-open probe, which must end in
+        record_success or record_failure or no other call will get through.
+        """
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            remaining = self.reset_timeout - (self._clock() - self._opened_at)
+            if remaining > 0 or self._probing:
+                raise CircuitOpenError(
+                    f"AI service is unavailable, retrying in {max(remaining, 0):.0f}s"
+                )
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self._opened_at = self._clock()
+            self._probing = False
+
+
+class ResilientModel:
+    """
+    Wrapper around a GenerativeModel-like object adding rate limiting,
+    retries with jittered exponential backoff and a circuit breaker.
+
+    Any object with a generate_content(prompt, stream=False, **kwargs) method
+    can be wrapped, which makes it easy to exercise against a local fake.
+    All failures surface as GenerationError subclasses.
+    """
+
+    def __init__(
+        self,
+        model,
+        request_bucket: Bucket = None,
+        token_bucket: Bucket = None,
+        breaker: CircuitBreaker = None,
+        max_retries: int = 3,
+        base_delay: float = 0.5,
+        max_delay: float = 8.0,
+        acquire_timeout: float = 30.0,
+        output_token_reserve: int = 1024,
+        sleep=time.sleep,
+    ):
+        self.model = model
+        self.request_bucket = request_bucket
+        self.token_bucket = token_bucket
+        self.breaker = breaker or CircuitBreaker()
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.acquire_timeout = acquire_timeout
+        self.output_token_reserve = output_token_reserve
+        self._sleep = sleep
+
+    def _backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff delay for the given retry attempt"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _acquire(self, prompt, kwargs):
+        if self.request_bucket:
+            self.request_bucket.acquire(1, timeout=self.acquire_timeout)
+        if self.token_bucket:
+            # A call can't produce more than its output cap, so reserve that when one is set
+            config = kwargs.get('generation_config')
+            reserve = getattr(config, 'max_output_tokens', None) or self.output_token_reserve
+            self.token_bucket.acquire(estimate_tokens(prompt) + reserve, timeout=self.acquire_timeout)
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        """Call the wrapped model, returning its response (or chunk iterator when streaming)"""
+        if stream:
+            return self._stream(prompt, kwargs)
+
+        attempt = 0
+        while True:
+            probe = self.breaker.allow()
+            settled = False
+            try:
+                self._acquire(prompt, kwargs)
+                response = self.model.generate_content(prompt, **kwargs)
+                self.breaker.record_success()
+                settled = True
+                return response
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                settled = True
+                if attempt >= self.max_retries:
+                    raise UpstreamError(f"AI service failed after {attempt + 1} attempts: {e}") from e
+            except GenerationError:
+                raise
+            except Exception as e:
+                raise UpstreamError(f"AI service error: {e}") from e
+            finally:
+                # A probe that ended any other way (a rate limit, a
+                # non-retryable error) would otherwise hold the circuit open
+                if probe and not settled:
+                    self.breaker.record_failure()
+            self._sleep(self._backoff(attempt))
+            attempt += 1
+
+    def _stream(self, prompt, kwargs):
+        """Stream chunks, retrying only while nothing has been yielded yet"""
+        attempt = 0
+        while True:
+            probe = self.breaker.allow()
+            settled = False
+            yielded = False
+            try:
+                self._acquire(prompt, kwargs)
+                for chunk in self.model.generate_content(prompt, stream=True, **kwargs):
+                    yielded = True
+                    yield chunk
+                self.breaker.record_success()
+                settled = True
+                return
+            except GeneratorExit:
+                # The consumer stopped iterating part-way; the model was answering
+                self.breaker.record_success()
+                settled = True
+                raise
+            except RETRYABLE_ERRORS as e:
+                self.breaker.record_failure()
+                settled = True
+                if yielded or attempt >= self.max_retries:
+                    raise UpstreamError(f"AI service failed after {attempt + 1} attempts: {e}") from e
+            except GenerationError:
+                raise
+            except Exception as e:
+                raise UpstreamError(f"AI service error: {e}") from e
+            finally:
+                if probe and not settled:
+                    self.breaker.record_failure()
+            self._sleep(self._backoff(attempt))
+            attempt += 1
@@ -0,0 +1,112 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ai_agent import stream_memory_palace, GenerationError
+from db import create_job, claim_job, finish_job, touch_jobs, requeue_stale_jobs, save_palace
+from telemetry import span
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+JOB_WORKERS = int(os.getenv("NEURONEST_JOB_WORKERS", "4"))
+# Unfinished jobs untouched this long were orphaned by a restart and are run again
+JOB_STALE_AFTER = float(os.getenv("NEURONEST_JOB_STALE_AFTER", "300"))
+# Jobs running in this process are touched this often, however long they take
+JOB_HEARTBEAT = JOB_STALE_AFTER / 5
+MAX_PENDING_JOBS = int(os.getenv("NEURONEST_MAX_PENDING_JOBS", "5"))
+
+_pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="palace-job")
+_janitor = None
+_janitor_lock = threading.Lock()
+_heartbeat = None
+
+# Story chunks received so far by jobs running in this process, for live previews
+_progress = {}
+_progress_lock = threading.Lock()
+
+
+def submit_job(user_id: int, concepts: list, fresh: bool = False) -> tuple:
+    """Persist a queued generation job and hand it to the worker pool; returns the job row or None"""
+    job = create_job(user_id, concepts, fresh)
+    if job:
+        _pool.submit(run_job, job)
+    return job
+
+
+def run_job(job: tuple):
+    """Generate and save one job's palace on a worker thread, recording the outcome on the job row"""
+    job_id, user_id, concepts, fresh = job[:4]
+    if not claim_job(job_id):
+        return
+    _start_heartbeat()
+    chunks = []
+    with _progress_lock:
+        _progress[job_id] = chunks
+    with span("job.generate", job=job_id):
+        try:
+            for chunk in stream_memory_palace(list(concepts), user_id, use_cache=not fresh):
+                chunks.append(chunk)
+            palace = save_palace(user_id, list(concepts), "".join(chunks))
+            if palace:
+                finish_job(job_id, DONE, palace_id=palace[0])
+            else:
+                finish_job(job_id, FAILED, error="Failed to save memory palace.")
+        except GenerationError as e:
+            finish_job(job_id, FAILED, error=str(e))
+        except Exception as e:
+            print(f"Error running job {job_id}: {e}")
+            finish_job(job_id, FAILED, error="Unexpected error while generating.")
+        finally:
+            with _progress_lock:
+                _progress.pop(job_id, None)
+
+
+def job_progress(job_id: int) -> str:
+    """Story text streamed so far for a job running in this process, or None"""
+    with _progress_lock:
+        chunks = _progress.get(job_id)
+        return "".join(chunks) if chunks is not None else None
+
+
+def resume_stale_jobs() -> int:
+    """Re-run jobs left queued or running by a restarted process; returns how many"""
+    jobs = requeue_stale_jobs(JOB_STALE_AFTER)
+    for job in jobs:
+        _pool.submit(run_job, job)
+    if jobs:
+        print(f"🔁 Resumed {len(jobs)} interrupted palace generation jobs")
+    return len(jobs)
+
+
+def _heartbeat_loop():
+    while True:
+        time.sleep(JOB_HEARTBEAT)
+        with _progress_lock:
+            job_ids = list(_progress)
+        touch_jobs(job_ids)
+
+
+def _start_heartbeat():
+    """Keep refreshing updated_at of this process's running jobs, so they don't look orphaned"""
+    global _heartbeat
+    with _janitor_lock:
+        if _heartbeat is not None:
+            return
+        _heartbeat = threading.Thread(target=_heartbeat_loop, name="palace-job-heartbeat", daemon=True)
+    _heartbeat.start()
+
+
+def _janitor_loop(stop: threading.Event):
+    while not stop.wait(JOB_STALE_AFTER):
+        resume_stale_jobs()
+
+
+def start_workers():
+    """Resume interrupted jobs now, then keep checking for them. Only the first call does anything."""
+    global _janitor
+    with _janitor_lock:
+        if _janitor is not None:
+            return
+        _janitor = threading.Event()
+    resume_stale_jobs()
+    threading.Thread(target=_janitor_loop, args=(_janitor,), name="palace-job-janitor", daemon=True).start()
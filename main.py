@@ -1,6 +1,183 @@
-def main():
-    print("Hello from neuronest!")
+import os
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+MAX_CONCEPTS = 10
+
+
+def parse_jsonl_record(line):
+    """Concepts of one JSONL line; raises ValueError if it isn't a list or {"concepts": [...]}"""
+    record = json.loads(line)
+    concepts = record.get('concepts') if isinstance(record, dict) else record
+    if not isinstance(concepts, list):
+        raise ValueError('expected a JSON array of concepts or an object with a "concepts" array')
+    return [str(c).strip() for c in concepts if str(c).strip()]
+
+
+def read_concept_lists(path):
+    """
+    Yield (index, concepts, error) for each palace in a CSV or JSONL file, lazily.
+
+    CSV: one palace per row, one concept per cell.
+    JSONL: one palace per line, either a JSON array of concepts or an
+    object with a "concepts" array. A line that can't be read gives
+    concepts None and the reason as error, so one bad line doesn't stop the run.
+    """
+    with open(path, newline='', encoding='utf-8') as f:
+        if path.endswith('.jsonl'):
+            for index, line in enumerate(f):
+                if not line.strip():
+                    continue
+                try:
+                    yield index, parse_jsonl_record(line), None
+                except ValueError as e:
+                    yield index, None, str(e)
+        else:
+            for index, row in enumerate(csv.reader(f)):
+                if not row:
+                    continue
+                yield index, [c.strip() for c in row if c.strip()], None
+
+
+def load_checkpoint(path):
+    """Get the input indices already saved by an earlier run"""
+    if not path or not os.path.exists(path):
+        return set()
+    with open(path, encoding='utf-8') as f:
+        return {int(line) for line in f if line.strip()}
+
+
+def append_checkpoint(path, indices):
+    """Record input indices whose palaces have been saved"""
+    if not path:
+        return
+    with open(path, 'a', encoding='utf-8') as f:
+        f.writelines(f"{index}\n" for index in indices)
+
+
+def run_bulk(args):
+    from db import save_palaces_bulk, find_similar_palaces, get_palace_by_id
+    from similarity import record_reuse
+    from ai_agent import generate_memory_palace, GenerationError
+    from gemini_client import estimate_tokens
+
+    done = load_checkpoint(args.checkpoint)
+    pending = []  # (index, concepts, story, reused) waiting for the next bulk insert
+    saved = failed = skipped = resumed = tokens = forked = 0
+
+    def flush():
+        nonlocal saved, failed, tokens
+        if not pending:
+            return
+        rows = save_palaces_bulk(args.user_id, [(concepts, story) for _, concepts, story, _ in pending])
+        if rows:
+            append_checkpoint(args.checkpoint, [index for index, _, _, _ in pending])
+            saved += len(rows)
+            # Only stories that were generated and kept count towards throughput
+            tokens += sum(estimate_tokens(story) for _, _, story, reused in pending if not reused)
+        else:
+            failed += len(pending)
+            print(f"❌ Failed to save a batch of {len(pending)} palaces; rerun to retry them")
+        pending.clear()
+
+    def generate(index, concepts):
+        if args.reuse_similar:
+            # Fork the story of an already saved near-duplicate instead of calling the AI
+            for palace_id, _ in find_similar_palaces(args.user_id, concepts, limit=1):
+                existing = get_palace_by_id(palace_id)
+                if existing:
+                    return index, concepts, existing[2], True
+        story = generate_memory_palace(concepts, args.user_id, use_cache=not args.fresh)
+        return index, concepts, story, False
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        in_flight = set()
+
+        def collect(futures):
+            nonlocal failed, forked
+            for future in futures:
+                try:
+                    index, concepts, story, reused = future.result()
+                except GenerationError as e:
+                    failed += 1
+                    print(f"❌ Generation failed: {e}")
+                    continue
+                if reused:
+                    forked += 1
+                    record_reuse("forked")
+                pending.append((index, concepts, story, reused))
+                if len(pending) >= args.batch_size:
+                    flush()
+
+        for index, concepts, error in read_concept_lists(args.input):
+            if index in done:
+                resumed += 1
+                continue
+            if error:
+                failed += 1
+                print(f"❌ Record {index} (line {index + 1}) is malformed: {error}")
+                continue
+            if not concepts or len(concepts) > MAX_CONCEPTS:
+                skipped += 1
+                print(f"⚠️ Skipping record {index}: expected 1-{MAX_CONCEPTS} concepts, got {len(concepts)}")
+                continue
+
+            # Keep at most two batches of work queued so huge inputs stream through
+            if len(in_flight) >= args.concurrency * 2:
+                finished, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+            in_flight.add(pool.submit(generate, index, concepts))
+
+        collect(wait(in_flight).done)
+        flush()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"✅ Saved {saved} palaces in {elapsed:.1f}s "
+        f"({failed} failed, {skipped} skipped, {resumed} already done)"
+    )
+    print(f"   Throughput: {saved / elapsed:.2f} palaces/sec, ~{tokens / elapsed:.0f} story tokens/sec")
+    if args.reuse_similar:
+        print(f"   Forked {forked} stories from similar palaces ({forked} AI calls avoided)")
+    return 0 if not failed else 1
+
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {number}")
+    return number
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="neuronest",
+        description="Bulk-generate memory palaces from a CSV or JSONL file of concept lists."
+    )
+    parser.add_argument("input", help="CSV (one palace per row) or .jsonl file of concept lists")
+    parser.add_argument("--user-id", type=int, required=True, help="ID of the user who will own the palaces")
+    parser.add_argument("--concurrency", type=positive_int, default=4, help="Stories generated in parallel (default 4)")
+    parser.add_argument("--batch-size", type=positive_int, default=50, help="Palaces per bulk insert (default 50)")
+    parser.add_argument(
+        "--checkpoint",
+        help="File recording saved records; rerun with the same file to resume (default INPUT.checkpoint)"
+    )
+    parser.add_argument("--fresh", action="store_true", help="Ignore cached stories and always call the AI")
+    parser.add_argument(
+        "--reuse-similar", action="store_true",
+        help="Reuse the story of a saved palace with similar concepts (NEURONEST_SIMILARITY_THRESHOLD) "
+             "instead of calling the AI"
+    )
+    args = parser.parse_args(argv)
+
+    if args.checkpoint is None:
+        args.checkpoint = f"{args.input}.checkpoint"
+    return run_bulk(args)
 
 
 if __name__ == "__main__":
-    main()
+    raise SystemExit(main())
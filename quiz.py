@@ -0,0 +1,80 @@
+import json
+from typing import NamedTuple
+
+OPTION_LETTERS = "ABCD"
+MAX_QUESTIONS = 10
+
+
+class QuizQuestion(NamedTuple):
+    """One multiple choice question with four options and the correct letter"""
+    question: str
+    options: tuple
+    answer: str
+
+
+def parse_quiz(text: str) -> list:
+    """
+    Parse model output into QuizQuestion records.
+
+    Expects JSON of the form
+    {"questions": [{"question": "...", "options": ["...", "...", "...", "..."], "answer": "A"}]}
+    and raises ValueError for anything that does not match exactly.
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        # Tolerate a fenced code block around otherwise valid JSON
+        text = text.strip("`").removeprefix("json").strip()
+
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"quiz is not valid JSON: {e}") from e
+
+    if isinstance(data, dict):
+        data = data.get("questions")
+    if not isinstance(data, list) or not data:
+        raise ValueError("quiz has no questions")
+    if len(data) > MAX_QUESTIONS:
+        raise ValueError(f"quiz has more than {MAX_QUESTIONS} questions")
+
+    return [_parse_question(item, number) for number, item in enumerate(data, start=1)]
+
+
+def _parse_question(item, number: int) -> QuizQuestion:
+    if not isinstance(item, dict):
+        raise ValueError(f"question {number} is not an object")
+
+    question = item.get("question")
+    options = item.get("options")
+    answer = item.get("answer")
+
+    if not isinstance(question, str) or not question.strip():
+        raise ValueError(f"question {number} has no text")
+    if (
+        not isinstance(options, list)
+        or len(options) != len(OPTION_LETTERS)
+        or not all(isinstance(option, str) and option.strip() for option in options)
+    ):
+        raise ValueError(f"question {number} must have {len(OPTION_LETTERS)} non-empty options")
+    # One letter exactly: a substring test on "ABCD" would also let "", "AB" and "BCD" through
+    if not isinstance(answer, str) or answer.strip().upper() not in tuple(OPTION_LETTERS):
+        raise ValueError(f"question {number} has an invalid answer {answer!r}")
+
+    return QuizQuestion(
+        question.strip(),
+        tuple(option.strip() for option in options),
+        answer.strip().upper()
+    )
+
+
+def quiz_to_json(questions: list) -> list:
+    """Convert QuizQuestion records to plain dicts for storage"""
+    return [
+        {"question": q.question, "options": list(q.options), "answer": q.answer}
+        for q in questions
+    ]
+
+
+def quiz_from_json(data: list) -> list:
+    """Rebuild QuizQuestion records from stored dicts"""
+    return [QuizQuestion(item["question"], tuple(item["options"]), item["answer"]) for item in data]
@@ -0,0 +1,228 @@
+import os
+import math
+import time
+import sqlite3
+import threading
+import telemetry
+from gemini_client import RateLimitExceeded, UserQuotaExceeded
+
+# Where token buckets live: unset for this process only, sqlite://<path> for a
+# file every process on the host shares, redis://... for every replica
+QUOTA_URL = os.getenv("NEURONEST_QUOTA_URL", "")
+# AI generations a user may start per hour, across all replicas; 0 turns the limit off
+USER_GENERATIONS_PER_HOUR = float(os.getenv("NEURONEST_USER_GENERATIONS_PER_HOUR", "0"))
+REDIS_KEY_PREFIX = "neuronest:quota:"
+# Buckets kept by the memory and SQLite stores before full ones are dropped
+PURGE_AFTER = 10000
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def _take(tokens: float, updated: float, now: float, amount: float, rate: float, capacity: float) -> tuple:
+    """
+    Refill a bucket to `now` and take amount from it if it has that much.
+    Returns (tokens left, seconds until amount would have been available or 0 if taken).
+    """
+    tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+    if tokens >= amount:
+        return tokens - amount, 0.0
+    return tokens, (amount - tokens) / rate
+
+
+class MemoryQuotaStore:
+    """Token buckets in this process only; enough for a single instance"""
+
+    name = "memory"
+
+    def __init__(self, clock=time.monotonic):
+        self._clock = clock
+        self._buckets = {}  # key -> (tokens, updated, full at)
+        self._lock = threading.Lock()
+
+    def take(self, key: str, amount: float, rate: float, capacity: float) -> float:
+        """Atomically take amount from the bucket; returns 0, or the seconds to wait before it would succeed"""
+        now = self._clock()
+        with self._lock:
+            tokens, updated, _ = self._buckets.get(key, (capacity, now, now))
+            tokens, wait = _take(tokens, updated, now, amount, rate, capacity)
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            if len(self._buckets) > PURGE_AFTER:
+                # A bucket that has refilled is the same as one never used
+                self._buckets = {k: v for k, v in self._buckets.items() if v[2] > now}
+        return wait
+
+
+class SQLiteQuotaStore:
+    """Token buckets in a SQLite file, shared by every process on the host that opens it"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, clock=time.time):
+        # Wall-clock time, since other processes read the same timestamps
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._takes = 0
+        self._conn = sqlite3.connect(path, timeout=10, isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS quota_buckets ("
+            " key TEXT PRIMARY KEY,"
+            " tokens REAL NOT NULL,"
+            " updated_at REAL NOT NULL,"
+            " full_at REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_quota_buckets_full_at ON quota_buckets(full_at)")
+
+    def take(self, key: str, amount: float, rate: float, capacity: float) -> float:
+        """Atomically take amount from the bucket; returns 0, or the seconds to wait before it would succeed"""
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so no other process can
+            # read the bucket between our read and our write
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                now = self._clock()
+                row = self._conn.execute(
+                    "SELECT tokens, updated_at FROM quota_buckets WHERE key = ?", (key,)
+                ).fetchone()
+                tokens, updated = row if row else (capacity, now)
+                tokens, wait = _take(tokens, updated, now, amount, rate, capacity)
+                self._conn.execute(
+                    "INSERT INTO quota_buckets (key, tokens, updated_at, full_at) VALUES (?, ?, ?, ?)"
+                    " ON CONFLICT(key) DO UPDATE SET"
+                    " tokens = excluded.tokens, updated_at = excluded.updated_at, full_at = excluded.full_at",
+                    (key, tokens, now, now + (capacity - tokens) / rate)
+                )
+                self._takes += 1
+                if self._takes % PURGE_AFTER == 0:
+                    self._conn.execute("DELETE FROM quota_buckets WHERE full_at <= ?", (now,))
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return wait
+
+
+# Same arithmetic as _take, run inside Redis so the read and write are one atomic
+# step. Uses the server's clock, so replicas with skewed clocks still agree.
+REDIS_TAKE_SCRIPT = """
+local amount = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local capacity = tonumber(ARGV[3])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= amount then
+    tokens = tokens - amount
+else
+    wait = (amount - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((capacity - tokens) / rate) + 1)
+return tostring(wait)
+"""
+
+
+class RedisQuotaStore:
+    """Token buckets in Redis, or any server speaking its protocol with Lua scripting, shared by every replica"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError("NEURONEST_QUOTA_URL points at Redis but the redis package isn't installed") from e
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(REDIS_TAKE_SCRIPT)
+
+    def take(self, key: str, amount: float, rate: float, capacity: float) -> float:
+        """Atomically take amount from the bucket; returns 0, or the seconds to wait before it would succeed"""
+        # Lua numbers come back from Redis as integers, so the script returns a string
+        return float(self._script(keys=[REDIS_KEY_PREFIX + key], args=[amount, rate, capacity]))
+
+
+def create_store(url: str = None):
+    """Create the quota store for `url` or NEURONEST_QUOTA_URL"""
+    url = QUOTA_URL if url is None else url
+    if not url:
+        return MemoryQuotaStore()
+    if url.startswith("sqlite://"):
+        return SQLiteQuotaStore(url[len("sqlite://"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisQuotaStore(url)
+    raise ValueError(f"Unknown quota store {url!r}; expected sqlite://<path> or redis://<host>")
+
+
+def get_store():
+    """The process-wide quota store, created on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = create_store()
+    return _store
+
+
+def set_store(store):
+    """Use the given quota store (e.g. a temporary SQLite file) instead of NEURONEST_QUOTA_URL"""
+    global _store
+    with _store_lock:
+        _store = store
+
+
+class QuotaBucket:
+    """
+    Token bucket refilled at a per-minute rate whose state lives in a quota
+    store, so every process using the same store draws on one budget. Used as
+    ResilientModel's request and token budgets (see gemini_client.Bucket).
+    """
+
+    def __init__(self, key: str, rate_per_minute: float, capacity: float = None,
+                 store=None, clock=time.monotonic, sleep=time.sleep):
+        self.key = key
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self._store = store
+        self._clock = clock
+        self._sleep = sleep
+
+    def try_acquire(self, amount: float = 1) -> float:
+        """Take amount tokens if available; returns 0, or the seconds until they would be"""
+        amount = min(amount, self.capacity)
+        try:
+            return (self._store or get_store()).take(self.key, amount, self.rate, self.capacity)
+        except Exception as e:
+            # An unreachable store shouldn't stop generation; Gemini still enforces its own quota
+            print(f"Error checking quota {self.key}: {e}")
+            return 0.0
+
+    def acquire(self, amount: float = 1, timeout: float = None):
+        """Take amount tokens, waiting for a refill for at most timeout seconds"""
+        deadline = None if timeout is None else self._clock() + timeout
+        while True:
+            wait = self.try_acquire(amount)
+            if not wait:
+                return
+            if deadline is not None and self._clock() + wait > deadline:
+                raise RateLimitExceeded(f"rate limit budget exhausted, next slot in {wait:.1f}s")
+            telemetry.count("quota_waits")
+            self._sleep(wait)
+
+
+def charge_user(user_id):
+    """Spend one of a user's hourly AI generations, raising UserQuotaExceeded when none are left"""
+    if not USER_GENERATIONS_PER_HOUR or user_id is None:
+        return
+    bucket = QuotaBucket(f"user:{user_id}:generations", USER_GENERATIONS_PER_HOUR / 60, USER_GENERATIONS_PER_HOUR)
+    wait = bucket.try_acquire()
+    if wait:
+        telemetry.count("user_quota_exceeded")
+        raise UserQuotaExceeded(
+            f"You've used your {USER_GENERATIONS_PER_HOUR:g} AI generations for this hour. "
+            f"Try again in {math.ceil(wait / 60)} min."
+        )
@@ -0,0 +1,122 @@
+import heapq
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+# SM-2 defaults
+INITIAL_EASE = 2.5
+MIN_EASE = 1.3
+# A forgotten palace comes back this soon, within the same session if it is still going
+RELEARN_DELAY = timedelta(minutes=10)
+# Items due this soon are shown now rather than making the user wait
+LEARN_AHEAD = timedelta(minutes=20)
+
+# Grade buttons and the SM-2 quality (0-5) each one records
+GRADES = (("Again", 1), ("Hard", 3), ("Good", 4), ("Easy", 5))
+
+
+class ReviewState(NamedTuple):
+    """Spaced-repetition state for one palace; interval is in days, reviewed_at is None until the first review"""
+    palace_id: int
+    due_at: str
+    interval: float = 0.0
+    ease: float = INITIAL_EASE
+    repetitions: int = 0
+    lapses: int = 0
+    reviewed_at: str = None
+
+
+def timestamp(moment: datetime = None) -> str:
+    """UTC ISO-8601 timestamp with millisecond precision, sortable as text like created_at"""
+    moment = moment or datetime.now(timezone.utc)
+    return moment.astimezone(timezone.utc).isoformat(timespec="milliseconds")
+
+
+def due_time(state: ReviewState) -> datetime:
+    """Parse a state's due_at, whichever store's timestamp format it came back in"""
+    return datetime.fromisoformat(state.due_at)
+
+
+def schedule(state: ReviewState, quality: int, now: datetime = None) -> ReviewState:
+    """
+    Apply one SM-2 review with a quality grade from 0 (blackout) to 5 (perfect).
+
+    Grades below 3 count as a lapse: the palace restarts its repetitions and
+    comes back after RELEARN_DELAY. Otherwise the interval grows 1 day, 6 days,
+    then by the ease factor, which itself moves with every grade.
+    """
+    if not 0 <= quality <= 5:
+        raise ValueError(f"quality must be between 0 and 5, got {quality}")
+    now = now or datetime.now(timezone.utc)
+
+    ease = max(MIN_EASE, state.ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    if quality < 3:
+        return state._replace(
+            due_at=timestamp(now + RELEARN_DELAY),
+            interval=0.0,
+            ease=ease,
+            repetitions=0,
+            lapses=state.lapses + 1,
+            reviewed_at=timestamp(now)
+        )
+
+    repetitions = state.repetitions + 1
+    if repetitions == 1:
+        interval = 1.0
+    elif repetitions == 2:
+        interval = 6.0
+    else:
+        interval = round(max(state.interval, 1.0) * ease, 2)
+    return state._replace(
+        due_at=timestamp(now + timedelta(days=interval)),
+        interval=interval,
+        ease=ease,
+        repetitions=repetitions,
+        reviewed_at=timestamp(now)
+    )
+
+
+class DueQueue:
+    """
+    Min-heap of review states ordered by due time.
+
+    Pushing a palace that is already queued replaces it; the stale heap entry
+    is skipped when it surfaces, so both operations stay O(log n).
+    """
+
+    def __init__(self, states=()):
+        self._entries = {state.palace_id: state for state in states}
+        self._heap = [(due_time(state), state.palace_id) for state in self._entries.values()]
+        heapq.heapify(self._heap)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def push(self, state: ReviewState):
+        self._entries[state.palace_id] = state
+        heapq.heappush(self._heap, (due_time(state), state.palace_id))
+
+    def discard(self, palace_id: int):
+        self._entries.pop(palace_id, None)
+
+    def _drop_stale(self):
+        while self._heap:
+            due, palace_id = self._heap[0]
+            state = self._entries.get(palace_id)
+            if state is not None and due_time(state) == due:
+                return
+            heapq.heappop(self._heap)
+
+    def peek(self) -> ReviewState:
+        """The next state to come due, or None if the queue is empty"""
+        self._drop_stale()
+        return self._entries[self._heap[0][1]] if self._heap else None
+
+    def pop_due(self, now: datetime = None) -> ReviewState:
+        """Remove and return the earliest state due by now (plus LEARN_AHEAD), or None"""
+        now = now or datetime.now(timezone.utc)
+        state = self.peek()
+        if state is None or due_time(state) > now + LEARN_AHEAD:
+            return None
+        heapq.heappop(self._heap)
+        del self._entries[state.palace_id]
+        return state
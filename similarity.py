@@ -0,0 +1,169 @@
+import re
+import threading
+from collections import Counter
+import numpy as np
+import telemetry
+
+# Hashed character-trigram space; 512 float32s is 2 KiB per palace
+DIMENSIONS = 512
+NGRAM = 3
+# Palaces vectorized together when building an index, bounding the scratch matrices
+BATCH_SIZE = 1000
+
+_reuse = Counter()
+_reuse_lock = threading.Lock()
+
+
+def normalize_concept(concept: str) -> str:
+    """Case-fold and reduce punctuation/whitespace runs to single spaces"""
+    return " ".join(re.sub(r"[^\w]+", " ", concept.casefold()).split())
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms > 0)
+
+
+def _mix(codes: np.ndarray) -> np.ndarray:
+    """MurmurHash3's 32-bit finalizer, spreading packed trigrams over every bit"""
+    codes = codes ^ (codes >> 16)
+    codes = codes * np.uint32(0x85EBCA6B)
+    codes = codes ^ (codes >> 13)
+    codes = codes * np.uint32(0xC2B2AE35)
+    return codes ^ (codes >> 16)
+
+
+def concept_vectors(concept_lists, dimensions: int = DIMENSIONS) -> np.ndarray:
+    """
+    One unit row per set of concepts, independent of the order within a set.
+
+    Each concept becomes a signed hashed bag of its UTF-8 byte trigrams, scaled
+    to unit length so long concepts don't dominate, and a set's concepts are
+    summed. Trigrams make plurals and small spelling changes land close together.
+    """
+    owners, texts = [], []  # the set each non-empty concept belongs to, and its padded bytes
+    for owner, concepts in enumerate(concept_lists):
+        for concept in concepts:
+            text = normalize_concept(concept)
+            if text:
+                owners.append(owner)
+                texts.append(f" {text} ".encode("utf-8"))
+
+    vectors = np.zeros((len(concept_lists), dimensions), dtype=np.float32)
+    if not owners:
+        return vectors
+    # Pack every trigram of the concatenated texts into one integer, then keep
+    # only those that start and end inside a single concept
+    data = np.frombuffer(b"".join(texts), dtype=np.uint8).astype(np.uint32)
+    lengths = np.array([len(text) for text in texts])
+    concept_of = np.repeat(np.arange(len(texts)), lengths)[:-2]
+    offset = np.arange(len(data) - 2) - np.repeat(np.cumsum(lengths) - lengths, lengths)[:-2]
+    keep = offset < lengths[concept_of] - 2
+    hashes = _mix((data[:-2] << 16 | data[1:-1] << 8 | data[2:])[keep])
+    # The top bit picks the sign so colliding trigrams tend to cancel rather than pile up
+    signs = np.where(hashes >> 31, 1.0, -1.0)
+    cells = concept_of[keep] * dimensions + hashes % dimensions
+    parts = np.bincount(cells, weights=signs, minlength=len(texts) * dimensions)
+    parts = _unit_rows(parts.reshape(len(texts), dimensions).astype(np.float32))
+    # A set's concepts are contiguous, so each set is one reduceat segment
+    owners, starts = np.unique(np.array(owners), return_index=True)
+    vectors[owners] = np.add.reduceat(parts, starts, axis=0)
+    return _unit_rows(vectors)
+
+
+def concept_vector(concepts, dimensions: int = DIMENSIONS) -> np.ndarray:
+    """Unit vector for one set of concepts"""
+    return concept_vectors([concepts], dimensions)[0]
+
+
+class SimilarityIndex:
+    """In-memory matrix of one user's concept vectors, queried by cosine similarity"""
+
+    def __init__(self, dimensions: int = DIMENSIONS):
+        self.dimensions = dimensions
+        self._vectors = np.zeros((16, dimensions), dtype=np.float32)
+        self._ids = []
+        self._rows = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _grow(self, size: int):
+        if size > len(self._vectors):
+            capacity = max(size, len(self._vectors) * 2)
+            grown = np.zeros((capacity, self.dimensions), dtype=np.float32)
+            grown[:len(self._ids)] = self._vectors[:len(self._ids)]
+            self._vectors = grown
+
+    def add_many(self, palaces):
+        """Index (palace_id, concepts) pairs, replacing any already indexed"""
+        palaces = list(palaces)
+        for start in range(0, len(palaces), BATCH_SIZE):
+            batch = palaces[start:start + BATCH_SIZE]
+            self._store([palace_id for palace_id, _ in batch],
+                        concept_vectors([concepts for _, concepts in batch], self.dimensions))
+
+    def _store(self, palace_ids: list, vectors: np.ndarray):
+        with self._lock:
+            self._grow(len(self._ids) + len(palace_ids))
+            for palace_id, vector in zip(palace_ids, vectors):
+                row = self._rows.get(palace_id)
+                if row is None:
+                    row = self._rows[palace_id] = len(self._ids)
+                    self._ids.append(palace_id)
+                self._vectors[row] = vector
+
+    def add(self, palace_id: int, concepts):
+        self.add_many([(palace_id, concepts)])
+
+    def remove(self, palace_id: int):
+        """Drop a palace by moving the last row into its slot"""
+        with self._lock:
+            row = self._rows.pop(palace_id, None)
+            if row is None:
+                return
+            last = len(self._ids) - 1
+            if row != last:
+                moved = self._ids[last]
+                self._vectors[row] = self._vectors[last]
+                self._ids[row] = moved
+                self._rows[moved] = row
+            self._ids.pop()
+
+    def query(self, concepts, limit: int = 3, threshold: float = 0.0) -> list:
+        """Get up to `limit` (palace_id, similarity) pairs at or above threshold, most similar first"""
+        vector = concept_vector(concepts, self.dimensions)
+        with self._lock:
+            count = len(self._ids)
+            if not count or not vector.any():
+                return []
+            scores = self._vectors[:count] @ vector
+            ids = list(self._ids)
+        if count > limit:
+            top = np.argpartition(scores, -limit)[-limit:]
+        else:
+            top = np.arange(count)
+        ranked = sorted(top, key=lambda row: scores[row], reverse=True)
+        return [(ids[row], float(scores[row])) for row in ranked if scores[row] >= threshold]
+
+
+def record_reuse(outcome: str):
+    """
+    Count what happened to a near-duplicate offer: 'offered', 'reused'
+    (opened the existing palace), 'forked' (saved a copy under the new
+    concepts) or 'declined'. Reuses and forks each avoid one AI call.
+    """
+    with _reuse_lock:
+        _reuse[outcome] += 1
+    telemetry.count(f"similar_{outcome}")
+    if outcome in ("reused", "forked"):
+        telemetry.count("llm_calls_avoided")
+
+
+def reuse_stats() -> dict:
+    """Near-duplicate offers and outcomes in this process, with the AI calls they avoided"""
+    with _reuse_lock:
+        stats = {key: _reuse[key] for key in ("offered", "reused", "forked", "declined")}
+    stats['llm_calls_avoided'] = stats['reused'] + stats['forked']
+    return stats
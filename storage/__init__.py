@@ -0,0 +1,24 @@
+"""Pluggable persistence backends behind the db.py API.
+
+The backend is chosen with NEURONEST_STORAGE: "supabase" (default) or
+"sqlite". Backends only move rows; caching, password hashing and error
+reporting stay in db.py.
+"""
+import os
+
+from storage.base import StorageBackend, DuplicateUserError, concept_display
+
+
+def create_backend(name: str = None) -> StorageBackend:
+    """Create the backend named by `name` or NEURONEST_STORAGE"""
+    name = (name or os.getenv("NEURONEST_STORAGE", "supabase")).lower()
+    if name == "supabase":
+        from storage.supabase_backend import SupabaseBackend
+        return SupabaseBackend()
+    if name == "sqlite":
+        from storage.sqlite_backend import SQLiteBackend
+        return SQLiteBackend(os.getenv("NEURONEST_SQLITE_PATH", "neuronest.sqlite3"))
+    raise ValueError(f"Unknown storage backend {name!r}; expected 'supabase' or 'sqlite'")
+
+
+__all__ = ["StorageBackend", "DuplicateUserError", "concept_display", "create_backend"]
@@ -0,0 +1,137 @@
+LABEL_LENGTH = 20
+
+
+class DuplicateUserError(Exception):
+    """A user with this username already exists"""
+
+
+def concept_display(concepts) -> tuple:
+    """Sidebar (label, preview) for a list of concepts, computed once when a palace is written"""
+    first_concept = concepts[0] if concepts else ""
+    label = first_concept[:LABEL_LENGTH]
+    if len(first_concept) > LABEL_LENGTH:
+        label += "..."
+    return label, ", ".join(concepts)
+
+
+class StorageBackend:
+    """
+    Row-level storage operations used by db.py.
+
+    Palaces are returned as (id, concepts, story, created_at) tuples with
+    concepts as a tuple of strings, and sidebar summaries as
+    (id, created_at, label, preview) tuples read from columns filled in at
+    write time. Methods raise on failure; db.py decides how errors are reported.
+    """
+
+    name = "base"
+
+    def ping(self):
+        """Raise if the store is unreachable"""
+        raise NotImplementedError
+
+    def create_user(self, username: str, password_hash: str) -> int:
+        """Insert a user and return its ID; raise DuplicateUserError if the username is taken"""
+        raise NotImplementedError
+
+    def get_credentials(self, username: str) -> tuple:
+        """Get (id, password_hash) for a username, or None"""
+        raise NotImplementedError
+
+    def update_password_hash(self, user_id: int, password_hash: str):
+        raise NotImplementedError
+
+    def get_user(self, user_id: int) -> dict:
+        """Get {'id', 'username', 'created_at'} for a user, or None"""
+        raise NotImplementedError
+
+    def insert_palaces(self, user_id: int, palaces: list) -> list:
+        """Insert (concepts list, story) pairs in one round-trip and return the created palace tuples"""
+        raise NotImplementedError
+
+    def list_palaces(self, user_id: int) -> list:
+        """Get every palace for a user, newest first"""
+        raise NotImplementedError
+
+    def list_concepts(self, user_id: int) -> list:
+        """Get (id, concepts) for every palace of a user, without stories"""
+        raise NotImplementedError
+
+    def list_palace_summaries(self, user_id: int, limit: int, cursor: tuple = None) -> list:
+        """Get up to `limit` summaries older than the (created_at, id) cursor, newest first"""
+        raise NotImplementedError
+
+    def count_palaces(self, user_id: int) -> int:
+        raise NotImplementedError
+
+    def get_palace(self, palace_id: int, user_id: int = None) -> tuple:
+        """Get (id, concepts, story, created_at), or None; with user_id, only if that user owns it"""
+        raise NotImplementedError
+
+    def update_palace(self, palace_id: int, user_id: int, concepts: list, story: str) -> tuple:
+        """
+        Replace the concepts and story of a palace owned by user_id and drop
+        its stored quiz, which was written for the old story. Returns the
+        updated palace tuple, or None if the user has no such palace.
+        """
+        raise NotImplementedError
+
+    def delete_palace(self, palace_id: int, user_id: int) -> bool:
+        """Delete a palace owned by user_id; return whether anything was deleted"""
+        raise NotImplementedError
+
+    def search_palaces(self, user_id: int, query: str, limit: int, offset: int = 0) -> list:
+        """Full-text search a user's concepts and stories; summaries, best match first"""
+        raise NotImplementedError
+
+    def list_palaces_with_concept(self, user_id: int, concept: str, limit: int) -> list:
+        """Get up to `limit` summaries of a user's palaces containing exactly `concept`, newest first"""
+        raise NotImplementedError
+
+    def list_due_reviews(self, user_id: int, due_before: str, limit: int) -> list:
+        """Get up to `limit` review state rows due by `due_before`, earliest first"""
+        raise NotImplementedError
+
+    def count_due_reviews(self, user_id: int, due_before: str) -> int:
+        raise NotImplementedError
+
+    def save_reviews(self, user_id: int, states: list):
+        """Write a batch of updated ReviewState records in one write, skipping palaces that no longer exist"""
+        raise NotImplementedError
+
+    def save_quiz(self, palace_id: int, questions: list) -> bool:
+        """Store a palace's quiz (a list of plain dicts), replacing any earlier one"""
+        raise NotImplementedError
+
+    def get_quiz(self, palace_id: int) -> list:
+        """Get a palace's stored quiz as a list of plain dicts, or None"""
+        raise NotImplementedError
+
+    def insert_job(self, user_id: int, concepts: list, fresh: bool) -> tuple:
+        """
+        Queue a palace generation job and return its row:
+        (id, user_id, concepts, fresh, status, palace_id, error, created_at, updated_at)
+        """
+        raise NotImplementedError
+
+    def claim_job(self, job_id: int) -> bool:
+        """Move a queued job to running; False if it is not queued (e.g. another worker took it)"""
+        raise NotImplementedError
+
+    def finish_job(self, job_id: int, status: str, palace_id: int = None, error: str = None) -> bool:
+        raise NotImplementedError
+
+    def touch_jobs(self, job_ids: list) -> int:
+        """Refresh updated_at of those jobs that are still running; returns how many"""
+        raise NotImplementedError
+
+    def list_jobs(self, user_id: int, limit: int) -> list:
+        """Get a user's job rows, newest first"""
+        raise NotImplementedError
+
+    def delete_job(self, job_id: int, user_id: int) -> bool:
+        raise NotImplementedError
+
+    def requeue_stale_jobs(self, updated_before: str) -> list:
+        """Put queued or running jobs last touched before `updated_before` back in the queue and return them"""
+        raise NotImplementedError
@@ -0,0 +1,457 @@
+import re
+import json
+import sqlite3
+import threading
+
+from review import ReviewState
+from storage.base import StorageBackend, DuplicateUserError, concept_display
+
+# Bumped whenever existing files need migrating; stored in PRAGMA user_version
+SCHEMA_VERSION = 4
+
+# ISO-8601 UTC timestamps, sortable as text and shaped like Supabase's created_at
+NOW = "strftime('%Y-%m-%dT%H:%M:%f+00:00', 'now')"
+
+SCHEMA = f"""
+CREATE TABLE IF NOT EXISTS users (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    username TEXT UNIQUE NOT NULL,
+    password_hash TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT ({NOW})
+);
+
+-- concepts is a JSON array; label and preview are the sidebar text, computed on write
+CREATE TABLE IF NOT EXISTS palaces (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    concepts TEXT NOT NULL,
+    story TEXT NOT NULL,
+    label TEXT NOT NULL DEFAULT '',
+    preview TEXT NOT NULL DEFAULT '',
+    created_at TEXT NOT NULL DEFAULT ({NOW})
+);
+
+-- Serves listing, keyset pagination and counting a user's palaces
+CREATE INDEX IF NOT EXISTS idx_palaces_user_created ON palaces(user_id, created_at DESC, id DESC);
+
+-- One row per concept so "palaces containing X" is an index lookup; filled from the JSON by triggers
+CREATE TABLE IF NOT EXISTS palace_concepts (
+    palace_id INTEGER NOT NULL REFERENCES palaces(id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    concept TEXT NOT NULL,
+    PRIMARY KEY (palace_id, position)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_palace_concepts_concept ON palace_concepts(concept, palace_id);
+
+CREATE TRIGGER IF NOT EXISTS palace_concepts_insert AFTER INSERT ON palaces BEGIN
+    INSERT INTO palace_concepts (palace_id, position, concept)
+        SELECT new.id, key, value FROM json_each(new.concepts);
+END;
+
+CREATE TRIGGER IF NOT EXISTS palace_concepts_update AFTER UPDATE OF concepts ON palaces BEGIN
+    DELETE FROM palace_concepts WHERE palace_id = new.id;
+    INSERT INTO palace_concepts (palace_id, position, concept)
+        SELECT new.id, key, value FROM json_each(new.concepts);
+END;
+
+-- Full-text index over the concept preview and stories, kept in sync by triggers
+CREATE VIRTUAL TABLE IF NOT EXISTS palaces_fts USING fts5(
+    preview, story, content='palaces', content_rowid='id', tokenize='porter unicode61'
+);
+
+CREATE TRIGGER IF NOT EXISTS palaces_fts_insert AFTER INSERT ON palaces BEGIN
+    INSERT INTO palaces_fts(rowid, preview, story) VALUES (new.id, new.preview, new.story);
+END;
+
+CREATE TRIGGER IF NOT EXISTS palaces_fts_delete AFTER DELETE ON palaces BEGIN
+    INSERT INTO palaces_fts(palaces_fts, rowid, preview, story) VALUES ('delete', old.id, old.preview, old.story);
+END;
+
+CREATE TRIGGER IF NOT EXISTS palaces_fts_update AFTER UPDATE OF preview, story ON palaces BEGIN
+    INSERT INTO palaces_fts(palaces_fts, rowid, preview, story) VALUES ('delete', old.id, old.preview, old.story);
+    INSERT INTO palaces_fts(rowid, preview, story) VALUES (new.id, new.preview, new.story);
+END;
+
+-- Spaced-repetition state, one row per palace, created with the palace and due immediately
+CREATE TABLE IF NOT EXISTS reviews (
+    palace_id INTEGER PRIMARY KEY REFERENCES palaces(id) ON DELETE CASCADE,
+    user_id INTEGER NOT NULL,
+    due_at TEXT NOT NULL,
+    interval REAL NOT NULL DEFAULT 0,
+    ease REAL NOT NULL DEFAULT 2.5,
+    repetitions INTEGER NOT NULL DEFAULT 0,
+    lapses INTEGER NOT NULL DEFAULT 0,
+    reviewed_at TEXT
+);
+
+-- "Due now" is a range scan on this index, however large the library
+CREATE INDEX IF NOT EXISTS idx_reviews_user_due ON reviews(user_id, due_at);
+
+CREATE TRIGGER IF NOT EXISTS reviews_insert AFTER INSERT ON palaces BEGIN
+    INSERT INTO reviews (palace_id, user_id, due_at) VALUES (new.id, new.user_id, new.created_at);
+END;
+
+CREATE TABLE IF NOT EXISTS quizzes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    palace_id INTEGER NOT NULL UNIQUE REFERENCES palaces(id) ON DELETE CASCADE,
+    questions TEXT NOT NULL,
+    created_at TEXT NOT NULL DEFAULT ({NOW})
+);
+
+-- Background palace generation; status is queued, running, done or failed
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    user_id INTEGER NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    concepts TEXT NOT NULL,
+    fresh INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'queued',
+    palace_id INTEGER REFERENCES palaces(id) ON DELETE SET NULL,
+    error TEXT,
+    created_at TEXT NOT NULL DEFAULT ({NOW}),
+    updated_at TEXT NOT NULL DEFAULT ({NOW})
+);
+
+CREATE INDEX IF NOT EXISTS idx_jobs_user ON jobs(user_id, id);
+-- Finding jobs orphaned by a restart
+CREATE INDEX IF NOT EXISTS idx_jobs_status_updated ON jobs(status, updated_at);
+"""
+
+# Statements are module constants so sqlite3's per-connection statement cache reuses them
+SQL_PING = "SELECT 1 FROM users LIMIT 1"
+SQL_CREATE_USER = "INSERT INTO users (username, password_hash) VALUES (?, ?)"
+SQL_GET_CREDENTIALS = "SELECT id, password_hash FROM users WHERE username = ?"
+SQL_UPDATE_PASSWORD_HASH = "UPDATE users SET password_hash = ? WHERE id = ?"
+SQL_GET_USER = "SELECT id, username, created_at FROM users WHERE id = ?"
+SQL_INSERT_PALACE = (
+    "INSERT INTO palaces (user_id, concepts, story, label, preview) VALUES (?, ?, ?, ?, ?) "
+    "RETURNING id, concepts, story, created_at"
+)
+SQL_LIST_PALACES = (
+    "SELECT id, concepts, story, created_at FROM palaces "
+    "WHERE user_id = ? ORDER BY created_at DESC, id DESC"
+)
+SQL_LIST_CONCEPTS = "SELECT id, concepts FROM palaces WHERE user_id = ?"
+SQL_FIRST_SUMMARIES = (
+    "SELECT id, created_at, label, preview FROM palaces "
+    "WHERE user_id = ? ORDER BY created_at DESC, id DESC LIMIT ?"
+)
+SQL_NEXT_SUMMARIES = (
+    "SELECT id, created_at, label, preview FROM palaces "
+    "WHERE user_id = ? AND (created_at, id) < (?, ?) "
+    "ORDER BY created_at DESC, id DESC LIMIT ?"
+)
+SQL_COUNT_PALACES = "SELECT COUNT(*) FROM palaces WHERE user_id = ?"
+SQL_GET_PALACE = "SELECT id, concepts, story, created_at FROM palaces WHERE id = ?"
+SQL_GET_USER_PALACE = SQL_GET_PALACE + " AND user_id = ?"
+SQL_UPDATE_PALACE = (
+    "UPDATE palaces SET concepts = ?, story = ?, label = ?, preview = ? WHERE id = ? AND user_id = ? "
+    "RETURNING id, concepts, story, created_at"
+)
+SQL_DELETE_PALACE = "DELETE FROM palaces WHERE id = ? AND user_id = ?"
+SQL_SAVE_QUIZ = (
+    "INSERT INTO quizzes (palace_id, questions) VALUES (?, ?) "
+    "ON CONFLICT(palace_id) DO UPDATE SET questions = excluded.questions, created_at = excluded.created_at"
+)
+SQL_GET_QUIZ = "SELECT questions FROM quizzes WHERE palace_id = ?"
+SQL_DELETE_QUIZ = "DELETE FROM quizzes WHERE palace_id = ?"
+SQL_PALACES_WITH_CONCEPT = (
+    "SELECT p.id, p.created_at, p.label, p.preview FROM palace_concepts c "
+    "JOIN palaces p ON p.id = c.palace_id "
+    "WHERE c.concept = ? AND p.user_id = ? "
+    "ORDER BY p.created_at DESC, p.id DESC LIMIT ?"
+)
+REVIEW_COLUMNS = "palace_id, due_at, interval, ease, repetitions, lapses, reviewed_at"
+SQL_DUE_REVIEWS = (
+    f"SELECT {REVIEW_COLUMNS} FROM reviews "
+    "WHERE user_id = ? AND due_at <= ? ORDER BY due_at, palace_id LIMIT ?"
+)
+SQL_COUNT_DUE_REVIEWS = "SELECT COUNT(*) FROM reviews WHERE user_id = ? AND due_at <= ?"
+SQL_SAVE_REVIEW = (
+    "UPDATE reviews SET due_at = ?, interval = ?, ease = ?, repetitions = ?, lapses = ?, reviewed_at = ? "
+    "WHERE palace_id = ? AND user_id = ?"
+)
+JOB_COLUMNS = "id, user_id, concepts, fresh, status, palace_id, error, created_at, updated_at"
+SQL_INSERT_JOB = f"INSERT INTO jobs (user_id, concepts, fresh) VALUES (?, ?, ?) RETURNING {JOB_COLUMNS}"
+SQL_CLAIM_JOB = f"UPDATE jobs SET status = 'running', updated_at = {NOW} WHERE id = ? AND status = 'queued'"
+SQL_FINISH_JOB = f"UPDATE jobs SET status = ?, palace_id = ?, error = ?, updated_at = {NOW} WHERE id = ?"
+SQL_TOUCH_JOBS = (
+    f"UPDATE jobs SET updated_at = {NOW} "
+    "WHERE status = 'running' AND id IN (SELECT value FROM json_each(?))"
+)
+SQL_LIST_JOBS = f"SELECT {JOB_COLUMNS} FROM jobs WHERE user_id = ? ORDER BY id DESC LIMIT ?"
+SQL_DELETE_JOB = "DELETE FROM jobs WHERE id = ? AND user_id = ?"
+SQL_REQUEUE_STALE_JOBS = (
+    f"UPDATE jobs SET status = 'queued', updated_at = {NOW} "
+    f"WHERE status IN ('queued', 'running') AND updated_at < ? RETURNING {JOB_COLUMNS}"
+)
+SQL_REBUILD_FTS = "INSERT INTO palaces_fts(palaces_fts) VALUES ('rebuild')"
+# Concept matches weigh twice as much as story matches
+SQL_SEARCH_PALACES = (
+    "SELECT p.id, p.created_at, p.label, p.preview FROM palaces_fts "
+    "JOIN palaces p ON p.id = palaces_fts.rowid "
+    "WHERE palaces_fts MATCH ? AND p.user_id = ? "
+    "ORDER BY bm25(palaces_fts, 2.0, 1.0), p.id DESC LIMIT ? OFFSET ?"
+)
+
+
+# Schema v2: concepts move from newline-joined text to a JSON array with
+# precomputed label/preview, and the search index switches to the preview
+SQL_MIGRATE_V2 = (
+    "DROP TRIGGER IF EXISTS palaces_fts_insert",
+    "DROP TRIGGER IF EXISTS palaces_fts_delete",
+    "DROP TRIGGER IF EXISTS palaces_fts_update",
+    "DROP TABLE IF EXISTS palaces_fts",
+    "ALTER TABLE palaces ADD COLUMN label TEXT NOT NULL DEFAULT ''",
+    "ALTER TABLE palaces ADD COLUMN preview TEXT NOT NULL DEFAULT ''",
+)
+SQL_BACKFILL_REVIEWS = (
+    "INSERT OR IGNORE INTO reviews (palace_id, user_id, due_at) "
+    "SELECT id, user_id, created_at FROM palaces"
+)
+SQL_BACKFILL_CONCEPTS = (
+    "INSERT OR IGNORE INTO palace_concepts (palace_id, position, concept) "
+    "SELECT p.id, j.key, j.value FROM palaces p, json_each(p.concepts) j"
+)
+
+
+def encode_concepts(concepts) -> str:
+    return json.dumps(list(concepts), ensure_ascii=False)
+
+
+def migrate_v2(conn: sqlite3.Connection):
+    """Backfill JSON concepts, labels and previews for palaces written before schema v2"""
+    for statement in SQL_MIGRATE_V2:
+        conn.execute(statement)
+    rows = conn.execute("SELECT id, concepts FROM palaces").fetchall()
+    updates = []
+    for palace_id, text in rows:
+        concepts = [c for c in text.split('\n') if c]
+        updates.append((encode_concepts(concepts), *concept_display(concepts), palace_id))
+    conn.executemany("UPDATE palaces SET concepts = ?, label = ?, preview = ? WHERE id = ?", updates)
+
+
+def schema_statements():
+    """Split SCHEMA into statements so it can run inside one transaction (executescript commits)"""
+    statement = ""
+    for line in SCHEMA.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+
+
+def fts_query(text: str) -> str:
+    """Turn free text into an FTS5 query: every word must match, the last one as a prefix"""
+    words = re.findall(r"\w+", text)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+
+def _palace_tuple(row) -> tuple:
+    return (row[0], tuple(json.loads(row[1])), row[2], row[3])
+
+
+def _job_tuple(row) -> tuple:
+    return (row[0], row[1], tuple(json.loads(row[2])), bool(row[3]), *row[4:])
+
+
+class SQLiteBackend(StorageBackend):
+    """
+    Local storage in a SQLite file using WAL mode.
+
+    Each thread gets its own connection so readers never block each other;
+    writes are serialized by SQLite itself.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str):
+        self.path = path
+        self._local = threading.local()
+        self._migrate(self._connection())
+
+    def _migrate(self, conn: sqlite3.Connection):
+        """Create the schema, upgrading files written by older versions in one transaction"""
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version >= SCHEMA_VERSION:
+            return
+        existing = conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'palaces'").fetchone()
+        conn.execute("BEGIN")
+        try:
+            if existing and version < 2:
+                migrate_v2(conn)
+            for statement in schema_statements():
+                conn.execute(statement)
+            if existing and version < 2:
+                conn.execute(SQL_BACKFILL_CONCEPTS)
+                conn.execute(SQL_REBUILD_FTS)
+            if existing and version < 3:
+                # Every existing palace starts out due for review
+                conn.execute(SQL_BACKFILL_REVIEWS)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, cached_statements=256)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    def ping(self):
+        self._connection().execute(SQL_PING).fetchall()
+
+    def create_user(self, username, password_hash):
+        conn = self._connection()
+        try:
+            with conn:
+                cursor = conn.execute(SQL_CREATE_USER, (username, password_hash))
+        except sqlite3.IntegrityError as e:
+            raise DuplicateUserError(username) from e
+        return cursor.lastrowid
+
+    def get_credentials(self, username):
+        return self._connection().execute(SQL_GET_CREDENTIALS, (username,)).fetchone()
+
+    def update_password_hash(self, user_id, password_hash):
+        conn = self._connection()
+        with conn:
+            conn.execute(SQL_UPDATE_PASSWORD_HASH, (password_hash, user_id))
+
+    def get_user(self, user_id):
+        row = self._connection().execute(SQL_GET_USER, (user_id,)).fetchone()
+        if row is None:
+            return None
+        return {'id': row[0], 'username': row[1], 'created_at': row[2]}
+
+    def insert_palaces(self, user_id, palaces):
+        conn = self._connection()
+        with conn:
+            rows = [
+                conn.execute(
+                    SQL_INSERT_PALACE,
+                    (user_id, encode_concepts(concepts), story, *concept_display(concepts))
+                ).fetchone()
+                for concepts, story in palaces
+            ]
+        return [_palace_tuple(row) for row in rows]
+
+    def list_palaces(self, user_id):
+        return [_palace_tuple(row) for row in self._connection().execute(SQL_LIST_PALACES, (user_id,))]
+
+    def list_concepts(self, user_id):
+        rows = self._connection().execute(SQL_LIST_CONCEPTS, (user_id,))
+        return [(palace_id, tuple(json.loads(concepts))) for palace_id, concepts in rows]
+
+    def list_palace_summaries(self, user_id, limit, cursor=None):
+        conn = self._connection()
+        if cursor:
+            created_at, last_id = cursor
+            return conn.execute(SQL_NEXT_SUMMARIES, (user_id, created_at, last_id, limit)).fetchall()
+        return conn.execute(SQL_FIRST_SUMMARIES, (user_id, limit)).fetchall()
+
+    def count_palaces(self, user_id):
+        return self._connection().execute(SQL_COUNT_PALACES, (user_id,)).fetchone()[0]
+
+    def get_palace(self, palace_id, user_id=None):
+        if user_id is None:
+            row = self._connection().execute(SQL_GET_PALACE, (palace_id,)).fetchone()
+        else:
+            row = self._connection().execute(SQL_GET_USER_PALACE, (palace_id, user_id)).fetchone()
+        return _palace_tuple(row) if row else None
+
+    def update_palace(self, palace_id, user_id, concepts, story):
+        conn = self._connection()
+        with conn:
+            # Triggers refresh the concept rows and the search index
+            row = conn.execute(
+                SQL_UPDATE_PALACE,
+                (encode_concepts(concepts), story, *concept_display(concepts), palace_id, user_id)
+            ).fetchone()
+            if row:
+                conn.execute(SQL_DELETE_QUIZ, (palace_id,))
+        return _palace_tuple(row) if row else None
+
+    def delete_palace(self, palace_id, user_id):
+        conn = self._connection()
+        with conn:
+            return conn.execute(SQL_DELETE_PALACE, (palace_id, user_id)).rowcount > 0
+
+    def search_palaces(self, user_id, query, limit, offset=0):
+        match = fts_query(query)
+        if match is None:
+            return []
+        return self._connection().execute(SQL_SEARCH_PALACES, (match, user_id, limit, offset)).fetchall()
+
+    def list_palaces_with_concept(self, user_id, concept, limit):
+        return self._connection().execute(SQL_PALACES_WITH_CONCEPT, (concept, user_id, limit)).fetchall()
+
+    def list_due_reviews(self, user_id, due_before, limit):
+        rows = self._connection().execute(SQL_DUE_REVIEWS, (user_id, due_before, limit))
+        return [ReviewState(*row) for row in rows]
+
+    def count_due_reviews(self, user_id, due_before):
+        return self._connection().execute(SQL_COUNT_DUE_REVIEWS, (user_id, due_before)).fetchone()[0]
+
+    def save_reviews(self, user_id, states):
+        conn = self._connection()
+        with conn:
+            conn.executemany(SQL_SAVE_REVIEW, [
+                (s.due_at, s.interval, s.ease, s.repetitions, s.lapses, s.reviewed_at, s.palace_id, user_id)
+                for s in states
+            ])
+
+    def save_quiz(self, palace_id, questions):
+        conn = self._connection()
+        with conn:
+            conn.execute(SQL_SAVE_QUIZ, (palace_id, json.dumps(questions)))
+        return True
+
+    def get_quiz(self, palace_id):
+        row = self._connection().execute(SQL_GET_QUIZ, (palace_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def insert_job(self, user_id, concepts, fresh):
+        conn = self._connection()
+        with conn:
+            row = conn.execute(SQL_INSERT_JOB, (user_id, encode_concepts(concepts), int(fresh))).fetchone()
+        return _job_tuple(row)
+
+    def claim_job(self, job_id):
+        conn = self._connection()
+        with conn:
+            return conn.execute(SQL_CLAIM_JOB, (job_id,)).rowcount > 0
+
+    def finish_job(self, job_id, status, palace_id=None, error=None):
+        conn = self._connection()
+        with conn:
+            return conn.execute(SQL_FINISH_JOB, (status, palace_id, error, job_id)).rowcount > 0
+
+    def touch_jobs(self, job_ids):
+        conn = self._connection()
+        with conn:
+            return conn.execute(SQL_TOUCH_JOBS, (json.dumps(list(job_ids)),)).rowcount
+
+    def list_jobs(self, user_id, limit):
+        return [_job_tuple(row) for row in self._connection().execute(SQL_LIST_JOBS, (user_id, limit))]
+
+    def delete_job(self, job_id, user_id):
+        conn = self._connection()
+        with conn:
+            return conn.execute(SQL_DELETE_JOB, (job_id, user_id)).rowcount > 0
+
+    def requeue_stale_jobs(self, updated_before):
+        conn = self._connection()
+        with conn:
+            rows = conn.execute(SQL_REQUEUE_STALE_JOBS, (updated_before,)).fetchall()
+        return [_job_tuple(row) for row in rows]
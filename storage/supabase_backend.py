@@ -0,0 +1,252 @@
+import os
+import threading
+from supabase import create_client, Client
+from postgrest.exceptions import APIError
+
+from review import ReviewState, timestamp
+from storage.base import StorageBackend, DuplicateUserError, concept_display
+
+# Postgres error code for unique constraint violations
+UNIQUE_VIOLATION = '23505'
+
+# Explicit columns keep the generated `search` tsvector out of responses
+PALACE_COLUMNS = "id, concepts, story, created_at"
+SUMMARY_COLUMNS = "id, created_at, label, preview"
+REVIEW_COLUMNS = "palace_id, due_at, interval, ease, repetitions, lapses, reviewed_at"
+JOB_COLUMNS = "id, user_id, concepts, fresh, status, palace_id, error, created_at, updated_at"
+
+
+def _palace_tuple(row: dict) -> tuple:
+    return (row['id'], tuple(row['concepts']), row['story'], row['created_at'])
+
+
+def _summary_tuple(row: dict) -> tuple:
+    return (row['id'], row['created_at'], row['label'], row['preview'])
+
+
+def _job_tuple(row: dict) -> tuple:
+    return (
+        row['id'], row['user_id'], tuple(row['concepts']), row['fresh'], row['status'],
+        row.get('palace_id'), row.get('error'), row['created_at'], row['updated_at']
+    )
+
+
+class SupabaseBackend(StorageBackend):
+    """Storage on a Supabase (PostgREST) project; the client is created on first use"""
+
+    name = "supabase"
+
+    def __init__(self, client: Client = None):
+        self._client = client
+        self._lock = threading.Lock()
+
+    @property
+    def client(self) -> Client:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    url: str = os.getenv("SUPABASE_URL")
+                    key: str = os.getenv("SUPABASE_KEY")
+                    self._client = create_client(url, key)
+        return self._client
+
+    def ping(self):
+        self.client.table('users').select("id").limit(1).execute()
+
+    def create_user(self, username, password_hash):
+        try:
+            response = self.client.table('users').insert({
+                'username': username,
+                'password_hash': password_hash
+            }).execute()
+        except APIError as e:
+            if e.code == UNIQUE_VIOLATION:
+                raise DuplicateUserError(username) from e
+            raise
+        return response.data[0]['id'] if response.data else None
+
+    def get_credentials(self, username):
+        response = self.client.table('users').select("id, password_hash").eq('username', username).execute()
+        if not response.data:
+            return None
+        user = response.data[0]
+        return (user['id'], user['password_hash'])
+
+    def update_password_hash(self, user_id, password_hash):
+        self.client.table('users').update({'password_hash': password_hash}).eq('id', user_id).execute()
+
+    def get_user(self, user_id):
+        response = self.client.table('users').select("id, username, created_at").eq('id', user_id).execute()
+        return response.data[0] if response.data else None
+
+    def insert_palaces(self, user_id, palaces):
+        rows = []
+        for concepts, story in palaces:
+            label, preview = concept_display(concepts)
+            rows.append({
+                'user_id': user_id,
+                'concepts': list(concepts),
+                'story': story,
+                'label': label,
+                'preview': preview
+            })
+        response = self.client.table('palaces').insert(rows).execute()
+        return [_palace_tuple(row) for row in response.data]
+
+    def list_palaces(self, user_id):
+        response = self.client.table('palaces').select(PALACE_COLUMNS).eq('user_id', user_id).order('created_at', desc=True).execute()
+        return [_palace_tuple(row) for row in response.data]
+
+    def list_concepts(self, user_id):
+        response = self.client.table('palaces').select("id, concepts").eq('user_id', user_id).execute()
+        return [(row['id'], tuple(row['concepts'])) for row in response.data]
+
+    def list_palace_summaries(self, user_id, limit, cursor=None):
+        query = self.client.table('palaces').select(SUMMARY_COLUMNS).eq('user_id', user_id)
+        if cursor:
+            created_at, last_id = cursor
+            query = query.or_(
+                f'created_at.lt."{created_at}",'
+                f'and(created_at.eq."{created_at}",id.lt.{last_id})'
+            )
+        response = query.order('created_at', desc=True).order('id', desc=True).limit(limit).execute()
+        return [_summary_tuple(row) for row in response.data]
+
+    def count_palaces(self, user_id):
+        response = self.client.table('palaces').select("id", count="exact", head=True).eq('user_id', user_id).execute()
+        return response.count or 0
+
+    def get_palace(self, palace_id, user_id=None):
+        query = self.client.table('palaces').select(PALACE_COLUMNS).eq('id', palace_id)
+        if user_id is not None:
+            query = query.eq('user_id', user_id)
+        response = query.execute()
+        return _palace_tuple(response.data[0]) if response.data else None
+
+    def update_palace(self, palace_id, user_id, concepts, story):
+        label, preview = concept_display(concepts)
+        response = self.client.table('palaces').update({
+            'concepts': list(concepts),
+            'story': story,
+            'label': label,
+            'preview': preview
+        }).eq('id', palace_id).eq('user_id', user_id).execute()
+        if not response.data:
+            return None
+        # The generated search column follows the new story by itself
+        self.client.table('quizzes').delete().eq('palace_id', palace_id).execute()
+        return _palace_tuple(response.data[0])
+
+    def delete_palace(self, palace_id, user_id):
+        response = self.client.table('palaces').delete().eq('id', palace_id).eq('user_id', user_id).execute()
+        return len(response.data) > 0
+
+    def search_palaces(self, user_id, query, limit, offset=0):
+        # Ranked by ts_rank over the GIN-indexed `search` column; see the README for the SQL
+        response = self.client.rpc('search_palaces', {
+            'p_user_id': user_id,
+            'p_query': query,
+            'p_limit': limit,
+            'p_offset': offset,
+        }).execute()
+        return [_summary_tuple(row) for row in response.data]
+
+    def list_palaces_with_concept(self, user_id, concept, limit):
+        # `concepts` is a TEXT[] with a GIN index, so containment is an index lookup
+        response = (
+            self.client.table('palaces').select(SUMMARY_COLUMNS)
+            .eq('user_id', user_id).contains('concepts', [concept])
+            .order('created_at', desc=True).order('id', desc=True).limit(limit).execute()
+        )
+        return [_summary_tuple(row) for row in response.data]
+
+    def list_due_reviews(self, user_id, due_before, limit):
+        response = (
+            self.client.table('reviews').select(REVIEW_COLUMNS)
+            .eq('user_id', user_id).lte('due_at', due_before)
+            .order('due_at').order('palace_id').limit(limit).execute()
+        )
+        return [ReviewState(**row) for row in response.data]
+
+    def count_due_reviews(self, user_id, due_before):
+        response = (
+            self.client.table('reviews').select("palace_id", count="exact", head=True)
+            .eq('user_id', user_id).lte('due_at', due_before).execute()
+        )
+        return response.count or 0
+
+    def save_reviews(self, user_id, states):
+        # Review rows are created by a trigger on palaces. Upserting the whole
+        # batch keeps it to one write, but would recreate the row of a palace
+        # deleted mid-session (or fail the batch on its foreign key), so states
+        # whose row is gone are dropped first, as SQLite's UPDATE skips them
+        palace_ids = [state.palace_id for state in states]
+        response = self.client.table('reviews').select("palace_id").eq('user_id', user_id).in_('palace_id', palace_ids).execute()
+        existing = {row['palace_id'] for row in response.data}
+        rows = [{**state._asdict(), 'user_id': user_id} for state in states if state.palace_id in existing]
+        if rows:
+            self.client.table('reviews').upsert(rows, on_conflict='palace_id').execute()
+
+    def save_quiz(self, palace_id, questions):
+        response = self.client.table('quizzes').upsert({
+            'palace_id': palace_id,
+            'questions': questions
+        }, on_conflict='palace_id').execute()
+        return len(response.data) > 0
+
+    def get_quiz(self, palace_id):
+        response = self.client.table('quizzes').select("questions").eq('palace_id', palace_id).execute()
+        return response.data[0]['questions'] if response.data else None
+
+    # updated_at is set by the app rather than a column default so stale-job
+    # checks compare timestamps from a single clock
+    def insert_job(self, user_id, concepts, fresh):
+        response = self.client.table('jobs').insert({
+            'user_id': user_id,
+            'concepts': list(concepts),
+            'fresh': fresh,
+            'status': 'queued',
+            'updated_at': timestamp()
+        }).execute()
+        return _job_tuple(response.data[0]) if response.data else None
+
+    def claim_job(self, job_id):
+        response = (
+            self.client.table('jobs').update({'status': 'running', 'updated_at': timestamp()})
+            .eq('id', job_id).eq('status', 'queued').execute()
+        )
+        return len(response.data) > 0
+
+    def finish_job(self, job_id, status, palace_id=None, error=None):
+        response = self.client.table('jobs').update({
+            'status': status,
+            'palace_id': palace_id,
+            'error': error,
+            'updated_at': timestamp()
+        }).eq('id', job_id).execute()
+        return len(response.data) > 0
+
+    def touch_jobs(self, job_ids):
+        response = (
+            self.client.table('jobs').update({'updated_at': timestamp()})
+            .in_('id', list(job_ids)).eq('status', 'running').execute()
+        )
+        return len(response.data)
+
+    def list_jobs(self, user_id, limit):
+        response = (
+            self.client.table('jobs').select(JOB_COLUMNS)
+            .eq('user_id', user_id).order('id', desc=True).limit(limit).execute()
+        )
+        return [_job_tuple(row) for row in response.data]
+
+    def delete_job(self, job_id, user_id):
+        response = self.client.table('jobs').delete().eq('id', job_id).eq('user_id', user_id).execute()
+        return len(response.data) > 0
+
+    def requeue_stale_jobs(self, updated_before):
+        response = (
+            self.client.table('jobs').update({'status': 'queued', 'updated_at': timestamp()})
+            .in_('status', ['queued', 'running']).lt('updated_at', updated_before).execute()
+        )
+        return [_job_tuple(row) for row in response.data]
@@ -0,0 +1,90 @@
+import re
+from typing import NamedTuple
+
+# Heading of the closing section that ties the concepts together
+SUMMARY_HEADING = "Summary"
+
+_HEADING = re.compile(r"^ {0,3}#{1,6}\s+(.*?)[\s#]*$")
+# Decoration models put around headings: numbering, bold/italics, trailing colons
+_DECORATION = re.compile(r"^(?:\d+[.)]\s*)|[*_:\s]+$|^[*_\s]+")
+
+
+class Segment(NamedTuple):
+    """One section of a story: the concept it explains (None for the summary) and its text"""
+    concept: str
+    text: str
+
+
+def _heading_key(heading: str) -> str:
+    previous = None
+    while previous != heading:
+        previous, heading = heading, _DECORATION.sub("", heading)
+    return heading.casefold()
+
+
+def split_story(story: str, concepts) -> list:
+    """
+    Split a story written as one `### <concept>` section per concept, in any
+    order, followed by a `### Summary` section into Segments.
+
+    Other headings stay part of the section they appear in. Returns None for
+    stories that aren't laid out that way (e.g. written before stories had
+    sections), which can only be regenerated as a whole.
+    """
+    names = {concept.casefold(): concept for concept in concepts}
+    segments, seen = [], set()
+    heading_line, lines = None, []
+
+    def close():
+        if heading_line is None:
+            return
+        key = _heading_key(_HEADING.match(heading_line).group(1))
+        text = "\n".join(lines).strip()
+        if key in names and key not in seen:
+            seen.add(key)
+            segments.append(Segment(names[key], text))
+        elif key == SUMMARY_HEADING.casefold() and segments:
+            segments.append(Segment(None, text))
+        elif segments:
+            # A sub-heading inside the previous section
+            last = segments[-1]
+            segments[-1] = Segment(last.concept, f"{last.text}\n\n{heading_line.strip()}\n{text}".strip())
+        else:
+            raise ValueError(heading_line)
+
+    try:
+        for line in story.splitlines():
+            if _HEADING.match(line):
+                close()
+                heading_line, lines = line, []
+            elif heading_line is None:
+                if line.strip():
+                    return None  # text before the first section
+            else:
+                lines.append(line)
+        close()
+    except ValueError:
+        return None
+
+    summaries = [index for index, segment in enumerate(segments) if segment.concept is None]
+    if seen != set(names) or summaries != [len(segments) - 1]:
+        return None
+    return segments
+
+
+def render_story(segments) -> str:
+    """Join Segments back into story text that split_story reads"""
+    return "\n\n".join(
+        f"### {segment.concept if segment.concept is not None else SUMMARY_HEADING}\n{segment.text}"
+        for segment in segments
+    )
+
+
+def plan_edit(segments, concepts) -> list:
+    """
+    Segments for a new concept list: sections of kept concepts are reused,
+    in the new order, and text is None where a section must be written.
+    The summary always comes last with text None, since it links them all.
+    """
+    existing = {segment.concept.casefold(): segment.text for segment in segments if segment.concept is not None}
+    return [Segment(concept, existing.get(concept.casefold())) for concept in concepts] + [Segment(None, None)]
@@ -0,0 +1,363 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+# Fields summed into the enclosing span when a nested span finishes
+ROLLUP_FIELDS = ('rows', 'prompt_tokens', 'response_tokens')
+
+_local = threading.local()
+_lock = threading.Lock()
+
+
+class Histogram:
+    """Cumulative latency histogram in the Prometheus exposition layout"""
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.total = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float):
+        for index, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                self.counts[index] += 1
+        self.total += seconds
+        self.count += 1
+
+
+# Process-wide aggregates, guarded by _lock
+_calls = defaultdict(int)          # (op, status) -> count
+_durations = defaultdict(Histogram)  # op -> Histogram
+_rows = defaultdict(int)           # op -> rows returned
+_tokens = defaultdict(int)         # (op, 'prompt'|'response') -> tokens
+_cache = defaultdict(int)          # (op, 'hit'|'miss') -> lookups
+_events = defaultdict(int)         # event -> count
+_rerun_durations = Histogram()
+_rerun_seconds = defaultdict(float)  # 'db'|'llm'|'other' -> seconds
+recent_reruns = deque(maxlen=int(os.getenv("NEURONEST_METRICS_HISTORY", "200")))
+sessions = OrderedDict()           # session id -> running totals, most recent last
+MAX_SESSIONS = 1000
+
+_trace_file = None
+_trace_path = os.getenv("NEURONEST_TRACE_FILE")
+_server = None
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+def _new_totals() -> dict:
+    return {
+        'db_calls': 0, 'db_seconds': 0.0, 'llm_calls': 0, 'llm_seconds': 0.0,
+        'prompt_tokens': 0, 'response_tokens': 0, 'cache_hits': 0, 'cache_misses': 0,
+        'rows': 0, 'errors': 0,
+    }
+
+
+def _write_trace(record: dict):
+    global _trace_file
+    if not _trace_path:
+        return
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        try:
+            if _trace_file is None:
+                _trace_file = open(_trace_path, "a", encoding="utf-8", buffering=1)
+            _trace_file.write(line)
+        except OSError as e:
+            print(f"Error writing trace file: {e}")
+
+
+def start_rerun(session_id: str, fragment: str = None):
+    """Begin grouping spans on this thread under a new rerun of session_id (or of one of its fragments)"""
+    _local.rerun = {
+        'session': session_id,
+        'rerun': f"{session_id}-{time.time_ns() // 1000}",
+        'fragment': fragment,
+        'started_at': time.time(),
+        'started': time.perf_counter(),
+        **_new_totals(),
+    }
+
+
+def end_rerun() -> dict:
+    """Finish the current rerun, fold it into its session and return its summary"""
+    rerun = getattr(_local, "rerun", None)
+    if rerun is None:
+        return None
+    _local.rerun = None
+
+    duration = time.perf_counter() - rerun.pop('started')
+    other = max(0.0, duration - rerun['db_seconds'] - rerun['llm_seconds'])
+    summary = {'type': 'rerun', **rerun, 'duration': duration, 'other_seconds': other}
+    with _lock:
+        _rerun_durations.observe(duration)
+        _rerun_seconds['db'] += rerun['db_seconds']
+        _rerun_seconds['llm'] += rerun['llm_seconds']
+        _rerun_seconds['other'] += other
+        recent_reruns.append(summary)
+
+        totals = sessions.pop(rerun['session'], None) or {
+            **_new_totals(), 'reruns': 0, 'fragment_reruns': 0, 'seconds': 0.0,
+        }
+        for key in _new_totals():
+            totals[key] += rerun[key]
+        totals['reruns'] += 1
+        totals['fragment_reruns'] += rerun['fragment'] is not None
+        totals['seconds'] += duration
+        totals['last_seen'] = time.time()
+        sessions[rerun['session']] = totals
+        while len(sessions) > MAX_SESSIONS:
+            sessions.popitem(last=False)
+    _write_trace(summary)
+    return summary
+
+
+@contextmanager
+def rerun(session_id: str, fragment: str = None):
+    """
+    Group the block's spans as one rerun. A block that is already part of a
+    rerun, like a fragment drawn by a full rerun, just joins it.
+    """
+    if getattr(_local, "rerun", None) is not None:
+        yield
+        return
+    start_rerun(session_id, fragment)
+    try:
+        yield
+    finally:
+        end_rerun()
+
+
+def annotate(**fields):
+    """Attach fields (cache, tokens, rows, ...) to the innermost active span on this thread"""
+    stack = _stack()
+    if stack:
+        stack[-1].update(fields)
+
+
+def _finish(record: dict, duration: float):
+    stack = _stack()
+    # Spans inside abandoned generators can close out of order, so remove by identity
+    for index in range(len(stack) - 1, -1, -1):
+        if stack[index] is record:
+            del stack[index]
+            break
+    if stack:
+        parent = stack[-1]
+        for field in ROLLUP_FIELDS:
+            if record.get(field):
+                parent[field] = parent.get(field, 0) + record[field]
+        if record.get('error'):
+            # The caller may swallow the exception, but its call still failed
+            parent.setdefault('error', record['error'])
+
+    name = record['name']
+    status = 'error' if record.get('error') else 'ok'
+    with _lock:
+        _calls[(name, status)] += 1
+        _durations[name].observe(duration)
+        _rows[name] += record.get('rows', 0)
+        for kind in ('prompt', 'response'):
+            _tokens[(name, kind)] += record.get(f'{kind}_tokens', 0)
+        if record.get('cache'):
+            _cache[(name, record['cache'])] += 1
+
+    rerun = getattr(_local, "rerun", None)
+    if rerun is not None:
+        # Round-trips are counted at the storage layer, everything else at the top level
+        if name.startswith('storage.'):
+            rerun['db_calls'] += 1
+            rerun['db_seconds'] += duration
+            rerun['rows'] += record.get('rows', 0)
+        elif name.startswith('llm.'):
+            rerun['llm_calls'] += 1
+            rerun['llm_seconds'] += duration
+            rerun['prompt_tokens'] += record.get('prompt_tokens', 0)
+            rerun['response_tokens'] += record.get('response_tokens', 0)
+        if record.get('cache') == 'hit':
+            rerun['cache_hits'] += 1
+        elif record.get('cache') == 'miss':
+            rerun['cache_misses'] += 1
+        if status == 'error' and not stack:
+            rerun['errors'] += 1
+
+    if _trace_path:
+        _write_trace({
+            'type': 'span',
+            'session': rerun['session'] if rerun else None,
+            'rerun': rerun['rerun'] if rerun else None,
+            'parent': stack[-1]['name'] if stack else None,
+            **record,
+            'duration': duration,
+        })
+
+
+@contextmanager
+def span(name: str, **fields):
+    """Time a block as one span; exceptions are recorded on it and re-raised"""
+    record = {'name': name, 'start': time.time(), **fields}
+    _stack().append(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        _finish(record, time.perf_counter() - started)
+
+
+def count(event: str, amount: int = 1):
+    """Bump a process-wide event counter, e.g. AI calls avoided"""
+    with _lock:
+        _events[event] += amount
+
+
+def row_count(result) -> int:
+    """Rows in a storage result: list length, one for a single row or count, zero for nothing"""
+    if result is None or result is False:
+        return 0
+    if isinstance(result, list):
+        return len(result)
+    return 1
+
+
+def traced(name: str):
+    """Decorator recording every call of a function as a span called name"""
+    def decorate(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class TracedBackend:
+    """Proxy around a StorageBackend that records each method call as a storage.<method> span"""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def __getattr__(self, name):
+        attr = getattr(self.backend, name)
+        if name.startswith('_') or not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            with span(f"storage.{name}", backend=self.backend.name) as record:
+                result = attr(*args, **kwargs)
+                record['rows'] = row_count(result)
+                return result
+        return call
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{value}"' for key, value in labels.items()) + "}"
+
+
+def render_metrics() -> str:
+    """All aggregates in the Prometheus text exposition format"""
+    lines = []
+
+    def header(metric, kind, text):
+        lines.append(f"# HELP {metric} {text}")
+        lines.append(f"# TYPE {metric} {kind}")
+
+    def histogram(metric, hist, **labels):
+        for bound, count in zip(BUCKETS, hist.counts):
+            lines.append(f"{metric}_bucket{_labels(**labels, le=bound)} {count}")
+        lines.append(f"{metric}_bucket{_labels(**labels, le='+Inf')} {hist.count}")
+        lines.append(f"{metric}_sum{_labels(**labels) if labels else ''} {hist.total}")
+        lines.append(f"{metric}_count{_labels(**labels) if labels else ''} {hist.count}")
+
+    with _lock:
+        header("neuronest_calls_total", "counter", "Traced DB, storage and LLM calls")
+        for (op, status), count in sorted(_calls.items()):
+            lines.append(f"neuronest_calls_total{_labels(op=op, status=status)} {count}")
+        header("neuronest_call_duration_seconds", "histogram", "Duration of traced calls")
+        for op, hist in sorted(_durations.items()):
+            histogram("neuronest_call_duration_seconds", hist, op=op)
+        header("neuronest_rows_total", "counter", "Rows returned by storage calls")
+        for op, rows in sorted(_rows.items()):
+            if op.startswith('storage.'):
+                lines.append(f"neuronest_rows_total{_labels(op=op)} {rows}")
+        header("neuronest_tokens_total", "counter", "Prompt and response tokens of LLM calls")
+        for (op, kind), tokens in sorted(_tokens.items()):
+            if op.startswith('llm.'):
+                lines.append(f"neuronest_tokens_total{_labels(op=op, kind=kind)} {tokens}")
+        header("neuronest_cache_lookups_total", "counter", "Cache hits and misses by call")
+        for (op, result), count in sorted(_cache.items()):
+            lines.append(f"neuronest_cache_lookups_total{_labels(op=op, result=result)} {count}")
+        header("neuronest_events_total", "counter", "Counted application events")
+        for event, total in sorted(_events.items()):
+            lines.append(f"neuronest_events_total{_labels(event=event)} {total}")
+        header("neuronest_rerun_duration_seconds", "histogram", "Wall time of Streamlit reruns")
+        histogram("neuronest_rerun_duration_seconds", _rerun_durations)
+        header("neuronest_rerun_seconds_total", "counter", "Rerun time spent in the DB, the LLM and everything else")
+        for part, seconds in sorted(_rerun_seconds.items()):
+            lines.append(f"neuronest_rerun_seconds_total{_labels(part=part)} {seconds}")
+        header("neuronest_sessions", "gauge", "Sessions with recorded reruns")
+        lines.append(f"neuronest_sessions {len(sessions)}")
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> dict:
+    """Per-session totals and the most recent rerun summaries"""
+    with _lock:
+        return {'sessions': dict(sessions), 'reruns': list(recent_reruns)}
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            body, content_type = render_metrics(), "text/plain; version=0.0.4"
+        elif self.path == "/sessions":
+            body, content_type = json.dumps(snapshot(), default=str), "application/json"
+        else:
+            self.send_error(404)
+            return
+        data = body.encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve_metrics(port: int = None, host: str = "127.0.0.1"):
+    """
+    Serve /metrics (Prometheus text) and /sessions (JSON) on a background thread.
+
+    The port defaults to NEURONEST_METRICS_PORT; nothing is started if neither
+    is set. Safe to call on every rerun, only the first call binds the port.
+    """
+    global _server
+    port = port or int(os.getenv("NEURONEST_METRICS_PORT", "0"))
+    if _server is not None or not port:
+        return _server
+    with _lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            except OSError as e:
+                print(f"Error starting metrics server on port {port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="neuronest-metrics", daemon=True).start()
+            print(f"📈 Serving metrics on http://{host}:{port}/metrics")
+    return _server
@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+import ai_agent
+from cache import SQLiteCache
+from fakes import FakeGenerativeModel
+from story import split_story, render_story
+
+
+class FakeModelTest(unittest.TestCase):
+    """Runs ai_agent against a fake model with a fresh, temporary story cache"""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.model = FakeGenerativeModel()
+        ai_agent.set_model(self.model)
+        ai_agent._memory_cache.clear()
+        ai_agent._disk_cache = SQLiteCache(os.path.join(directory.name, "llm_cache.sqlite3"))
+        self.addCleanup(setattr, ai_agent, "_disk_cache", None)
+
+
+class StoryCacheTest(FakeModelTest):
+    """Stories are cached per concept order; quizzes, which carry their story, are not"""
+
+    def test_story_key_keeps_order_and_repeats(self):
+        key = ai_agent._cache_key
+        self.assertEqual(key('memory_palace', ['Alpha', 'Beta']), key('memory_palace', [' Alpha ', 'Beta', '']))
+        self.assertNotEqual(key('memory_palace', ['Alpha', 'Beta']), key('memory_palace', ['Beta', 'Alpha']))
+        self.assertNotEqual(key('memory_palace', ['Alpha', 'Beta']), key('memory_palace', ['Alpha', 'Beta', 'Beta']))
+        self.assertEqual(key('quiz', ['Alpha', 'Beta'], "story"), key('quiz', ['beta', 'Alpha'], "story"))
+
+    def test_reordered_concepts_get_their_own_story(self):
+        first = ai_agent.generate_memory_palace(['Alpha', 'Beta', 'Gamma'], None)
+        reordered = ai_agent.generate_memory_palace(['Gamma', 'Beta', 'Alpha'], None)
+        self.assertEqual(self.model.calls, 2)
+        self.assertEqual([s.concept for s in split_story(reordered, ['Gamma', 'Beta', 'Alpha'])],
+                         ['Gamma', 'Beta', 'Alpha', None])
+        self.assertEqual(ai_agent.generate_memory_palace(['Alpha', ' Beta', 'Gamma'], None), first)
+        self.assertEqual(self.model.calls, 2)
+
+
+class EditMemoryPalaceTest(FakeModelTest):
+    """Edits reuse kept sections verbatim and write only what changed"""
+
+    STORY = ("### Mitochondria\nThe *powerhouse* hums;  odd   spacing stays.\n\n#### Detail\nA sub-heading too.\n\n"
+             "### Ribosome\nA tiny factory stamps out proteins.\n\n### Summary\nThe hum powers the factory.")
+    CONCEPTS = ['Mitochondria', 'Ribosome']
+
+    def test_untouched_sections_come_back_byte_for_byte(self):
+        original = split_story(self.STORY, self.CONCEPTS)
+        edited = ai_agent.edit_memory_palace(self.CONCEPTS, self.STORY, ['Ribosome', 'Nucleus', 'Mitochondria'], None)
+        segments = split_story(edited, ['Ribosome', 'Nucleus', 'Mitochondria'])
+        self.assertEqual(segments[0], original[1])
+        self.assertEqual(segments[2], original[0])
+        self.assertIn(render_story(original[:1]), edited)
+        self.assertIn("Nucleus", segments[1].text)
+        self.assertNotEqual(segments[3], original[2])
+        # One call for the new section and one for the summary
+        self.assertEqual(self.model.calls, 2)
+
+    def test_removing_a_concept_only_rewrites_the_summary(self):
+        edited = ai_agent.edit_memory_palace(self.CONCEPTS, self.STORY, ['Ribosome'], None)
+        self.assertEqual(split_story(edited, ['Ribosome'])[0], split_story(self.STORY, self.CONCEPTS)[1])
+        self.assertEqual(self.model.calls, 1)
+
+    def test_same_concepts_return_the_story_unchanged(self):
+        self.assertEqual(ai_agent.edit_memory_palace(self.CONCEPTS, self.STORY, list(self.CONCEPTS), None),
+                         self.STORY)
+        self.assertEqual(self.model.calls, 0)
+
+    def test_story_without_sections_is_rewritten_in_full(self):
+        story = "Once upon a time the mitochondria met a ribosome."
+        edited = ai_agent.edit_memory_palace(self.CONCEPTS, story, ['Ribosome', 'Nucleus'], None, use_cache=False)
+        self.assertEqual(self.model.calls, 1)
+        self.assertEqual([s.concept for s in split_story(edited, ['Ribosome', 'Nucleus'])], ['Ribosome', 'Nucleus', None])
+        self.assertNotIn("Once upon a time", edited)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+import unittest
+
+from google.api_core import exceptions as google_exceptions
+
+from fakes import FakeGenerativeModel
+from gemini_client import (
+    ResilientModel, CircuitBreaker, CircuitOpenError, RateLimitExceeded, UpstreamError
+)
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class ExhaustedBucket:
+    def acquire(self, amount=1, timeout=None):
+        raise RateLimitExceeded("rate limit budget exhausted")
+
+
+class CircuitBreakerProbeTest(unittest.TestCase):
+    """A half-open probe must always settle the breaker, whichever way it ends"""
+
+    def setUp(self):
+        self.clock = Clock()
+        self.breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30, clock=self.clock)
+        self.model = FakeGenerativeModel()
+        self.resilient = ResilientModel(self.model, breaker=self.breaker, max_retries=0, sleep=lambda _: None)
+        # Trip the breaker, then let the cool-down pass
+        self.model.failures = 1
+        with self.assertRaises(UpstreamError):
+            self.resilient.generate_content("prompt")
+        self.assertEqual(self.breaker.state, "open")
+        self.clock.now += 30
+
+    def assert_recovers(self):
+        """After another cool-down, a healthy model closes the circuit again"""
+        self.assertEqual(self.breaker.state, "open")
+        self.clock.now += 30
+        self.assertEqual(self.resilient.generate_content("prompt").text, "Each room holds one concept, and the giant connects them all.")
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_successful_probe_closes(self):
+        self.resilient.generate_content("prompt")
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_non_retryable_error_in_probe(self):
+        self.model.failures = 1
+        self.model.error = google_exceptions.InvalidArgument
+        with self.assertRaises(UpstreamError):
+            self.resilient.generate_content("prompt")
+        self.assert_recovers()
+
+    def test_rate_limited_probe(self):
+        self.resilient.request_bucket = ExhaustedBucket()
+        with self.assertRaises(RateLimitExceeded):
+            self.resilient.generate_content("prompt")
+        self.resilient.request_bucket = None
+        self.assert_recovers()
+
+    def test_rate_limited_stream_probe(self):
+        self.resilient.request_bucket = ExhaustedBucket()
+        with self.assertRaises(RateLimitExceeded):
+            list(self.resilient.generate_content("prompt", stream=True))
+        self.resilient.request_bucket = None
+        self.assert_recovers()
+
+    def test_non_retryable_error_in_stream_probe(self):
+        self.model.failures = 1
+        self.model.error = google_exceptions.PermissionDenied
+        with self.assertRaises(UpstreamError):
+            list(self.resilient.generate_content("prompt", stream=True))
+        self.assert_recovers()
+
+    def test_abandoned_stream_probe(self):
+        model = FakeGenerativeModel(responder=lambda prompt: "one\ntwo\nthree\n")
+        self.resilient.model = model
+        stream = self.resilient.generate_content("prompt", stream=True)
+        self.assertEqual(next(stream).text, "one\n")
+        stream.close()
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_only_one_probe_at_a_time(self):
+        stream = self.resilient.generate_content("prompt", stream=True)
+        next(stream)
+        with self.assertRaises(CircuitOpenError):
+            self.resilient.generate_content("prompt")
+        stream.close()
+        self.resilient.generate_content("prompt")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr, redirect_stdout
+from io import StringIO
+
+import ai_agent
+import db
+from fakes import FakeGenerativeModel
+from main import read_concept_lists, main
+from storage.sqlite_backend import SQLiteBackend
+
+
+class ReadConceptListsTest(unittest.TestCase):
+    def write(self, name, text):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        return path
+
+    def test_jsonl(self):
+        path = self.write("palaces.jsonl", '["DNA", " Ohm "]\n\n{"concepts": ["Volt", ""]}\n')
+        self.assertEqual(list(read_concept_lists(path)), [(0, ["DNA", "Ohm"], None), (2, ["Volt"], None)])
+
+    def test_malformed_jsonl_lines_are_reported_not_raised(self):
+        path = self.write("palaces.jsonl", '["DNA"]\n["Ohm"\n5\n{"concepts": "Volt"}\n["Volt"]\n')
+        records = list(read_concept_lists(path))
+        self.assertEqual([(index, concepts) for index, concepts, _ in records],
+                         [(0, ["DNA"]), (1, None), (2, None), (3, None), (4, ["Volt"])])
+        self.assertTrue(all(error for _, concepts, error in records if concepts is None))
+
+    def test_csv(self):
+        path = self.write("palaces.csv", "DNA, Ohm\n\nVolt,,\n")
+        self.assertEqual(list(read_concept_lists(path)), [(0, ["DNA", "Ohm"], None), (2, ["Volt"], None)])
+
+
+class ArgumentsTest(unittest.TestCase):
+    def test_concurrency_must_be_positive(self):
+        for value in ("0", "-1"):
+            with self.subTest(value=value), redirect_stderr(StringIO()):
+                with self.assertRaises(SystemExit):
+                    main(["palaces.csv", "--user-id", "1", "--concurrency", value])
+
+
+class FailingBackend(SQLiteBackend):
+    def insert_palaces(self, user_id, palaces):
+        raise RuntimeError("database unavailable")
+
+
+class RunBulkTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        ai_agent.set_model(FakeGenerativeModel())
+        ai_agent._memory_cache.clear()
+
+    def test_failed_batch_saves_exit_non_zero(self):
+        backend = FailingBackend(os.path.join(self.directory, "neuronest.sqlite3"))
+        db.set_backend(backend)
+        user_id = backend.create_user("reader@example.com", "hash")
+        path = os.path.join(self.directory, "palaces.jsonl")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write('["DNA"]\n["Ohm", "Volt"]\n')
+        with redirect_stdout(StringIO()) as output:
+            self.assertEqual(main([path, "--user-id", str(user_id), "--fresh"]), 1)
+        self.assertIn("Saved 0 palaces", output.getvalue())
+        self.assertIn("2 failed", output.getvalue())
+        self.assertFalse(os.path.exists(f"{path}.checkpoint"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,68 @@
+import json
+import unittest
+
+from quiz import QuizQuestion, parse_quiz, quiz_to_json, quiz_from_json
+
+
+def question(**overrides) -> dict:
+    item = {"question": "Who trips in room 1?", "options": ["A giant", "A cat", "A dog", "A fish"], "answer": "A"}
+    item.update(overrides)
+    return item
+
+
+def quiz_text(*items) -> str:
+    return json.dumps({"questions": list(items or [question()])})
+
+
+class ParseQuizTest(unittest.TestCase):
+    def test_valid_quiz(self):
+        questions = parse_quiz(quiz_text(question(answer=" b "), question(question=" Why? ")))
+        self.assertEqual(questions[0], QuizQuestion("Who trips in room 1?", ("A giant", "A cat", "A dog", "A fish"), "B"))
+        self.assertEqual(questions[1].question, "Why?")
+
+    def test_bare_list(self):
+        self.assertEqual(len(parse_quiz(json.dumps([question(), question()]))), 2)
+
+    def test_fenced_json(self):
+        for fence in ("```json\n{}\n```", "```\n{}\n```"):
+            with self.subTest(fence=fence):
+                self.assertEqual(parse_quiz(fence.format(quiz_text()))[0].answer, "A")
+
+    def test_non_json(self):
+        for text in ("", "Here is your quiz!", "```\nnot json\n```", "{'questions': []"):
+            with self.subTest(text=text):
+                with self.assertRaises(ValueError):
+                    parse_quiz(text)
+
+    def test_no_questions(self):
+        for data in ({}, {"questions": []}, [], "quiz", {"questions": [question()] * 11}):
+            with self.subTest(data=data):
+                with self.assertRaises(ValueError):
+                    parse_quiz(json.dumps(data))
+
+    def test_bad_option_counts(self):
+        for options in ([], ["A giant"] * 3, ["A giant"] * 5, ["A giant", "", "A dog", "A fish"],
+                        ["A giant", 2, "A dog", "A fish"], "A giant, A cat, A dog, A fish"):
+            with self.subTest(options=options):
+                with self.assertRaises(ValueError):
+                    parse_quiz(quiz_text(question(options=options)))
+
+    def test_bad_answers(self):
+        for answer in ("", " ", "AB", "BCD", "ABCD", "E", "1", 0, None, ["A"]):
+            with self.subTest(answer=answer):
+                with self.assertRaises(ValueError):
+                    parse_quiz(quiz_text(question(answer=answer)))
+
+    def test_bad_questions(self):
+        for item in ("question", question(question=""), question(question=None)):
+            with self.subTest(item=item):
+                with self.assertRaises(ValueError):
+                    parse_quiz(quiz_text(item))
+
+    def test_json_round_trip(self):
+        questions = parse_quiz(quiz_text(question(), question(answer="D")))
+        self.assertEqual(quiz_from_json(json.loads(json.dumps(quiz_to_json(questions)))), questions)
+
+
+if __name__ == "__main__":
+    unittest.main()
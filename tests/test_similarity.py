@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+
+import db
+from similarity import SimilarityIndex, concept_vectors
+from storage.sqlite_backend import SQLiteBackend
+
+CONCEPTS = ["Mitochondria", "Ribosome", "Cell membrane"]
+
+
+class SimilarityIndexTest(unittest.TestCase):
+    def test_vectors_ignore_order_case_and_punctuation(self):
+        first, second, empty = concept_vectors([CONCEPTS, ["cell-membrane ", "RIBOSOME", "mitochondria"], [" ", ""]])
+        self.assertAlmostEqual(float(first @ second), 1.0, places=5)
+        self.assertFalse(empty.any())
+
+    def test_query_ranks_and_applies_the_threshold(self):
+        index = SimilarityIndex()
+        index.add_many([(1, CONCEPTS), (2, ["Mitochondrion", "Ribosomes", "Cell membranes"]), (3, ["Ohm", "Volt"])])
+        matches = index.query(CONCEPTS, limit=3)
+        self.assertEqual([palace_id for palace_id, _ in matches][:2], [1, 2])
+        self.assertGreater(matches[1][1], 0.5)
+        self.assertEqual([palace_id for palace_id, _ in index.query(CONCEPTS, threshold=0.99)], [1])
+        self.assertEqual(index.query(CONCEPTS, limit=1), matches[:1])
+        self.assertEqual(index.query([""]), [])
+
+    def test_remove_keeps_the_other_rows(self):
+        index = SimilarityIndex()
+        index.add_many([(1, CONCEPTS), (2, ["Ohm", "Volt"]), (3, ["Photosynthesis"])])
+        index.remove(1)
+        index.remove(1)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.query(CONCEPTS, threshold=0.9), [])
+        self.assertEqual(index.query(["Volt", "Ohm"], limit=1)[0][0], 2)
+        self.assertEqual(index.query(["Photosynthesis"], limit=1)[0][0], 3)
+
+
+class FindSimilarPalacesTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        backend = SQLiteBackend(os.path.join(directory.name, "neuronest.sqlite3"))
+        db.set_backend(backend)
+        self.user_id = backend.create_user("reader@example.com", "hash")
+        self.other_id = backend.create_user("other@example.com", "hash")
+
+    def similar(self, concepts, user_id=None, **kwargs):
+        return [palace_id for palace_id, _ in db.find_similar_palaces(user_id or self.user_id, concepts, **kwargs)]
+
+    def test_threshold(self):
+        palace = db.save_palace(self.user_id, CONCEPTS, "story")
+        db.save_palace(self.user_id, ["Ohm", "Volt"], "story")
+        self.assertEqual(self.similar(["cell membrane", "Mitochondria", "Ribosome"]), [palace[0]])
+        self.assertEqual(self.similar(["Photosynthesis", "Chlorophyll"]), [])
+        self.assertEqual(len(self.similar(["Photosynthesis"], threshold=-1.0)), 2)
+
+    def test_only_the_users_own_palaces_match(self):
+        db.save_palace(self.other_id, CONCEPTS, "story")
+        self.assertEqual(self.similar(CONCEPTS), [])
+        palace = db.save_palace(self.user_id, CONCEPTS, "story")
+        self.assertEqual(self.similar(CONCEPTS), [palace[0]])
+
+    def test_loaded_index_follows_saves_edits_and_deletes(self):
+        # Build the index first so the writes below have to keep it current
+        self.assertEqual(self.similar(CONCEPTS), [])
+        palace = db.save_palace(self.user_id, CONCEPTS, "story")
+        bulk = db.save_palaces_bulk(self.user_id, [(["Ohm", "Volt"], "story")])
+        self.assertEqual(self.similar(CONCEPTS), [palace[0]])
+        self.assertEqual(self.similar(["Volt", "Ohm"]), [bulk[0][0]])
+
+        db.update_palace(palace[0], self.user_id, ["Photosynthesis"], "story")
+        self.assertEqual(self.similar(CONCEPTS), [])
+        self.assertEqual(self.similar(["Photosynthesis"]), [palace[0]])
+
+        self.assertTrue(db.delete_palace(palace[0], self.user_id))
+        self.assertEqual(self.similar(["Photosynthesis"]), [])
+        self.assertEqual(self.similar(["Volt", "Ohm"]), [bulk[0][0]])
+
+
+if __name__ == "__main__":
+    unittest.main()
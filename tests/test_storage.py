@@ -0,0 +1,119 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from fakes import FakeSupabase
+from review import timestamp
+from storage.sqlite_backend import SQLiteBackend
+from storage.supabase_backend import SupabaseBackend
+
+LONG_AGO = "2000-01-01T00:00:00.000+00:00"
+
+
+class BackendTest:
+    """Behaviour both storage backends must share; subclasses provide make_backend"""
+
+    def setUp(self):
+        self.backend = self.make_backend()
+        self.user_id = self.backend.create_user("reader@example.com", "hash")
+        self.palaces = self.backend.insert_palaces(self.user_id, [(["DNA"], "story"), (["Ohm"], "story")])
+
+    def due_reviews(self, user_id=None):
+        return self.backend.list_due_reviews(user_id or self.user_id, "9999-12-31T00:00:00.000+00:00", 10)
+
+    def test_save_reviews_updates_existing_rows(self):
+        states = [state._replace(interval=6.0, repetitions=2) for state in self.due_reviews()]
+        self.backend.save_reviews(self.user_id, states)
+        self.assertEqual(sorted(self.due_reviews()), sorted(states))
+
+    def test_save_reviews_skips_deleted_palaces(self):
+        kept, deleted = self.due_reviews()
+        self.assertTrue(self.backend.delete_palace(deleted.palace_id, self.user_id))
+        self.backend.save_reviews(self.user_id, [kept._replace(lapses=1), deleted._replace(lapses=1)])
+        self.assertEqual(self.due_reviews(), [kept._replace(lapses=1)])
+
+    def test_touched_jobs_are_not_requeued(self):
+        running, idle, finished = (self.backend.insert_job(self.user_id, ["DNA"], False) for _ in range(3))
+        for job in (running, idle, finished):
+            self.assertTrue(self.backend.claim_job(job[0]))
+            self.age_job(job[0])
+        self.backend.finish_job(finished[0], "done")
+        self.assertEqual(self.backend.touch_jobs([running[0], finished[0]]), 1)
+        requeued = self.backend.requeue_stale_jobs(timestamp(datetime.now(timezone.utc) - timedelta(minutes=5)))
+        self.assertEqual([job[0] for job in requeued], [idle[0]])
+
+    def test_save_reviews_ignores_other_users_palaces(self):
+        other = self.backend.create_user("other@example.com", "hash")
+        self.backend.save_reviews(other, [state._replace(lapses=3) for state in self.due_reviews()])
+        self.assertEqual({state.lapses for state in self.due_reviews()}, {0})
+        self.assertEqual(self.due_reviews(other), [])
+
+    def search(self, query, user_id=None):
+        return [row[0] for row in self.backend.search_palaces(user_id or self.user_id, query, 10)]
+
+    def test_search_matches_phrases_and_prefixes(self):
+        cell, light = self.backend.insert_palaces(self.user_id, [
+            (["Mitochondria", "Cell membrane"], "The mitochondria is the powerhouse of the cell."),
+            (["Photosynthesis"], "Plants turn light into sugar."),
+        ])
+        self.assertEqual(self.search("photo"), [light[0]])
+        self.assertEqual(self.search("cell membrane"), [cell[0]])
+        self.assertEqual(self.search("mitochondria power"), [cell[0]])
+        self.assertEqual(self.search("membrane sugar"), [])
+        other = self.backend.create_user("other@example.com", "hash")
+        self.assertEqual(self.search("photo", other), [])
+
+    def test_deleted_palaces_leave_the_search_index(self):
+        kept, deleted = self.backend.insert_palaces(self.user_id, [
+            (["Voltage"], "A waterfall of electrons."), (["Current"], "A river of electrons."),
+        ])
+        self.assertEqual(sorted(self.search("electrons")), sorted([kept[0], deleted[0]]))
+        self.assertTrue(self.backend.delete_palace(deleted[0], self.user_id))
+        self.assertEqual(self.search("electrons"), [kept[0]])
+        self.assertEqual(self.search("river"), [])
+
+    def test_summary_pages_split_rows_with_the_same_created_at(self):
+        palaces = self.palaces + self.backend.insert_palaces(self.user_id, [([name], "story") for name in "ABC"])
+        self.set_created_at([palace[0] for palace in palaces], LONG_AGO)
+        seen, cursor = [], None
+        while True:
+            page = self.backend.list_palace_summaries(self.user_id, 2, cursor)
+            if not page:
+                break
+            seen += [row[0] for row in page]
+            cursor = (page[-1][1], page[-1][0])
+        self.assertEqual(seen, sorted((palace[0] for palace in palaces), reverse=True))
+
+
+class SQLiteBackendTest(BackendTest, unittest.TestCase):
+    def make_backend(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return SQLiteBackend(os.path.join(directory.name, "neuronest.sqlite3"))
+
+    def age_job(self, job_id):
+        conn = self.backend._connection()
+        with conn:
+            conn.execute("UPDATE jobs SET updated_at = ? WHERE id = ?", (LONG_AGO, job_id))
+
+    def set_created_at(self, palace_ids, created_at):
+        conn = self.backend._connection()
+        with conn:
+            conn.executemany("UPDATE palaces SET created_at = ? WHERE id = ?", [(created_at, i) for i in palace_ids])
+
+
+class SupabaseBackendTest(BackendTest, unittest.TestCase):
+    def make_backend(self):
+        self.fake = FakeSupabase()
+        return SupabaseBackend(self.fake)
+
+    def age_job(self, job_id):
+        self.fake.table('jobs').update({'updated_at': LONG_AGO}).eq('id', job_id).execute()
+
+    def set_created_at(self, palace_ids, created_at):
+        self.fake.table('palaces').update({'created_at': created_at}).in_('id', palace_ids).execute()
+
+
+if __name__ == "__main__":
+    unittest.main()
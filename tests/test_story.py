@@ -0,0 +1,56 @@
+import unittest
+
+from story import Segment, split_story, render_story, plan_edit
+
+STORY = """### 1. **Mitochondria**:
+The *powerhouse* room hums.
+
+#### Detail
+Trailing spaces stay put.  
+
+### Ribosome
+A tiny factory stamps out proteins.
+
+### Summary
+The hum powers the factory."""
+
+
+class SplitStoryTest(unittest.TestCase):
+    def test_sections_in_any_order_with_decorated_headings(self):
+        segments = split_story(STORY, ["Ribosome", "mitochondria"])
+        self.assertEqual([segment.concept for segment in segments], ["mitochondria", "Ribosome", None])
+        self.assertEqual(segments[0].text,
+                         "The *powerhouse* room hums.\n\n#### Detail\nTrailing spaces stay put.")
+        self.assertEqual(segments[2].text, "The hum powers the factory.")
+
+    def test_render_round_trips(self):
+        segments = split_story(STORY, ["Mitochondria", "Ribosome"])
+        self.assertEqual(split_story(render_story(segments), ["Mitochondria", "Ribosome"]), segments)
+
+    def test_unsplittable_stories(self):
+        concepts = ["Mitochondria", "Ribosome"]
+        for name, story in [
+            ("no sections", "Once upon a time the mitochondria met a ribosome."),
+            ("text before the first section", "Intro\n\n" + STORY),
+            ("missing concept", STORY.replace("### Ribosome", "Ribosome")),
+            ("no summary", STORY.replace("### Summary", "#### Wrap-up")),
+            ("summary first", "### Summary\nIt all connects.\n\n" + STORY),
+        ]:
+            with self.subTest(name):
+                self.assertIsNone(split_story(story, concepts))
+
+
+class PlanEditTest(unittest.TestCase):
+    def test_kept_sections_are_reused_in_the_new_order(self):
+        segments = split_story(STORY, ["Mitochondria", "Ribosome"])
+        plan = plan_edit(segments, ["Ribosome", "Nucleus", "MITOCHONDRIA"])
+        self.assertEqual(plan, [
+            Segment("Ribosome", segments[1].text),
+            Segment("Nucleus", None),
+            Segment("MITOCHONDRIA", segments[0].text),
+            Segment(None, None),
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()